@@ -1,14 +1,38 @@
-import copy
 import json
+import time
 
-from openai import AzureOpenAI
-import httpx
-import anthropic
+import metrics
+from agent_logging import LazyRepr, get_logger
+from context_manager import ConversationCompactor
+from llm_store import ResponseStore
+from prompt_cache import PromptCacheBreakpoints
+from session_journal import Message, SessionJournal, to_dicts
+from utils import StreamingActionParser
+
+logger = get_logger("agent")
+
+
+class RequestCancelled(Exception):
+    """Raised when an in-flight LLM request is abandoned, e.g. the losing side of a hedged request"""
 
 
 class AIAgent:
-    def __init__(self, config, tools=None):
-        pass
+    MODEL_NAME = "unknown"
+
+    def __init__(self, config, tools=None, response_store: ResponseStore | None = None,
+                 journal: SessionJournal | None = None):
+        self._response_store = response_store
+        self._journal = journal
+        self._resumed = False
+        self.turns = 0
+        self.usage = {"input_tokens": 0, "output_tokens": 0,
+                      "cache_read_input_tokens": 0, "cache_creation_input_tokens": 0}
+        # Usage of the most recent LLM call, reported per turn
+        self.last_usage = dict(self.usage)
+        self._compactor = None
+        if config.context_budget_tokens:
+            self._compactor = ConversationCompactor(config.context_budget_tokens,
+                                                    keep_recent=config.context_keep_recent)
 
     def __call__(self, message: str) -> str:
         raise NotImplementedError(
@@ -18,97 +42,284 @@ class AIAgent:
         raise NotImplementedError(
             "Base AIAgent class does not implement any model. Use AIAgentAzure or AIAgentAnthropic.")
 
+    def resume(self) -> str | None:
+        """Output of the last turn of a session restored from its journal, None for a new session"""
+        return None
+
+    def _restore(self, default: list[Message]) -> list[Message]:
+        """The journaled conversation of a resumed session, or default for a new one"""
+        if self._journal is None or not any(m.role == "user" for m in self._journal.messages):
+            return default
+        self._resumed = True
+        self.turns = sum(m.role == "assistant" for m in self._journal.messages)
+        return self._journal.messages
+
+    def _resume(self, agent_state: list[Message]):
+        """Content of the last assistant message after a resume, running the turn a crash cut short"""
+        if not self._resumed:
+            return None
+        self._resumed = False
+        if agent_state[-1].role == "user":
+            # Interrupted before the response was journaled, this turn still has to run
+            return self(agent_state.pop().content)
+        return agent_state[-1].content
+
+    def _checkpoint(self, agent_state: list[Message]):
+        if self._journal is not None:
+            self._journal.sync(agent_state)
+
+    def _compact(self, agent_state: list) -> int:
+        """Keep the conversation under the configured token budget; returns tokens saved this turn"""
+        if self._compactor is None:
+            return 0
+        return self._compactor.compact(agent_state)
+
+    def _record_usage(self, input_tokens: int | None, output_tokens: int | None,
+                      cache_read_tokens: int | None = None, cache_creation_tokens: int | None = None):
+        self.last_usage = {"input_tokens": input_tokens or 0, "output_tokens": output_tokens or 0,
+                           "cache_read_input_tokens": cache_read_tokens or 0,
+                           "cache_creation_input_tokens": cache_creation_tokens or 0}
+        for key, tokens in self.last_usage.items():
+            self.usage[key] += tokens
+        for kind, tokens in (("input", input_tokens), ("output", output_tokens),
+                             ("cache_read", cache_read_tokens), ("cache_creation", cache_creation_tokens)):
+            if tokens:
+                metrics.LLM_TOKENS.inc(tokens, model=self.MODEL_NAME, kind=kind)
+
+    def _fetch(self, request: dict, live_call):
+        """Serve the request from the response store when one is configured, else call the API"""
+        def timed_live_call():
+            started = time.perf_counter()
+            try:
+                return live_call()
+            finally:
+                metrics.LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, model=self.MODEL_NAME)
+
+        # A response served from the store costs no tokens
+        self.last_usage = dict.fromkeys(self.usage, 0)
+        if self._response_store is None:
+            return timed_live_call()
+        return self._response_store.fetch(request, timed_live_call)
+
 
 class AIAgentAzure(AIAgent):
     MODEL_NAME = "gpt-4o-2024-11-20"
 
-    def __init__(self, config):
-        super().__init__(config)
-        self._open_ai_client = AzureOpenAI(
+    def __init__(self, config, response_store: ResponseStore | None = None, client=None,
+                 journal: SessionJournal | None = None):
+        super().__init__(config, response_store=response_store, journal=journal)
+        self._open_ai_client = client or self.create_client(config)
+        self._temperature = config.temperature
+        self._agent_state = self._restore([Message("system", config.system_prompt)])
+
+    @staticmethod
+    def create_client(config):
+        """Client that can be shared by several agents"""
+        # Provider SDKs are imported on first use, a run only ever needs one of them
+        from openai import AzureOpenAI
+        from llm_transport import get_shared_http_client
+        return AzureOpenAI(
             api_key=config.azure_api_key,
             azure_endpoint=config.azure_endpoint,
             api_version=config.azure_api_version,
-            http_client=httpx.Client(verify=False)
+            http_client=get_shared_http_client(verify=False),
+            # Retries happen in the shared transport, which knows about rate limits
+            max_retries=0
         )
-        self._temperature = config.temperature
-        self._agent_state = [
-            {
-                "role": "system",
-                "content": config.system_prompt
-            }
-        ]
 
     def __call__(self, message: str) -> str:
-        self._agent_state.append(
-            {
-                "role": "user", "content": message
-            }
-        )
+        self._agent_state.append(Message("user", message))
+        self._compact(self._agent_state)
+        self._checkpoint(self._agent_state)
+        self.turns += 1
         result = self._execute()
-        self._agent_state.append(
-            {
-                "role": "assistant", "content": result
-            }
-        )
+        self._agent_state.append(Message("assistant", result))
+        self._checkpoint(self._agent_state)
         return result
 
-    def _execute(self) -> str:
-        response = self._open_ai_client.chat.completions.create(
-            model=self.MODEL_NAME,
-            messages=self._agent_state,
-            temperature=self._temperature
-        )
+    def resume(self) -> str | None:
+        return self._resume(self._agent_state)
+
+    def _openai_args(self) -> dict:
+        return {
+            "model": self.MODEL_NAME,
+            "messages": to_dicts(self._agent_state),
+            "temperature": self._temperature
+        }
+
+    def _openai_result(self, response) -> str:
+        if response.usage:
+            details = getattr(response.usage, "prompt_tokens_details", None)
+            self._record_usage(response.usage.prompt_tokens, response.usage.completion_tokens,
+                               getattr(details, "cached_tokens", None))
         return response.choices[0].message.content
 
+    def _execute(self) -> str:
+        openai_args = self._openai_args()
+
+        def live_call():
+            return self._openai_result(self._open_ai_client.chat.completions.create(**openai_args))
+
+        return self._fetch(openai_args, live_call)
+
+    def complete(self, history: list[dict], cancel=None) -> str:
+        """Run one completion over a provider-neutral history of text user/assistant messages"""
+        self._agent_state = [self._agent_state[0]] + [Message.from_dict(m) for m in history]
+        self.turns += 1
+        return self._execute()
+
 
 class AIAgentAnthropic(AIAgent):
     MODEL_NAME = "claude-sonnet-4-0"
+    # The ReAct prompt ends every action with PAUSE, anything generated after it is wasted
+    STOP_SEQUENCES = ["PAUSE"]
 
-    def __init__(self, config, available_tools):
-        super().__init__(config)
-        self.anthropic = anthropic.Anthropic(api_key=config.anthropic_api_key)
+    def __init__(self, config, available_tools, response_store: ResponseStore | None = None, client=None,
+                 journal: SessionJournal | None = None):
+        super().__init__(config, response_store=response_store, journal=journal)
+        self.anthropic = client or self.create_client(config)
         self._temperature = config.temperature
         self.system_prompt = config.system_prompt
-        self._agent_state = []
+        self._agent_state = self._restore([])
         self._available_tools = available_tools
+        self._stream = config.stream
+        # Structured tool_use/tool_result conversation when tools are passed to the API natively
+        self._native_tools = bool(available_tools)
+        self.last_tool_uses: list[dict] = []
+        self._cancel = None
+        self._cache_breakpoints = None
+        if config.prompt_caching:
+            self._cache_breakpoints = PromptCacheBreakpoints(min_tokens=config.prompt_cache_min_tokens)
 
-    def __call__(self, message: str) -> str:
-        self._agent_state.append(
-            {
-                "role": "user", "content": message
-            }
-        )
-        result = self._execute()
+    @staticmethod
+    def create_client(config):
+        """Client that can be shared by several agents"""
+        import anthropic
+        from llm_transport import get_shared_http_client
+        return anthropic.Anthropic(api_key=config.anthropic_api_key, base_url=config.anthropic_base_url,
+                                   http_client=get_shared_http_client(), max_retries=0)
+
+    def __call__(self, message: str | list[dict]) -> str:
+        """Send a user turn; message is text, or a list of tool_result blocks in native tools mode"""
+        self._agent_state.append(Message("user", message))
+        self._compact(self._agent_state)
+        self._checkpoint(self._agent_state)
+        self.turns += 1
+        blocks = self._execute()
+        self.last_tool_uses = [block for block in blocks if block["type"] == "tool_use"]
         self._agent_state.append(
-            {
-                "role": "assistant", "content": result
-            }
-        )
-        return result
+            Message("assistant", blocks if self._native_tools else self._render_content(blocks)))
+        self._checkpoint(self._agent_state)
+        return self._render_content(blocks)
 
-    def _execute(self) -> str:
-        tools_for_anthropic = [{"name": tool_key, "input_schema": tool["inputSchema"], "description": tool['description']} for tool_key, tool in self._available_tools.items()]  # ---
+    def resume(self) -> str | None:
+        content = self._resume(self._agent_state)
+        if isinstance(content, list):
+            # Native tools mode journals the content blocks, the loop still has to run their tool_use
+            self.last_tool_uses = [block for block in content if block["type"] == "tool_use"]
+            return self._render_content(content)
+        return content
+
+    def complete(self, history: list[dict], cancel=None) -> str:
+        """Run one completion over a provider-neutral history of text user/assistant messages.
+
+        cancel is an optional threading.Event; a streaming response is abandoned once it is set.
+        """
+        self._agent_state = [Message.from_dict(m) for m in history]
+        self._cancel = cancel
+        self.turns += 1
+        try:
+            return self._render_content(self._execute())
+        finally:
+            self._cancel = None
+
+    def _anthropic_args(self) -> dict:
+        tools_for_anthropic = [{"name": tool_key, "input_schema": tool["inputSchema"],  # ---
+                                "description": tool['description']}
+                               for tool_key, tool in self._available_tools.items()]
 
         anthropic_args = {
             "system": self.system_prompt,
             "model": self.MODEL_NAME,
             "max_tokens": 1000,
-            "messages": self._agent_state,
+            "messages": to_dicts(self._agent_state),
             "tools": tools_for_anthropic,  # ---
         }
-        anthropic_args_readable = copy.deepcopy(anthropic_args)
-        if "api_key" in anthropic_args_readable:
-            anthropic_args_readable["api_key"] = "****"
-        anthropic_args_readable['system'] = (anthropic_args_readable['system'][:75] + '...') if len(anthropic_args_readable['system']) > 75 else anthropic_args_readable['system']
-        print(f"[ANTHROPIC_CALL] {repr(anthropic_args_readable)}")
-        response = self.anthropic.messages.create(**anthropic_args)
-        response_readable = [f"{repr(c)}" for c in response.content]
-        print(f"[ANTHROPIC_RESPONSE] {repr(response_readable)}")
+
+        if self._stream:
+            anthropic_args["stop_sequences"] = self.STOP_SEQUENCES
+        return anthropic_args
+
+    def _cached_args(self, anthropic_args: dict) -> dict:
+        """anthropic_args with prompt caching breakpoints; stored responses stay keyed by the unmarked request"""
+        if self._cache_breakpoints is None:
+            return anthropic_args
+        stable_prefix = self._compactor.stable_prefix(self._agent_state) if self._compactor else None
+        return self._cache_breakpoints.apply(anthropic_args, stable_prefix=stable_prefix)
+
+    def _compact(self, agent_state: list) -> int:
+        saved = super()._compact(agent_state)
+        if saved and self._cache_breakpoints is not None:
+            self._cache_breakpoints.invalidate()
+        return saved
+
+    def _anthropic_result(self, response) -> list[dict]:
+        logger.debug("[ANTHROPIC_RESPONSE] %s", LazyRepr(response.content))
+        self._record_anthropic_usage(response.usage)
+        return self._content_to_blocks(response.content)
+
+    def _execute(self) -> list[dict]:
+        anthropic_args = self._anthropic_args()
+
+        def live_call():
+            request = self._cached_args(anthropic_args)
+            logger.debug("[ANTHROPIC_CALL] %s", LazyRepr(request))
+            if self._stream:
+                return self._stream_until_action(request)
+            return self._anthropic_result(self.anthropic.messages.create(**request))
+
+        return self._fetch(dict(anthropic_args, temperature=self._temperature), live_call)
+
+    def _stream_until_action(self, anthropic_args) -> list[dict]:
+        """Stream the response and hand it back as soon as a complete Action line has arrived"""
+        parser = StreamingActionParser()
+        with self.anthropic.messages.stream(**anthropic_args) as stream:
+            for chunk in stream.text_stream:
+                if self._cancel is not None and self._cancel.is_set():
+                    # The tokens generated so far are billed; raising keeps the partial response out of the store
+                    self._record_anthropic_usage(stream.current_message_snapshot.usage)
+                    raise RequestCancelled("Streaming request cancelled")
+                action, _ = parser.feed(chunk)
+                if action:
+                    # Leaving the context manager closes the stream and stops generation
+                    logger.debug("[ANTHROPIC_STREAM] early action dispatch: %s", action)
+                    self._record_anthropic_usage(stream.current_message_snapshot.usage)
+                    return [{"type": "text", "text": parser.consumed_text}]
+            response = stream.get_final_message()
+        return self._anthropic_result(response)
+
+    def _record_anthropic_usage(self, usage):
+        self._record_usage(usage.input_tokens, usage.output_tokens,
+                           getattr(usage, "cache_read_input_tokens", None),
+                           getattr(usage, "cache_creation_input_tokens", None))
+
+    @staticmethod
+    def _content_to_blocks(content) -> list[dict]:
+        """Convert SDK content blocks to plain dicts that can be stored and sent back to the API"""
+        blocks = []
+        for block in content:
+            if block.type == 'text':
+                blocks.append({"type": "text", "text": block.text})
+            if block.type == 'tool_use':
+                blocks.append({"type": "tool_use", "id": block.id, "name": block.name, "input": block.input})
+        return blocks
+
+    def _render_content(self, blocks: list[dict]) -> str:
         final_text = []
-        for content in response.content:
-            if content.type == 'text':
-                final_text.append(content.text)
-            if content.type == 'tool_use':  # ---
-                final_text.append(content.name + ": " + json.dumps(content.input))  # ---
+        for block in blocks:
+            if block["type"] == 'text':
+                final_text.append(block["text"])
+            if block["type"] == 'tool_use' and not self._native_tools:  # ---
+                final_text.append(block["name"] + ": " + json.dumps(block["input"]))  # ---
 
         return ''.join(final_text)
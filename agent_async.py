@@ -0,0 +1,298 @@
+"""
+Async Agents
+Event-loop counterparts of the agents, AgentTools and run_agent_loop, so one process can drive
+hundreds of conversations concurrently instead of holding a blocking thread per conversation.
+LLM and tool calls can be bounded by asyncio semaphores shared by the sessions of one tenant.
+"""
+import asyncio
+import contextlib
+import json
+import time
+from typing import Any, AsyncIterator, Dict
+
+import metrics
+from agent import AIAgentAnthropic, AIAgentAzure
+from agent_logging import LazyRepr, get_logger
+from agent_tools import AgentTools, is_tool_error
+from llm_store import ResponseStore
+from mcp_async import AsyncMCPToolClient
+from mcp_client import TIMEOUT_PREFIX
+from mcp_pool import MCPServerPool
+from session_journal import Message, SessionJournal
+from utils import ActionParser, StreamingActionParser
+
+logger = get_logger("agent")
+
+
+class AsyncAgentMixin:
+    """Live calls bounded by the llm_limit semaphore, and journal resume for async __call__"""
+    _llm_limit: asyncio.Semaphore | None = None
+
+    async def _fetch_async(self, request: dict, live_call):
+        async def timed_live_call():
+            async with self._llm_limit or contextlib.nullcontext():
+                started = time.perf_counter()
+                try:
+                    return await live_call()
+                finally:
+                    metrics.LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, model=self.MODEL_NAME)
+
+        self.last_usage = dict.fromkeys(self.usage, 0)
+        if self._response_store is None:
+            return await timed_live_call()
+        return await self._response_store.fetch_async(request, timed_live_call)
+
+    async def _checkpoint_async(self, agent_state: list[Message]):
+        if self._journal is not None:
+            # Journal writes are file I/O, keep them off the event loop all sessions share
+            await asyncio.get_running_loop().run_in_executor(None, self._journal.sync, agent_state)
+
+    async def _resume_async(self, agent_state: list[Message]):
+        if not self._resumed:
+            return None
+        self._resumed = False
+        if agent_state[-1].role == "user":
+            # Interrupted before the response was journaled, this turn still has to run
+            return await self(agent_state.pop().content)
+        return agent_state[-1].content
+
+
+class AsyncAIAgentAzure(AsyncAgentMixin, AIAgentAzure):
+    def __init__(self, config, response_store: ResponseStore | None = None, client=None,
+                 journal: SessionJournal | None = None, llm_limit: asyncio.Semaphore | None = None):
+        super().__init__(config, response_store=response_store, client=client, journal=journal)
+        self._llm_limit = llm_limit
+
+    @staticmethod
+    def create_client(config):
+        """Client that can be shared by several agents on the same event loop"""
+        from openai import AsyncAzureOpenAI
+        from llm_transport import get_shared_async_http_client
+        return AsyncAzureOpenAI(
+            api_key=config.azure_api_key,
+            azure_endpoint=config.azure_endpoint,
+            api_version=config.azure_api_version,
+            http_client=get_shared_async_http_client(verify=False),
+            max_retries=0
+        )
+
+    async def __call__(self, message: str) -> str:
+        self._agent_state.append(Message("user", message))
+        self._compact(self._agent_state)
+        await self._checkpoint_async(self._agent_state)
+        self.turns += 1
+        result = await self._execute()
+        self._agent_state.append(Message("assistant", result))
+        await self._checkpoint_async(self._agent_state)
+        return result
+
+    async def resume(self) -> str | None:
+        return await self._resume_async(self._agent_state)
+
+    async def _execute(self) -> str:
+        openai_args = self._openai_args()
+
+        async def live_call():
+            return self._openai_result(await self._open_ai_client.chat.completions.create(**openai_args))
+
+        return await self._fetch_async(openai_args, live_call)
+
+
+class AsyncAIAgentAnthropic(AsyncAgentMixin, AIAgentAnthropic):
+    def __init__(self, config, available_tools, response_store: ResponseStore | None = None, client=None,
+                 journal: SessionJournal | None = None, llm_limit: asyncio.Semaphore | None = None):
+        super().__init__(config, available_tools, response_store=response_store, client=client, journal=journal)
+        self._llm_limit = llm_limit
+
+    @staticmethod
+    def create_client(config):
+        """Client that can be shared by several agents on the same event loop"""
+        import anthropic
+        from llm_transport import get_shared_async_http_client
+        return anthropic.AsyncAnthropic(api_key=config.anthropic_api_key, base_url=config.anthropic_base_url,
+                                        http_client=get_shared_async_http_client(), max_retries=0)
+
+    async def __call__(self, message: str | list[dict]) -> str:
+        """Send a user turn; message is text, or a list of tool_result blocks in native tools mode"""
+        self._agent_state.append(Message("user", message))
+        self._compact(self._agent_state)
+        await self._checkpoint_async(self._agent_state)
+        self.turns += 1
+        blocks = await self._execute()
+        self.last_tool_uses = [block for block in blocks if block["type"] == "tool_use"]
+        self._agent_state.append(
+            Message("assistant", blocks if self._native_tools else self._render_content(blocks)))
+        await self._checkpoint_async(self._agent_state)
+        return self._render_content(blocks)
+
+    async def resume(self) -> str | None:
+        content = await self._resume_async(self._agent_state)
+        if isinstance(content, list):
+            self.last_tool_uses = [block for block in content if block["type"] == "tool_use"]
+            return self._render_content(content)
+        return content
+
+    async def _execute(self) -> list[dict]:
+        anthropic_args = self._anthropic_args()
+
+        async def live_call():
+            request = self._cached_args(anthropic_args)
+            logger.debug("[ANTHROPIC_CALL] %s", LazyRepr(request))
+            if self._stream:
+                return await self._stream_until_action(request)
+            return self._anthropic_result(await self.anthropic.messages.create(**request))
+
+        return await self._fetch_async(dict(anthropic_args, temperature=self._temperature), live_call)
+
+    async def _stream_until_action(self, anthropic_args) -> list[dict]:
+        """Stream the response and hand it back as soon as a complete Action line has arrived.
+
+        Cancelling the awaiting task closes the stream, so no cancel event is needed here.
+        """
+        parser = StreamingActionParser()
+        async with self.anthropic.messages.stream(**anthropic_args) as stream:
+            async for chunk in stream.text_stream:
+                action, _ = parser.feed(chunk)
+                if action:
+                    logger.debug("[ANTHROPIC_STREAM] early action dispatch: %s", action)
+                    self._record_anthropic_usage(stream.current_message_snapshot.usage)
+                    return [{"type": "text", "text": parser.consumed_text}]
+            response = await stream.get_final_message()
+        return self._anthropic_result(response)
+
+
+class AsyncAgentTools(AgentTools):
+    """AgentTools whose tool calls are awaited on the event loop, over a started MCPServerPool.
+
+    tool_limit bounds the MCP calls in flight, e.g. per tenant; time spent waiting for it counts
+    against the call's timeout.
+    """
+
+    def __init__(self, config, mcp_pool: MCPServerPool, tool_limit: asyncio.Semaphore | None = None):
+        super().__init__(config, mcp_pool=mcp_pool)
+        self._async_client: AsyncMCPToolClient | None = None
+        self._tool_limit = tool_limit
+
+    def init(self, background: bool = False):
+        super().init(background)
+        # Calls go through the session's lease, so they stay on its server process
+        self._async_client = AsyncMCPToolClient(self._mcp_client)
+
+    def get_tool(self, tool_name: str):
+        if not self._mcp_client:
+            raise RuntimeError("MCP client not initialized. Call init() first.")
+        if tool_name not in self.get_available_tools():
+            return None
+
+        async def mcp_tool_wrapper(tool_input: str, timeout: float | None = None) -> str:
+            return await self.call_tool(tool_name, json.loads(tool_input), timeout=timeout)
+        mcp_tool_wrapper.__name__ = f"mcp_{tool_name}"
+        return mcp_tool_wrapper
+
+    async def call_tool(self, tool_name: str, arguments: dict, timeout: float | None = None) -> str:
+        if tool_name in self._builtin_tools:
+            return self._call_builtin(tool_name, arguments)
+        self._wait_ready()
+        timeout = self._call_timeout(timeout)
+        if timeout is not None and timeout <= 0:
+            return f"{TIMEOUT_PREFIX}: no time left in this turn to run '{tool_name}'"
+        cache_policy = self._mcp_tools_dict.get(tool_name, {}).get("cachePolicy", {"policy": "never"})
+        if not self._cache.is_cacheable(cache_policy):
+            return self._observation(await self._call_mcp(tool_name, arguments, timeout))
+        key = self._cache.make_key(tool_name, arguments)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        result = self._observation(await self._call_mcp(tool_name, arguments, timeout))
+        if not is_tool_error(result):
+            self._cache.put(key, result, cache_policy)
+        return result
+
+    async def _call_mcp(self, tool_name: str, arguments: dict, timeout: float | None) -> str:
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        async with self._tool_limit or contextlib.nullcontext():
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                return f"{TIMEOUT_PREFIX}: '{tool_name}' waited too long for a free tool slot"
+            return await self._async_client.call_tool(tool_name, arguments, timeout=remaining)
+
+    async def run_tool_uses(self, tool_uses: list[dict], timeout: float | None = None) -> list[dict]:
+        """Run all tool_use blocks of a turn concurrently and return matching tool_result blocks"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        available_tools = self.get_available_tools()
+
+        async def run(tool_use: dict) -> dict:
+            if tool_use["name"] not in available_tools:
+                result = f'Unknown tool "{tool_use["name"]}". Available tools: {list(available_tools.keys())}'
+            else:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                result = await self.call_tool(tool_use["name"], tool_use["input"], timeout=remaining)
+            return {
+                "type": "tool_result",
+                "tool_use_id": tool_use["id"],
+                "content": result,
+                "is_error": tool_use["name"] not in available_tools or is_tool_error(result),
+            }
+
+        return list(await asyncio.gather(*(run(tool_use) for tool_use in tool_uses)))
+
+
+async def run_agent_loop_async(
+        prompt: str,
+        ai_agent: AsyncAIAgentAnthropic | AsyncAIAgentAzure,
+        ai_agent_tools: AsyncAgentTools,
+        action_parser: ActionParser,
+        max_turns=5,
+        turn_timeout: float | None = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """run_agent_loop for async agents, yielding turn events instead of printing them.
+
+    Events are dicts with a "type" of assistant, tool_uses, tool_result, action or observation, and a
+    final {"type": "final", "answer": ...} once the loop ends.
+    """
+    result = None
+    turns = 0
+    model = getattr(ai_agent, "MODEL_NAME", "unknown")
+    turn_started = None
+    try:
+        resumed = await ai_agent.resume()
+        for _ in range(max_turns):
+            if turn_started is not None:
+                metrics.TURN_SECONDS.observe(time.perf_counter() - turn_started, model=model)
+            turn_started = time.perf_counter()
+            turns += 1
+            if resumed is not None:
+                result, resumed = resumed, None
+            else:
+                result = await ai_agent(prompt)
+            yield {"type": "assistant", "turn": turns, "text": result,
+                   "usage": dict(getattr(ai_agent, "last_usage", None) or {})}
+            tool_uses = getattr(ai_agent, "last_tool_uses", None)
+            if tool_uses:
+                yield {"type": "tool_uses", "turn": turns,
+                       "tool_uses": [{"id": t["id"], "name": t["name"], "input": t["input"]} for t in tool_uses]}
+                prompt = await ai_agent_tools.run_tool_uses(tool_uses, timeout=turn_timeout)
+                for tool_result in prompt:
+                    yield {"type": "tool_result", "turn": turns, "tool_use_id": tool_result["tool_use_id"],
+                           "content": tool_result["content"], "is_error": tool_result["is_error"]}
+                continue
+            action, action_input = action_parser(result)
+            if not action:
+                break
+
+            yield {"type": "action", "turn": turns, "action": action, "input": action_input}
+            ai_tool = ai_agent_tools.get_tool(action.lower().strip())
+            if ai_tool:
+                action_result = await ai_tool(action_input.strip(), timeout=turn_timeout)
+            else:
+                available_tools = ai_agent_tools.get_available_tools().keys()
+                action_result = f'Unknown tool "{action}". Available tools: {available_tools}'
+            yield {"type": "observation", "turn": turns, "content": action_result}
+
+            prompt = f"Observation: {action_result}"
+        yield {"type": "final", "turn": turns, "answer": result}
+    finally:
+        if turn_started is not None:
+            metrics.TURN_SECONDS.observe(time.perf_counter() - turn_started, model=model)
+        metrics.SESSION_TURNS.observe(turns)
+        ai_agent_tools.cleanup()
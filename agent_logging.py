@@ -0,0 +1,133 @@
+"""
+Agent Logging
+Leveled, sampled, lazily formatted logging that writes through a background queue
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from typing import Any, Iterable, Optional
+
+ROOT_LOGGER_NAME = "agents"
+DEFAULT_REDACT_KEYS = frozenset({"api_key", "authorization", "x-api-key", "anthropic_api_key", "azure_api_key"})
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+
+class SamplingFilter(logging.Filter):
+    """Lets through only a fraction of records at or below max_level; higher levels always pass"""
+
+    def __init__(self, rate: float, max_level: int = logging.DEBUG):
+        super().__init__()
+        self.rate = rate
+        self.max_level = max_level
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.max_level or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class LazyRepr:
+    """Defers rendering of a payload until a handler actually formats the record.
+
+    Renders a bounded, redacted view by walking the payload, without copying it: keys in redact_keys are
+    masked, long strings are cut to max_str characters and containers beyond max_items or max_depth are
+    summarised.
+    """
+    __slots__ = ("obj", "redact_keys", "max_str", "max_items", "max_depth")
+
+    def __init__(self, obj: Any, redact_keys: Iterable[str] = DEFAULT_REDACT_KEYS, max_str: int = 200,
+                 max_items: int = 20, max_depth: int = 6):
+        self.obj = obj
+        self.redact_keys = redact_keys
+        self.max_str = max_str
+        self.max_items = max_items
+        self.max_depth = max_depth
+
+    def __str__(self) -> str:
+        parts = []
+        self._render(self.obj, parts, 0)
+        return "".join(parts)
+
+    __repr__ = __str__
+
+    def _render(self, obj: Any, out: list, depth: int):
+        if isinstance(obj, str):
+            out.append(repr(obj if len(obj) <= self.max_str else obj[:self.max_str] + f"...(+{len(obj) - self.max_str})"))
+        elif isinstance(obj, dict):
+            if depth >= self.max_depth:
+                out.append(f"{{...{len(obj)} keys}}")
+                return
+            out.append("{")
+            for i, (key, value) in enumerate(obj.items()):
+                if i >= self.max_items:
+                    out.append(f", ...{len(obj) - i} more")
+                    break
+                if i:
+                    out.append(", ")
+                out.append(f"{key!r}: ")
+                if key in self.redact_keys:
+                    out.append("'****'")
+                else:
+                    self._render(value, out, depth + 1)
+            out.append("}")
+        elif isinstance(obj, (list, tuple)):
+            if depth >= self.max_depth:
+                out.append(f"[...{len(obj)} items]")
+                return
+            out.append("[")
+            for i, value in enumerate(obj):
+                if i >= self.max_items:
+                    out.append(f", ...{len(obj) - i} more")
+                    break
+                if i:
+                    out.append(", ")
+                self._render(value, out, depth + 1)
+            out.append("]")
+        else:
+            text = repr(obj)
+            out.append(text if len(text) <= self.max_str else text[:self.max_str] + "...")
+
+
+def configure_logging(level: Optional[str] = None, sample_rate: Optional[float] = None, stream=None):
+    """Route the agents logger through a QueueHandler so formatting and I/O happen on a background thread.
+
+    Level and sample rate default to the AGENT_LOG_LEVEL and AGENT_LOG_SAMPLE environment variables.
+    """
+    global _listener
+    level = (level or os.environ.get("AGENT_LOG_LEVEL", "WARNING")).upper()
+    if sample_rate is None:
+        sample_rate = float(os.environ.get("AGENT_LOG_SAMPLE", "1.0"))
+
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    root.setLevel(level)
+    root.propagate = False
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    if _listener is not None:
+        _listener.stop()
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+    root.addHandler(queue_handler)
+
+    stream_handler = logging.StreamHandler(stream or sys.stderr)
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+    return root
+
+
+@atexit.register
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
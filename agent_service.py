@@ -0,0 +1,279 @@
+"""
+Agent Service
+Local HTTP service that hosts many concurrent agent sessions on one event loop, sharing MCP server
+processes and HTTP clients across them
+
+    python agent_service.py --port 8700 --max-sessions 64 --llm-concurrency 8 --tool-concurrency 16
+
+POST /sessions with {"prompt": ..., "session_id": ...} (session_id optional) streams the session's turn
+events as JSON lines. Posting the session_id of a journaled session without a prompt (or with its original
+prompt) resumes it; a different prompt, or a session that is still running, gets 409. The X-Tenant header
+names the tenant whose limits apply: at most --max-sessions sessions run at once and --max-queued more wait
+for a slot, beyond that the request gets 429. Each tenant's sessions share --llm-concurrency in-flight LLM
+calls and --tool-concurrency in-flight tool calls. A caller that reads slowly slows only its own session,
+and one that disconnects has its session cancelled, including its in-flight MCP calls. GET /stats reports
+running and queued sessions per tenant.
+"""
+import argparse
+import asyncio
+import dataclasses
+import json
+import uuid
+from typing import Any, Dict, Optional
+
+from agent_async import AsyncAIAgentAnthropic, AsyncAIAgentAzure, AsyncAgentTools, run_agent_loop_async
+from agent_logging import configure_logging, get_logger
+from agent_tools import builtin_tools
+from llm_store import ResponseStore
+from main import tools_markdown
+from mcp_pool import MCPServerPool
+from metrics import start_exporters
+from session_journal import SessionJournal
+from tool_index import select_tools
+from utils import AIAgentConfig, ActionParser
+
+logger = get_logger("service")
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 409: "Conflict", 429: "Too Many Requests"}
+
+
+class TenantLimits:
+    """Admission and concurrency limits shared by the sessions of one tenant"""
+
+    def __init__(self, max_sessions: int, max_queued: int, llm_concurrency: int, tool_concurrency: int):
+        self.max_admitted = max_sessions + max_queued
+        self.sessions = asyncio.Semaphore(max_sessions)
+        self.llm = asyncio.Semaphore(llm_concurrency)
+        self.tools = asyncio.Semaphore(tool_concurrency)
+        self.admitted = 0
+        self.running = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"running": self.running, "queued": self.admitted - self.running}
+
+
+class AgentService:
+    def __init__(self, config: AIAgentConfig, provider: str = "anthropic", pool_size: int = 2,
+                 max_turns: int = 5, max_sessions: int = 64, max_queued: int = 256,
+                 llm_concurrency: int = 8, tool_concurrency: int = 16):
+        self.config = config
+        self.provider = provider
+        self.max_turns = max_turns
+        self._limits = dict(max_sessions=max_sessions, max_queued=max_queued,
+                            llm_concurrency=llm_concurrency, tool_concurrency=tool_concurrency)
+        self._tenants: Dict[str, TenantLimits] = {}
+        self._running_sessions: set = set()
+        self._pool = MCPServerPool.from_config(config, size=pool_size)
+        self._response_store = ResponseStore.from_config(config)
+        self._client = None
+        self._tools = {}
+        self._builtin_tools = {}
+
+    def start(self):
+        self._pool.start()
+        # The pool only knows the MCP tools, sessions also offer the built-in ones
+        self._builtin_tools = builtin_tools(self.config)
+        self._tools = {**self._pool.get_available_tools_dict(), **self._builtin_tools}
+        self._system_prompt_template = self.config.system_prompt
+        self._full_system_prompt = self._render_system_prompt(self._tools)
+        agent_class = AsyncAIAgentAnthropic if self.provider == "anthropic" else AsyncAIAgentAzure
+        self._client = agent_class.create_client(self.config)
+
+    def _render_system_prompt(self, tools: dict) -> str:
+        if self.config.use_llm_tools:
+            return self._system_prompt_template
+        return self._system_prompt_template.replace(
+            "{{mcp_tools}}", tools_markdown(tools, compact=self.config.compact_tool_schemas))
+
+    def _tenant(self, name: str) -> TenantLimits:
+        if name not in self._tenants:
+            self._tenants[name] = TenantLimits(**self._limits)
+        return self._tenants[name]
+
+    def _make_agent(self, question: str, journal: Optional[SessionJournal], limits: TenantLimits):
+        tools = select_tools(self._tools, question, self.config.tool_top_k, keep=self._builtin_tools)
+        system_prompt = self._full_system_prompt if tools is self._tools else self._render_system_prompt(tools)
+        config = dataclasses.replace(self.config, system_prompt=system_prompt)
+        if self.provider == "anthropic":
+            llm_tools = tools if config.use_llm_tools else {}
+            return AsyncAIAgentAnthropic(config=config, available_tools=llm_tools, response_store=self._response_store,
+                                         client=self._client, journal=journal, llm_limit=limits.llm)
+        return AsyncAIAgentAzure(config=config, response_store=self._response_store, client=self._client,
+                                 journal=journal, llm_limit=limits.llm)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """One request per connection; the response is streamed and the connection closed after it"""
+        try:
+            method, path, headers, body = await self._read_request(reader)
+        except (ValueError, asyncio.IncompleteReadError):
+            await self._respond(writer, 400, {"error": "malformed request"})
+            return
+        try:
+            if method == "GET" and path == "/stats":
+                await self._respond(writer, 200, {name: t.stats() for name, t in self._tenants.items()})
+            elif method == "POST" and path == "/sessions":
+                try:
+                    request = json.loads(body or b"{}")
+                except json.JSONDecodeError as e:
+                    await self._respond(writer, 400, {"error": f"invalid JSON body: {e}"})
+                    return
+                await self._serve_session(reader, writer, headers.get("x-tenant", "default"), request)
+            else:
+                await self._respond(writer, 404, {"error": f"no route for {method} {path}"})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader):
+        method, path, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        body = await reader.readexactly(int(headers.get("content-length", 0)))
+        return method, path.split("?", 1)[0], headers, body
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, payload: Any, extra_headers: str = ""):
+        body = json.dumps(payload).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n{extra_headers}Connection: close\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def _serve_session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, tenant: str,
+                             request: Dict[str, Any]):
+        limits = self._tenant(tenant)
+        if limits.admitted >= limits.max_admitted:
+            await self._respond(writer, 429, {"error": f"tenant '{tenant}' has too many sessions"},
+                                extra_headers="Retry-After: 1\r\n")
+            return
+        # Reserved before the first await, or concurrent requests could all pass the check above
+        limits.admitted += 1
+        try:
+            session_id = str(request.get("session_id") or uuid.uuid4().hex[:12])
+            session_key = f"{tenant}-{session_id}"
+            if session_key in self._running_sessions:
+                # Both would append to the same journal
+                await self._respond(writer, 409, {"error": f"session {session_id} is already running"})
+                return
+            self._running_sessions.add(session_key)
+            try:
+                await self._run_session(reader, writer, limits, session_id, session_key, request.get("prompt"))
+            finally:
+                self._running_sessions.discard(session_key)
+        finally:
+            limits.admitted -= 1
+
+    async def _run_session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, limits: TenantLimits,
+                           session_id: str, session_key: str, prompt: Optional[str]):
+        journal = None
+        if self.config.session_journal_dir:
+            # Loading a journal reads files, which must not stall the loop every session runs on
+            journal = await asyncio.get_running_loop().run_in_executor(
+                None, SessionJournal.from_config, self.config, session_key)
+        first_prompt = journal.first_prompt() if journal else None
+        if first_prompt and prompt and prompt != first_prompt:
+            await self._respond(writer, 409, {"error": f"session {session_id} already exists, "
+                                                       f"post its session_id without a prompt to resume it"})
+            return
+        prompt = prompt or first_prompt
+        if not prompt:
+            await self._respond(writer, 400, {"error": "prompt is required"})
+            return
+
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                     b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+        session = asyncio.ensure_future(self._stream_session(writer, limits, session_id, prompt, journal))
+        # The request body is read already, so EOF on the reader means the caller went away
+        disconnect = asyncio.ensure_future(reader.read())
+        done, _ = await asyncio.wait({session, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        if session not in done:
+            logger.info("[SERVICE] caller of session %s disconnected, cancelling it", session_id)
+            session.cancel()
+        disconnect.cancel()
+        await asyncio.gather(session, return_exceptions=True)
+
+    async def _stream_session(self, writer: asyncio.StreamWriter, limits: TenantLimits, session_id: str,
+                              prompt: str, journal: Optional[SessionJournal]):
+        async def send(event: Dict[str, Any]):
+            data = json.dumps(event, ensure_ascii=False).encode("utf-8") + b"\n"
+            writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+            # Waits while the caller's socket buffer is full, so a slow reader holds back only its own session
+            await writer.drain()
+
+        await send({"type": "session", "session_id": session_id})
+        if limits.sessions.locked():
+            await send({"type": "queued"})
+        async with limits.sessions:
+            limits.running += 1
+            try:
+                agent = self._make_agent(prompt, journal, limits)
+                tools = AsyncAgentTools(config=self.config, mcp_pool=self._pool, tool_limit=limits.tools)
+                tools.init()
+                events = run_agent_loop_async(prompt=prompt, ai_agent=agent, ai_agent_tools=tools,
+                                              action_parser=ActionParser(), max_turns=self.max_turns,
+                                              turn_timeout=self.config.turn_timeout)
+                try:
+                    async for event in events:
+                        await send(event)
+                finally:
+                    await events.aclose()
+                await send({"type": "usage", "turns": agent.turns, "usage": dict(agent.usage)})
+            except ConnectionError:
+                raise
+            except Exception as e:
+                logger.warning("[SERVICE] session %s failed: %s", session_id, e)
+                await send({"type": "error", "error": f"{type(e).__name__}: {e}"})
+            finally:
+                limits.running -= 1
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    def shutdown(self):
+        self._pool.shutdown()
+
+
+async def serve(service: AgentService, host: str, port: int):
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    print(f"[SYSTEM] Agent service listening on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve concurrent agent sessions over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--pool-size", type=int, default=2, help="Number of MCP server processes")
+    parser.add_argument("--max-turns", type=int, default=5)
+    parser.add_argument("--provider", choices=("anthropic", "azure"), default="anthropic")
+    parser.add_argument("--max-sessions", type=int, default=64, help="Concurrent sessions per tenant")
+    parser.add_argument("--max-queued", type=int, default=256, help="Sessions per tenant waiting for a slot")
+    parser.add_argument("--llm-concurrency", type=int, default=8, help="In-flight LLM calls per tenant")
+    parser.add_argument("--tool-concurrency", type=int, default=16, help="In-flight tool calls per tenant")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    config = AIAgentConfig.load_from_local(prompt_name_file="system_mcp.md")
+    service = AgentService(config, provider=args.provider, pool_size=args.pool_size, max_turns=args.max_turns,
+                           max_sessions=args.max_sessions, max_queued=args.max_queued,
+                           llm_concurrency=args.llm_concurrency, tool_concurrency=args.tool_concurrency)
+    exporters = start_exporters(config)
+    service.start()
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.shutdown()
+        exporters.stop()
+
+
+if __name__ == "__main__":
+    main()
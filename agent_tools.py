@@ -1,35 +1,248 @@
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Callable
 
-from mcp_client import MCPToolClient
+from blob_store import BlobStore, READ_BLOB_TOOL
+from mcp_client import ERROR_PREFIXES, MCPToolClient, TIMEOUT_PREFIX
+from mcp_federation import FederatedMCPClient
+from mcp_pool import MCPServerPool
+from resource_cache import ResourceCache
+from tool_cache import ToolResultCache
+from tool_catalog import ToolCatalogCache
+
+
+def is_tool_error(result: str) -> bool:
+    """True for the error strings MCPToolClient.call_tool returns instead of raising"""
+    return result.startswith(ERROR_PREFIXES)
+
+
+def builtin_tools(config) -> dict:
+    """Tools AgentTools serves itself next to the MCP tools: read_blob whenever the blob store is enabled"""
+    return {"read_blob": READ_BLOB_TOOL} if config.blob_store_dir and config.blob_threshold_bytes else {}
 
 
 class AgentTools:
-    def __init__(self, config):
+    def __init__(self, config, mcp_pool: MCPServerPool | None = None):
         self._mcp_tools_dict = None
         self._config = config
         self._mcp_client = None
+        self._mcp_pool = mcp_pool
+        self._cache = ToolResultCache(max_bytes=config.tool_cache_max_bytes)
+        self._executor: ThreadPoolExecutor | None = None
+        # The catalog cache is keyed by one server script, federated servers are always discovered live
+        self._federated = bool(config.mcp_servers) and len(config.mcp_servers) > 1
+        self._server_path = next(iter(config.mcp_servers.values())) if config.mcp_servers else config.mcp_server_path
+        self._catalog = ToolCatalogCache(config.tool_catalog_dir) \
+            if config.tool_catalog_dir and not self._federated else None
+        self._catalog_entry = None
+        self._ready = threading.Event()
+        self._connect_error: Exception | None = None
+        # Large observations go to the blob store, the built-in read_blob tool reads them back
+        self._blobs = BlobStore(config.blob_store_dir, threshold_bytes=config.blob_threshold_bytes) \
+            if config.blob_store_dir and config.blob_threshold_bytes else None
+        self._builtin_tools = builtin_tools(config)
 
-    def init(self):
-        if not self._mcp_client:
-            self._mcp_client = MCPToolClient(self._config.mcp_server_path)
-            self._mcp_client.connect()
+    def init(self, background: bool = False):
+        """Connect to the MCP server, or to all of config.mcp_servers in parallel when several are configured.
+
+        With background=True and a cached catalog for this server script, returns immediately with the
+        cached tools while the server starts in a thread; tool calls wait until it is ready.
+        """
+        if self._mcp_client:
+            return
+        if self._mcp_pool:
+            self._mcp_client = self._mcp_pool.lease()
             self._mcp_tools_dict = self._mcp_client.get_available_tools_dict()
-            print(f"[SYSTEM] Connected to MCP server with tools: {list(self._mcp_tools_dict.keys())}")
+            self._ready.set()
+            self._prefetch_resources()
+            return
+        resource_cache = ResourceCache(max_bytes=self._config.tool_cache_max_bytes)
+        if self._federated:
+            self._mcp_client = FederatedMCPClient(self._config.mcp_servers,
+                                                  connect_timeout=self._config.mcp_connect_timeout,
+                                                  resource_cache=resource_cache)
+            self._mcp_client.on_tools_changed(self._on_tools_changed)
+        else:
+            self._mcp_client = MCPToolClient(self._server_path, resource_cache=resource_cache)
+        if background and self._catalog:
+            self._catalog_entry = self._catalog.load(self._server_path)
+            if self._catalog_entry:
+                self._mcp_tools_dict = self._catalog_entry["tools"]
+                threading.Thread(target=self._connect, name="mcp-connect", daemon=True).start()
+                return
+        self._connect()
+        if self._connect_error:
+            error = self._connect_error
+            # Leave nothing latched, so init() can be retried
+            self._mcp_client.cleanup()
+            self._mcp_client = None
+            self._reset_connection()
+            raise error
+
+    def _reset_connection(self):
+        self._ready.clear()
+        self._connect_error = None
+
+    def _connect(self):
+        try:
+            self._mcp_client.connect()
+            tools = self._mcp_client.get_available_tools_dict()
+            if self._mcp_tools_dict is not None and tools != self._mcp_tools_dict:
+                print("[SYSTEM] MCP server tools differ from the cached catalog, refreshing it")
+            self._mcp_tools_dict = tools
+            if self._catalog and (self._catalog_entry is None or self._catalog_entry["tools"] != tools):
+                self._catalog_entry = {"tools": tools, "markdown": None}
+                self._catalog.save(self._server_path, tools)
+            print(f"[SYSTEM] Connected to MCP server with tools: {list(tools.keys())}")
+        except Exception as e:
+            self._connect_error = e
+        finally:
+            self._ready.set()
+        if not self._connect_error:
+            self._prefetch_resources()
+
+    def _on_tools_changed(self, tools: dict):
+        """A slow federated server came up late, its tools become callable from now on"""
+        self._mcp_tools_dict = tools
+
+    def _prefetch_resources(self):
+        if self._config.prefetch_resources:
+            self._mcp_client.prefetch_resources()
+
+    def _wait_ready(self):
+        if not self._mcp_client:
+            raise RuntimeError("MCP client not initialized. Call init() first.")
+        self._ready.wait()
+        if self._connect_error:
+            raise RuntimeError(f"MCP server failed to start: {self._connect_error}")
+
+    def get_tools_markdown(self, render: Callable[[dict], str], variant: str = "full") -> str:
+        """Rendered tool list for the system prompt, served from the catalog cache while the tools are unchanged.
+
+        variant names the rendering style so e.g. full and compact renderings are cached separately.
+        """
+        if self._builtin_tools:
+            variant = f"{variant}+{'+'.join(self._builtin_tools)}"
+        entry = self._catalog_entry
+        if entry and entry["tools"] == self._mcp_tools_dict and (entry.get("markdown") or {}).get(variant):
+            return entry["markdown"][variant]
+        markdown = render(self.get_available_tools())
+        if self._catalog and not self._mcp_pool:
+            rendered = dict(entry.get("markdown") or {}) if entry and entry["tools"] == self._mcp_tools_dict else {}
+            rendered[variant] = markdown
+            self._catalog_entry = {"tools": self._mcp_tools_dict, "markdown": rendered}
+            self._catalog.save(self._server_path, self._mcp_tools_dict, rendered)
+        return markdown
 
     def get_tool(self, tool_name: str) -> Callable | None:
         if not self._mcp_client:
             raise RuntimeError("MCP client not initialized. Call init() first.")
-        if tool_name not in self._mcp_tools_dict:
+        if tool_name not in self.get_available_tools():
             return None
-        def mcp_tool_wrapper(tool_input: str) -> str:
-            return self._mcp_client.call_tool(tool_name, json.loads(tool_input))
+
+        def mcp_tool_wrapper(tool_input: str, timeout: float | None = None) -> str:
+            return self.call_tool(tool_name, json.loads(tool_input), timeout=timeout)
         mcp_tool_wrapper.__name__ = f"mcp_{tool_name}"
         return mcp_tool_wrapper
 
+    def _call_timeout(self, timeout: float | None) -> float | None:
+        """The tighter of the caller's remaining budget and the configured per-call limit"""
+        limits = [t for t in (timeout, self._config.tool_timeout) if t is not None]
+        return min(limits) if limits else None
+
+    def call_tool(self, tool_name: str, arguments: dict, timeout: float | None = None) -> str:
+        """Call a tool with already-parsed arguments, serving cacheable tools from the result cache.
+
+        timeout is the caller's remaining budget in seconds; the call is cancelled when it runs out.
+        """
+        if tool_name in self._builtin_tools:
+            return self._call_builtin(tool_name, arguments)
+        self._wait_ready()
+        timeout = self._call_timeout(timeout)
+        if timeout is not None and timeout <= 0:
+            return f"{TIMEOUT_PREFIX}: no time left in this turn to run '{tool_name}'"
+        cache_policy = self._mcp_tools_dict.get(tool_name, {}).get("cachePolicy", {"policy": "never"})
+        if not self._cache.is_cacheable(cache_policy):
+            return self._observation(self._mcp_client.call_tool(tool_name, arguments, timeout=timeout))
+        key = self._cache.make_key(tool_name, arguments)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        result = self._observation(self._mcp_client.call_tool(tool_name, arguments, timeout=timeout))
+        if not is_tool_error(result):
+            self._cache.put(key, result, cache_policy)
+        return result
+
+    def _observation(self, result: str) -> str:
+        """Bound what goes into the prompt: large results are replaced by a blob handle and a preview"""
+        return self._blobs.observation(result) if self._blobs else result
+
+    def _call_builtin(self, tool_name: str, arguments: dict) -> str:
+        try:
+            return self._blobs.read(arguments)
+        except ValueError as e:
+            return f"Tool execution error: {e}"
+
+    def run_tool_uses(self, tool_uses: list[dict], timeout: float | None = None) -> list[dict]:
+        """Run all tool_use blocks of a turn concurrently and return matching tool_result blocks"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="agent-tool")
+
+        available_tools = self.get_available_tools()
+
+        def run(tool_use: dict) -> dict:
+            if tool_use["name"] not in available_tools:
+                result = f'Unknown tool "{tool_use["name"]}". Available tools: {list(available_tools.keys())}'
+            else:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                result = self.call_tool(tool_use["name"], tool_use["input"], timeout=remaining)
+            return {
+                "type": "tool_result",
+                "tool_use_id": tool_use["id"],
+                "content": result,
+                "is_error": tool_use["name"] not in available_tools or is_tool_error(result),
+            }
+
+        return list(self._executor.map(run, tool_uses))
+
+    def list_resources(self) -> list[dict]:
+        """Concrete resources and resource templates the MCP server exposes"""
+        self._wait_ready()
+        return self._mcp_client.list_resources() + self._mcp_client.list_resource_templates()
+
+    def read_resource(self, uri: str, timeout: float | None = None) -> str:
+        """Text of a resource, from the resource cache when valid; errors come back as text like tool errors"""
+        self._wait_ready()
+        try:
+            contents = self._mcp_client.read_resource(uri, timeout=self._call_timeout(timeout))
+        except (RuntimeError, TimeoutError) as e:
+            return f"Resource read failed: {e}"
+        return self._observation("\n".join(item["text"] if "text" in item else f"[binary {item.get('mimeType', 'data')}]"
+                                            for item in contents))
+
     def get_available_tools(self):
-        return self._mcp_tools_dict
+        if not self._builtin_tools:
+            return self._mcp_tools_dict
+        return {**self._mcp_tools_dict, **self._builtin_tools}
+
+    def cache_stats(self):
+        return self._cache.stats()
+
+    def resource_cache_stats(self):
+        return self._mcp_client.resource_cache_stats() if self._mcp_client else {}
 
     def cleanup(self):
         if self._mcp_client:
+            # Don't tear the client down under a connect still running in the background
+            self._ready.wait(timeout=10)
             self._mcp_client.cleanup()
+            self._mcp_client = None
+            self._reset_connection()
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self._blobs:
+            self._blobs.close()
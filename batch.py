@@ -0,0 +1,178 @@
+"""
+Batch runner
+Runs run_agent_loop for every prompt in a JSONL file with bounded concurrency,
+sharing MCP server processes and HTTP clients across sessions
+
+    python batch.py prompts.jsonl --output results.jsonl --concurrency 8
+
+Input lines need an id ("id" or "request_id") and a prompt ("prompt", or "title" and "body").
+Sessions already recorded as ok in the output file are skipped, so a crashed run can be resumed;
+with SESSION_JOURNAL_DIR set, sessions that were in flight continue from their last journaled turn.
+"""
+import argparse
+import dataclasses
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, Set
+
+from agent import AIAgentAnthropic, AIAgentAzure
+from agent_logging import configure_logging
+from agent_tools import AgentTools, builtin_tools
+from llm_store import ResponseStore
+from main import run_agent_loop, tools_markdown
+from mcp_pool import MCPServerPool
+from metrics import start_exporters
+from session_journal import SessionJournal
+from tool_index import select_tools
+from utils import AIAgentConfig, ActionParser
+
+
+def read_prompts(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream prompt records from a JSONL file without loading it whole"""
+    with open(path, "r", encoding="utf-8") as file:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            session_id = record.get("id", record.get("request_id", f"line-{line_number}"))
+            prompt = record.get("prompt")
+            if prompt is None:
+                prompt = "\n\n".join(part for part in (record.get("title"), record.get("body")) if part)
+            yield {"id": str(session_id), "prompt": prompt}
+
+
+def completed_ids(output_path: str) -> Set[str]:
+    """Ids already finished successfully in a previous run of the same output file"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+class BatchRunner:
+    def __init__(self, config: AIAgentConfig, provider: str = "anthropic", concurrency: int = 4,
+                 pool_size: int = 2, max_turns: int = 5):
+        self.config = config
+        self.provider = provider
+        self.concurrency = concurrency
+        self.max_turns = max_turns
+        self._pool = MCPServerPool.from_config(config, size=pool_size)
+        self._client = None
+        self._tools = {}
+        self._builtin_tools = {}
+        self._response_store = ResponseStore.from_config(config)
+        self._write_lock = threading.Lock()
+
+    def start(self):
+        self._pool.start()
+        # The pool only knows the MCP tools, sessions also offer the built-in ones
+        self._builtin_tools = builtin_tools(self.config)
+        self._tools = {**self._pool.get_available_tools_dict(), **self._builtin_tools}
+        self._system_prompt_template = self.config.system_prompt
+        self._full_system_prompt = self._render_system_prompt(self._tools)
+        agent_class = AIAgentAnthropic if self.provider == "anthropic" else AIAgentAzure
+        self._client = agent_class.create_client(self.config)
+
+    def _render_system_prompt(self, tools: dict) -> str:
+        if self.config.use_llm_tools:
+            return self._system_prompt_template
+        return self._system_prompt_template.replace(
+            "{{mcp_tools}}", tools_markdown(tools, compact=self.config.compact_tool_schemas))
+
+    def _make_agent(self, question: str, session_id: str):
+        tools = select_tools(self._tools, question, self.config.tool_top_k, keep=self._builtin_tools)
+        system_prompt = self._full_system_prompt if tools is self._tools else self._render_system_prompt(tools)
+        config = dataclasses.replace(self.config, system_prompt=system_prompt)
+        journal = SessionJournal.from_config(config, session_id)
+        if self.provider == "anthropic":
+            llm_tools = tools if config.use_llm_tools else {}
+            return AIAgentAnthropic(config=config, available_tools=llm_tools,
+                                    response_store=self._response_store, client=self._client, journal=journal)
+        return AIAgentAzure(config=config, response_store=self._response_store, client=self._client,
+                            journal=journal)
+
+    def run_session(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        agent = None
+        try:
+            agent = self._make_agent(record["prompt"], record["id"])
+            tools = AgentTools(config=self.config, mcp_pool=self._pool)
+            tools.init()
+            answer = run_agent_loop(prompt=record["prompt"], ai_agent=agent, ai_agent_tools=tools,
+                                    action_parser=ActionParser(), max_turns=self.max_turns,
+                                    turn_timeout=self.config.turn_timeout)
+            result = {"id": record["id"], "status": "ok", "answer": answer}
+        except Exception as e:
+            result = {"id": record["id"], "status": "error", "error": f"{type(e).__name__}: {e}"}
+        result["latency_s"] = time.perf_counter() - started
+        result["turns"] = agent.turns if agent else 0
+        result["usage"] = dict(agent.usage) if agent else {}
+        return result
+
+    def run(self, input_path: str, output_path: str) -> Dict[str, int]:
+        skip = completed_ids(output_path)
+        counts = {"ok": 0, "error": 0, "skipped": 0}
+        # Bounds queued sessions so the input file is streamed rather than read up front
+        slots = threading.BoundedSemaphore(self.concurrency * 2)
+
+        with open(output_path, "a", encoding="utf-8") as output, \
+                ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch") as executor:
+            def finish(future):
+                try:
+                    result = future.result()
+                    with self._write_lock:
+                        output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                        output.flush()
+                        counts[result["status"]] += 1
+                finally:
+                    slots.release()
+
+            for record in read_prompts(input_path):
+                if record["id"] in skip:
+                    counts["skipped"] += 1
+                    continue
+                slots.acquire()
+                executor.submit(self.run_session, record).add_done_callback(finish)
+        return counts
+
+    def shutdown(self):
+        self._pool.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the agent over a JSONL file of prompts")
+    parser.add_argument("input", help="JSONL file with one prompt per line")
+    parser.add_argument("--output", default="results.jsonl", help="JSONL file to append results to")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--pool-size", type=int, default=2, help="Number of MCP server processes")
+    parser.add_argument("--max-turns", type=int, default=5)
+    parser.add_argument("--provider", choices=("anthropic", "azure"), default="anthropic")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    config = AIAgentConfig.load_from_local(prompt_name_file="system_mcp.md")
+    runner = BatchRunner(config, provider=args.provider, concurrency=args.concurrency,
+                         pool_size=args.pool_size, max_turns=args.max_turns)
+    exporters = start_exporters(config)
+    runner.start()
+    try:
+        counts = runner.run(args.input, args.output)
+    finally:
+        runner.shutdown()
+        exporters.stop()
+    print(f"[SYSTEM] Batch finished: {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Agent loop benchmark
+Runs run_agent_loop end to end against the fake LLM server and a real MCP server,
+breaking each turn down into LLM, parse, tool and logging time
+"""
+import contextlib
+import io
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+from agent import AIAgentAnthropic, AIAgentAzure
+from agent_tools import AgentTools
+from benchmarks.common import REPO_ROOT, summarize
+from benchmarks.fake_llm_server import FakeLLMServer
+from main import run_agent_loop, tools_markdown
+from mcp_pool import MCPServerPool
+from utils import AIAgentConfig, ActionParser, load_prompt
+
+
+class Timings:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def measure(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            with self._lock:
+                self.samples[name].append(elapsed)
+
+
+class TimedAgent:
+    def __init__(self, agent, timings: Timings):
+        self._agent = agent
+        self._timings = timings
+
+    def __call__(self, message):
+        with self._timings.measure("llm"):
+            return self._agent(message)
+
+    def __getattr__(self, name):
+        return getattr(self._agent, name)
+
+
+class TimedParser:
+    def __init__(self, parser, timings: Timings):
+        self._parser = parser
+        self._timings = timings
+
+    def __call__(self, text):
+        with self._timings.measure("parse"):
+            return self._parser(text)
+
+
+class TimedTools:
+    def __init__(self, tools: AgentTools, timings: Timings):
+        self._tools = tools
+        self._timings = timings
+
+    def get_tool(self, tool_name: str):
+        tool = self._tools.get_tool(tool_name)
+        if tool is None:
+            return None
+
+        def timed_tool(tool_input: str, timeout=None) -> str:
+            with self._timings.measure("tool"):
+                return tool(tool_input, timeout=timeout)
+        return timed_tool
+
+    def run_tool_uses(self, tool_uses, timeout=None):
+        with self._timings.measure("tool"):
+            return self._tools.run_tool_uses(tool_uses, timeout=timeout)
+
+    def __getattr__(self, name):
+        return getattr(self._tools, name)
+
+
+class TimedSink(io.TextIOBase):
+    """stdout replacement that writes to os.devnull and records the time spent writing"""
+
+    def __init__(self, timings: Timings):
+        self._timings = timings
+        self._target = open(os.devnull, "w")
+
+    def write(self, text: str) -> int:
+        with self._timings.measure("logging"):
+            return self._target.write(text)
+
+    def close(self):
+        self._target.close()
+        super().close()
+
+
+def make_config(base_url: str, provider: str) -> AIAgentConfig:
+    return AIAgentConfig(
+        azure_api_key="fake",
+        azure_api_version="2024-10-21",
+        azure_endpoint=base_url,
+        anthropic_api_key="fake",
+        tavily_api_key="fake",
+        system_prompt=load_prompt("system_mcp.md"),
+        mcp_server_path=str(REPO_ROOT / "mcp_server.py"),
+        anthropic_base_url=base_url if provider == "anthropic" else None,
+    )
+
+
+def run(sessions: int = 20, concurrency: int = 1, llm_latency: float = 0.0, provider: str = "anthropic",
+        pool_size: int = 2) -> Dict[str, Any]:
+    timings = Timings()
+    with FakeLLMServer(latency=llm_latency) as llm:
+        config = make_config(llm.base_url, provider)
+        pool = MCPServerPool.from_config(config, size=pool_size)
+        pool.start()
+        config.system_prompt = config.system_prompt.replace(
+            "{{mcp_tools}}", tools_markdown(pool.get_available_tools_dict()))
+
+        def session(_):
+            tools = AgentTools(config=config, mcp_pool=pool)
+            tools.init()
+            if provider == "anthropic":
+                agent = AIAgentAnthropic(config=config, available_tools={})
+            else:
+                agent = AIAgentAzure(config=config)
+            with timings.measure("session"):
+                run_agent_loop(
+                    prompt="Echo benchmark",
+                    ai_agent=TimedAgent(agent, timings),
+                    ai_agent_tools=TimedTools(tools, timings),
+                    action_parser=TimedParser(ActionParser(), timings),
+                )
+
+        try:
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(TimedSink(timings)):
+                with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                    list(executor.map(session, range(sessions)))
+            elapsed = time.perf_counter() - started
+        finally:
+            pool.shutdown()
+
+    turns = len(timings.samples["llm"])
+    return {
+        "provider": provider,
+        "sessions": sessions,
+        "concurrency": concurrency,
+        "llm_latency_ms": llm_latency * 1000,
+        "turns": turns,
+        "turns_per_sec": turns / elapsed if elapsed else 0.0,
+        "session": summarize(timings.samples["session"]),
+        "breakdown": {name: summarize(timings.samples[name]) for name in ("llm", "parse", "tool", "logging")},
+        "logging_ms_per_turn": sum(timings.samples["logging"]) * 1000 / max(turns, 1),
+    }
@@ -0,0 +1,65 @@
+"""
+MCP round-trip benchmark
+Measures MCPToolClient.call_tool latency and throughput against the stdio MCP servers
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from benchmarks.common import REPO_ROOT, summarize
+from mcp_client import MCPToolClient
+
+SERVERS = {
+    "mcp_server": (str(REPO_ROOT / "mcp_server.py"), "echo", {"text": "benchmark"}),
+    "mcp_server_fast": (str(REPO_ROOT / "mcp_server_fast.py"), "greet", {"name": "benchmark"}),
+}
+
+
+def bench_call_tool(server_path: str, tool_name: str, arguments: Dict[str, Any], calls: int = 500,
+                    concurrency: int = 8, payload_bytes: Optional[int] = None) -> Dict[str, Any]:
+    if payload_bytes:
+        arguments = {key: "x" * payload_bytes if isinstance(value, str) else value
+                     for key, value in arguments.items()}
+    client = MCPToolClient(server_path)
+    started = time.perf_counter()
+    client.connect()
+    connect_s = time.perf_counter() - started
+    try:
+        client.call_tool(tool_name, arguments)
+
+        latencies = []
+        for _ in range(calls):
+            t0 = time.perf_counter()
+            client.call_tool(tool_name, arguments)
+            latencies.append(time.perf_counter() - t0)
+
+        def timed_call(_):
+            t0 = time.perf_counter()
+            client.call_tool(tool_name, arguments)
+            return time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            concurrent_latencies = list(executor.map(timed_call, range(calls)))
+        concurrent_s = time.perf_counter() - t0
+    finally:
+        client.cleanup()
+
+    return {
+        "connect_ms": connect_s * 1000,
+        "sequential": summarize(latencies),
+        "sequential_calls_per_sec": calls / sum(latencies),
+        "concurrent": summarize(concurrent_latencies),
+        "concurrent_calls_per_sec": calls / concurrent_s,
+        "concurrency": concurrency,
+    }
+
+
+def run(calls: int = 500, concurrency: int = 8) -> Dict[str, Any]:
+    results = {}
+    for name, (path, tool_name, arguments) in SERVERS.items():
+        try:
+            results[name] = bench_call_tool(path, tool_name, arguments, calls=calls, concurrency=concurrency)
+        except Exception as e:
+            results[name] = {"error": str(e)}
+    return results
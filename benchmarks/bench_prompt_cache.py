@@ -0,0 +1,76 @@
+"""
+Prompt cache benchmark
+Runs long AIAgentAnthropic sessions against the fake LLM server, which simulates the prompt cache,
+and reports the cache reads and writes of every turn, with and without context compaction
+
+    python -m benchmarks.bench_prompt_cache --turns 30
+"""
+import argparse
+import time
+from typing import Any, Dict, List, Optional
+
+from agent import AIAgentAnthropic
+from benchmarks.bench_agent_loop import make_config
+from benchmarks.fake_llm_server import FakeLLMServer
+
+SCRIPT = ['Thought: I need more data\nAction: echo: {"text": "more"}\nPAUSE']
+
+
+def run_session(turns: int, observation_chars: int, budget_tokens: Optional[int]) -> Dict[str, Any]:
+    # A server per session, so one session can't read what the other wrote to the simulated cache
+    with FakeLLMServer(script=SCRIPT) as llm:
+        return _run_session(llm.base_url, turns, observation_chars, budget_tokens)
+
+
+def _run_session(base_url: str, turns: int, observation_chars: int, budget_tokens: Optional[int]) -> Dict[str, Any]:
+    config = make_config(base_url, "anthropic")
+    config.system_prompt = config.system_prompt.replace("{{mcp_tools}}", "")
+    config.context_budget_tokens = budget_tokens
+    agent = AIAgentAnthropic(config=config, available_tools={})
+    per_turn: List[Dict[str, int]] = []
+    prompt = "Collect the benchmark observations"
+    for turn in range(turns):
+        agent(prompt)
+        per_turn.append(dict(agent.last_usage))
+        prompt = f"Observation: result {turn} " + "lorem ipsum " * (observation_chars // 12)
+    prompt_tokens = sum(u["input_tokens"] + u["cache_read_input_tokens"] + u["cache_creation_input_tokens"]
+                        for u in per_turn)
+    return {
+        "context_budget_tokens": budget_tokens or 0,
+        "per_turn": per_turn,
+        "input_tokens": sum(u["input_tokens"] for u in per_turn),
+        "cache_read_tokens": sum(u["cache_read_input_tokens"] for u in per_turn),
+        "cache_write_tokens": sum(u["cache_creation_input_tokens"] for u in per_turn),
+        "cache_hit_ratio": sum(u["cache_read_input_tokens"] for u in per_turn) / max(prompt_tokens, 1),
+    }
+
+
+def run(turns: int = 30, observation_chars: int = 6000, budget_tokens: int = 20000) -> Dict[str, Any]:
+    started = time.perf_counter()
+    results = {
+        "turns": turns,
+        "no_compaction": run_session(turns, observation_chars, None),
+        "compaction": run_session(turns, observation_chars, budget_tokens),
+    }
+    results["elapsed_ms"] = (time.perf_counter() - started) * 1000
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report prompt cache reads and writes per turn")
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--observation-chars", type=int, default=6000)
+    parser.add_argument("--budget-tokens", type=int, default=20000, help="Context budget of the compacting run")
+    args = parser.parse_args(argv)
+    results = run(turns=args.turns, observation_chars=args.observation_chars, budget_tokens=args.budget_tokens)
+    for name in ("no_compaction", "compaction"):
+        session = results[name]
+        print(f"[BENCH] {name}: hit ratio {session['cache_hit_ratio']:.1%}, {session['cache_read_tokens']} read, "
+              f"{session['cache_write_tokens']} written, {session['input_tokens']} uncached")
+        for turn, usage in enumerate(session["per_turn"], start=1):
+            print(f"[BENCH]   turn {turn}: {usage['input_tokens']} input, {usage['cache_read_input_tokens']} "
+                  f"cache read, {usage['cache_creation_input_tokens']} cache write")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Startup benchmark
+Measures time from interpreter start to the first completed tool call in a fresh process
+"""
+import json
+import subprocess
+import sys
+import time
+from typing import Any, Dict
+
+from benchmarks.common import REPO_ROOT, summarize
+
+STARTUP_SCRIPT = """
+import json, time
+t0 = time.perf_counter()
+from agent import AIAgentAnthropic
+from agent_tools import AgentTools
+from utils import AIAgentConfig
+t_import = time.perf_counter()
+config = AIAgentConfig(azure_api_key="", azure_api_version="", azure_endpoint="", anthropic_api_key="",
+                       tavily_api_key="", system_prompt="", mcp_server_path={server_path!r})
+tools = AgentTools(config=config)
+tools.init()
+t_connect = time.perf_counter()
+tools.get_tool("echo")('{{"text": "startup"}}')
+t_first_call = time.perf_counter()
+tools.cleanup()
+print(json.dumps({{"import_s": t_import - t0, "connect_s": t_connect - t_import,
+                  "first_call_s": t_first_call - t_connect}}))
+"""
+
+
+def run(runs: int = 5) -> Dict[str, Any]:
+    script = STARTUP_SCRIPT.format(server_path=str(REPO_ROOT / "mcp_server.py"))
+    samples = {"total": [], "import": [], "connect": [], "first_call": []}
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        completed = subprocess.run([sys.executable, "-c", script], cwd=REPO_ROOT, capture_output=True, text=True)
+        total = time.perf_counter() - t0
+        if completed.returncode != 0:
+            return {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "failed"}
+        phases = json.loads(completed.stdout.strip().splitlines()[-1])
+        samples["total"].append(total)
+        samples["import"].append(phases["import_s"])
+        samples["connect"].append(phases["connect_s"])
+        samples["first_call"].append(phases["first_call_s"])
+    return {name: summarize(values) for name, values in samples.items()}
@@ -0,0 +1,69 @@
+"""
+Wire format benchmark
+Codec throughput in-process, and MCP echo round trips for each wire format, for small and large messages
+"""
+import io
+import json
+import time
+from typing import Any, Dict
+
+import mcp_wire
+from benchmarks.common import REPO_ROOT, summarize
+from mcp_client import MCPToolClient
+
+SIZES = {"small": 100, "large": 1024 * 1024}
+
+
+def _message(size: int) -> Dict[str, Any]:
+    return {"jsonrpc": "2.0", "id": 1, "result": {"content": [{"type": "text", "text": "x" * size}]}}
+
+
+def bench_codec(codec, message: Dict[str, Any], seconds: float = 0.5) -> Dict[str, float]:
+    encoded = codec.encode(message)
+    iterations, started = 0, time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        codec.read(io.BytesIO(codec.encode(message)))
+        iterations += 1
+    elapsed = time.perf_counter() - started
+    return {"frame_bytes": len(encoded), "messages_per_sec": iterations / elapsed,
+            "mb_per_sec": iterations * len(encoded) / elapsed / 1e6}
+
+
+class _StdlibJsonLines:
+    """The pre-negotiation transport: stdlib json, one line per message"""
+    name = "stdlib-json"
+
+    def encode(self, message):
+        return (json.dumps(message) + "\n").encode("utf-8")
+
+    def read(self, stream):
+        return json.loads(stream.readline())
+
+
+def bench_round_trip(wire_format: str, size: int, calls: int) -> Dict[str, Any]:
+    client = MCPToolClient(str(REPO_ROOT / "mcp_server.py"), wire_formats=[wire_format])
+    client.connect()
+    try:
+        arguments = {"text": "x" * size}
+        client.call_tool("echo", arguments)
+        latencies = []
+        for _ in range(calls):
+            t0 = time.perf_counter()
+            client.call_tool("echo", arguments)
+            latencies.append(time.perf_counter() - t0)
+    finally:
+        client.cleanup()
+    return dict(summarize(latencies), calls_per_sec=calls / sum(latencies), negotiated=client.wire_format)
+
+
+def run(calls: int = 200) -> Dict[str, Any]:
+    codecs = [_StdlibJsonLines()] + [mcp_wire.get_codec(name) for name in mcp_wire.supported_formats()]
+    results: Dict[str, Any] = {"codecs": {}, "round_trip": {}, "orjson": mcp_wire.orjson is not None}
+    for label, size in SIZES.items():
+        message = _message(size)
+        results["codecs"][label] = {codec.name: bench_codec(codec, message) for codec in codecs}
+        results["round_trip"][label] = {
+            wire_format: bench_round_trip(wire_format, size, calls if label == "small" else max(1, calls // 10))
+            for wire_format in mcp_wire.supported_formats()
+        }
+    return results
@@ -0,0 +1,228 @@
+"""
+Fake LLM Server
+Local stand-in for the Anthropic Messages and Azure OpenAI chat completions APIs with scripted outputs
+"""
+import hashlib
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+DEFAULT_SCRIPT = [
+    'Thought: I should echo the text\nAction: echo: {"text": "benchmark"}\nPAUSE',
+    "Answer: benchmark",
+]
+
+
+class FakeLLMServer:
+    """Serves scripted replies with a configurable latency.
+
+    The reply is chosen by the number of assistant turns already in the request, so concurrent
+    sessions each walk through the script independently. Every response carries rate-limit headers
+    for requests_per_minute, and the first fail_first requests are rejected with 429 and retry-after.
+    Anthropic requests go through a simulated prompt cache: the prefixes ending at cache_control
+    breakpoints are remembered, and usage reports cache reads and writes the way the API does.
+    """
+
+    def __init__(self, script: Optional[List[str]] = None, latency: float = 0.0, host: str = "127.0.0.1",
+                 port: int = 0, requests_per_minute: int = 4000, fail_first: int = 0, retry_after: float = 0.1):
+        self.script = script or DEFAULT_SCRIPT
+        self.latency = latency
+        self.requests_per_minute = requests_per_minute
+        self.fail_first = fail_first
+        self.retry_after = retry_after
+        self.requests = 0
+        self.prompt_cache = PromptCache()
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeLLMServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reply_for(self, messages: list) -> str:
+        turn = sum(1 for m in messages if m.get("role") == "assistant")
+        return self.script[min(turn, len(self.script) - 1)]
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))) or b"{}")
+                with server._lock:
+                    server.requests += 1
+                    rejected = server.requests <= server.fail_first
+                if rejected:
+                    self._send_json({"type": "error", "error": {"type": "rate_limit_error",
+                                                                "message": "Fake rate limit"}}, status=429)
+                    return
+                if server.latency:
+                    time.sleep(server.latency)
+                text = server.reply_for(body.get("messages", []))
+                if self.path.rstrip("/").endswith("/messages"):
+                    usage = server.prompt_cache.usage(body, text)
+                    if body.get("stream"):
+                        self._send_anthropic_stream(body, text, usage)
+                    else:
+                        self._send_json(anthropic_message(body, text, usage))
+                elif self.path.split("?")[0].endswith("/chat/completions"):
+                    self._send_json(openai_completion(body, text))
+                else:
+                    self._send_json({"error": {"message": f"Unknown path {self.path}"}}, status=404)
+
+            def _send_json(self, payload: dict, status: int = 200):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(data)))
+                self._send_rate_limit_headers(status)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_rate_limit_headers(self, status: int):
+                limit = server.requests_per_minute
+                remaining = max(0, limit - server.requests)
+                for prefix in ("anthropic-ratelimit-requests", "x-ratelimit"):
+                    suffix = "" if prefix.startswith("anthropic") else "-requests"
+                    self.send_header(f"{prefix}-limit{suffix}", str(limit))
+                    self.send_header(f"{prefix}-remaining{suffix}", str(remaining))
+                if status == 429:
+                    self.send_header("retry-after", str(server.retry_after))
+
+            def _send_anthropic_stream(self, body: dict, text: str, usage: dict):
+                self.send_response(200)
+                self.send_header("content-type", "text/event-stream")
+                self.send_header("connection", "close")
+                self.end_headers()
+                for event in anthropic_stream_events(body, text, usage=usage):
+                    self.wfile.write(f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+
+def _apply_stop_sequences(body: dict, text: str):
+    for stop in body.get("stop_sequences") or []:
+        if stop in text:
+            return text[:text.index(stop)], "stop_sequence", stop
+    return text, "end_turn", None
+
+
+def _usage(body: dict, text: str) -> dict:
+    prompt = json.dumps(body.get("system", "")) + json.dumps(body.get("messages", []))
+    return {"input_tokens": len(prompt) // 4 + 1, "output_tokens": len(text) // 4 + 1}
+
+
+def _prompt_blocks(body: dict):
+    """The prompt in cache prefix order (tools, system, messages) as (serialized block, is breakpoint)"""
+    system = body.get("system") or []
+    blocks = list(body.get("tools") or [])
+    blocks += [{"type": "text", "text": system}] if isinstance(system, str) else system
+    for message in body.get("messages", []):
+        content = message.get("content", "")
+        for block in [{"type": "text", "text": content}] if isinstance(content, str) else content:
+            blocks.append(dict(block, role=message.get("role")))
+    for block in blocks:
+        marked = "cache_control" in block
+        yield json.dumps({k: v for k, v in block.items() if k != "cache_control"}, sort_keys=True), marked
+
+
+class PromptCache:
+    """Prompt prefixes written at cache_control breakpoints, keyed by their hash"""
+
+    def __init__(self):
+        self._prefixes = set()
+        self._lock = threading.Lock()
+
+    def usage(self, body: dict, text: str) -> dict:
+        digest = hashlib.sha256()
+        tokens, breakpoints = 0, []
+        for block, marked in _prompt_blocks(body):
+            digest.update(block.encode("utf-8"))
+            tokens += len(block) // 4 + 1
+            if marked:
+                breakpoints.append((digest.hexdigest(), tokens))
+        read = written = 0
+        with self._lock:
+            # The longest cached prefix is read, every breakpoint past it is written
+            for key, prefix_tokens in reversed(breakpoints):
+                if key in self._prefixes:
+                    read = prefix_tokens
+                    break
+            for key, prefix_tokens in breakpoints:
+                if prefix_tokens > read:
+                    self._prefixes.add(key)
+                    written = prefix_tokens - read
+        text = _apply_stop_sequences(body, text)[0]
+        return {"input_tokens": tokens - read - written, "output_tokens": len(text) // 4 + 1,
+                "cache_read_input_tokens": read, "cache_creation_input_tokens": written}
+
+
+def anthropic_message(body: dict, text: str, usage: Optional[dict] = None) -> dict:
+    text, stop_reason, stop_sequence = _apply_stop_sequences(body, text)
+    return {
+        "id": f"msg_{uuid.uuid4().hex[:24]}",
+        "type": "message",
+        "role": "assistant",
+        "model": body.get("model", "fake"),
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": stop_reason,
+        "stop_sequence": stop_sequence,
+        "usage": usage or _usage(body, text),
+    }
+
+
+def anthropic_stream_events(body: dict, text: str, chunk_size: int = 8, usage: Optional[dict] = None):
+    message = anthropic_message(body, text, usage)
+    text = message["content"][0]["text"]
+    yield {"type": "message_start", "message": dict(message, content=[], stop_reason=None,
+                                                    usage=dict(message["usage"], output_tokens=0))}
+    yield {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}
+    for i in range(0, len(text), chunk_size):
+        yield {"type": "content_block_delta", "index": 0,
+               "delta": {"type": "text_delta", "text": text[i:i + chunk_size]}}
+    yield {"type": "content_block_stop", "index": 0}
+    yield {"type": "message_delta", "delta": {"stop_reason": message["stop_reason"],
+                                              "stop_sequence": message["stop_sequence"]},
+           "usage": {"output_tokens": message["usage"]["output_tokens"]}}
+    yield {"type": "message_stop"}
+
+
+def openai_completion(body: dict, text: str) -> dict:
+    usage = _usage(body, text)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": usage["input_tokens"], "completion_tokens": usage["output_tokens"],
+                  "total_tokens": usage["input_tokens"] + usage["output_tokens"]},
+    }
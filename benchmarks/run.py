@@ -0,0 +1,110 @@
+"""
+Benchmark runner
+Runs the suites, stores results as JSON and flags regressions against a baseline run
+
+    python -m benchmarks.run --output benchmarks/results/latest.json --baseline benchmarks/results/main.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, Tuple
+
+from benchmarks.common import REPO_ROOT
+
+SUITES = ("mcp", "wire", "startup", "agent", "cache")
+
+
+def run_suite(name: str, args) -> Dict[str, Any]:
+    try:
+        if name == "mcp":
+            from benchmarks import bench_mcp
+            return bench_mcp.run(calls=args.calls, concurrency=args.concurrency)
+        if name == "wire":
+            from benchmarks import bench_wire
+            return bench_wire.run(calls=args.calls)
+        if name == "startup":
+            from benchmarks import bench_startup
+            return bench_startup.run(runs=args.startup_runs)
+        if name == "agent":
+            from benchmarks import bench_agent_loop
+            return bench_agent_loop.run(sessions=args.sessions, concurrency=args.concurrency,
+                                        llm_latency=args.llm_latency, provider=args.provider)
+        if name == "cache":
+            from benchmarks import bench_prompt_cache
+            return bench_prompt_cache.run(turns=args.cache_turns)
+    except ImportError as e:
+        return {"error": f"suite unavailable: {e}"}
+    raise ValueError(f"Unknown suite {name}")
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Iterator[Tuple[str, float]]:
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from flatten(value, path)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, float(value)
+
+
+def higher_is_better(metric: str) -> bool:
+    return metric.endswith("per_sec")
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> list:
+    """Metrics that got worse than the baseline by more than threshold (a fraction)"""
+    baseline_metrics = dict(flatten(baseline))
+    regressions = []
+    for metric, value in flatten(current):
+        if not (metric.endswith("_ms") or metric.endswith("per_sec")) or metric not in baseline_metrics:
+            continue
+        before = baseline_metrics[metric]
+        if before <= 0:
+            continue
+        change = (value - before) / before
+        if (-change if higher_is_better(metric) else change) > threshold:
+            regressions.append({"metric": metric, "baseline": before, "current": value, "change": change})
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run the ai-agents benchmark suite")
+    parser.add_argument("--suite", choices=SUITES, action="append", help="Suite to run (default: all)")
+    parser.add_argument("--output", type=Path, help="Where to write the JSON results")
+    parser.add_argument("--baseline", type=Path, help="Previous results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative slowdown")
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--startup-runs", type=int, default=5)
+    parser.add_argument("--cache-turns", type=int, default=30, help="Turns of each prompt cache session")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Fake LLM latency in seconds")
+    parser.add_argument("--provider", choices=("anthropic", "azure"), default="anthropic")
+    args = parser.parse_args(argv)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": {name: run_suite(name, args) for name in (args.suite or SUITES)},
+    }
+    output = args.output or REPO_ROOT / "benchmarks" / "results" / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"[BENCH] Results written to {output}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        regressions = compare(report["results"], baseline["results"], args.threshold)
+        for regression in regressions:
+            print(f"[BENCH] REGRESSION {regression['metric']}: {regression['baseline']:.3f} -> "
+                  f"{regression['current']:.3f} ({regression['change']:+.1%})")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""
+Blob Store
+Content-addressed local store for large tool observations. The model sees a short handle
+and a preview; the read_blob tool serves line or byte ranges and grep matches from the
+memory-mapped blob, so prompt size stays bounded however large a result is.
+"""
+import bisect
+import hashlib
+import mmap
+import os
+import re
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+HANDLE_PREFIX = "blob:"
+
+READ_BLOB_TOOL = {
+    "description": "Read part of a large tool result stored as a blob: a line range, a byte range, "
+                   "or the lines matching a regular expression",
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "handle": {"type": "string", "description": "Blob handle from an observation, copied in full, e.g. "
+                       "blob:9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08"},
+            "lines": {"type": "string", "description": "1-based inclusive line range, e.g. '120-180'"},
+            "bytes": {"type": "string", "description": "0-based byte range with exclusive end, e.g. '0-4096'"},
+            "grep": {"type": "string", "description": "Regular expression; returns matching lines with numbers"},
+        },
+        "required": ["handle"],
+    },
+    "cachePolicy": {"policy": "never"},
+}
+
+
+class BlobStore:
+    def __init__(self, root_dir: str, threshold_bytes: int = 8192, preview_chars: int = 1000):
+        self.root_dir = Path(root_dir)
+        self.threshold_bytes = threshold_bytes
+        self.preview_chars = preview_chars
+        self._maps: Dict[str, Tuple[Any, mmap.mmap]] = {}
+        self._line_offsets: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, digest: str) -> Path:
+        return self.root_dir / digest[:2] / digest[2:]
+
+    def put(self, data: bytes) -> str:
+        """Store data once per content and return its handle"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write-then-rename so a concurrent reader never maps a half-written blob
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(tmp_path, path)
+        return f"{HANDLE_PREFIX}{digest}"
+
+    def observation(self, text: str) -> str:
+        """text itself when small, otherwise a handle with a preview that stays within the threshold"""
+        data = text.encode("utf-8")
+        if len(data) <= self.threshold_bytes:
+            return text
+        handle = self.put(data)
+        lines = text.count("\n") + 1
+        return (f"[Large result stored as {handle}: {len(data)} bytes, {lines} lines. "
+                f"Use the read_blob tool with this handle and 'lines', 'bytes' or 'grep' to read more.]\n"
+                f"Preview:\n{text[:self.preview_chars]}")
+
+    def _map(self, handle: str) -> mmap.mmap:
+        if not handle.startswith(HANDLE_PREFIX) or not re.fullmatch(r"[0-9a-f]{64}", handle[len(HANDLE_PREFIX):]):
+            raise ValueError(f"Invalid blob handle: {handle}")
+        with self._lock:
+            if handle not in self._maps:
+                path = self._path(handle[len(HANDLE_PREFIX):])
+                try:
+                    file = open(path, "rb")
+                except FileNotFoundError:
+                    raise ValueError(f"Unknown blob: {handle}") from None
+                self._maps[handle] = (file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+            return self._maps[handle][1]
+
+    def _lines(self, handle: str, mapped: mmap.mmap) -> List[int]:
+        """Byte offset of the start of every line, built on first use"""
+        offsets = self._line_offsets.get(handle)
+        if offsets is None:
+            offsets = [0]
+            position = mapped.find(b"\n")
+            while position != -1:
+                offsets.append(position + 1)
+                position = mapped.find(b"\n", position + 1)
+            self._line_offsets[handle] = offsets
+        return offsets
+
+    def _bounded(self, data: bytes, what: str) -> str:
+        text = data[:self.threshold_bytes].decode("utf-8", errors="replace")
+        if len(data) > self.threshold_bytes:
+            text += f"\n[Truncated to {self.threshold_bytes} bytes, request a smaller {what} range]"
+        return text
+
+    @staticmethod
+    def _range(spec: str) -> Tuple[int, int]:
+        match = re.fullmatch(r"\s*(\d+)\s*-\s*(\d+)\s*", spec)
+        if not match:
+            raise ValueError(f"Invalid range '{spec}', expected e.g. '10-20'")
+        return int(match.group(1)), int(match.group(2))
+
+    def read_bytes(self, handle: str, spec: str) -> str:
+        start, end = self._range(spec)
+        mapped = self._map(handle)
+        return self._bounded(mapped[start:min(end, len(mapped))], "byte")
+
+    def read_lines(self, handle: str, spec: str) -> str:
+        first, last = self._range(spec)
+        mapped = self._map(handle)
+        offsets = self._lines(handle, mapped)
+        first = max(first, 1)
+        if first > len(offsets):
+            return f"[No such lines, the blob has {len(offsets)} lines]"
+        end = offsets[last] if last < len(offsets) else len(mapped)
+        return self._bounded(mapped[offsets[first - 1]:end], "line")
+
+    def grep(self, handle: str, pattern: str, max_matches: int = 50) -> str:
+        try:
+            regex = re.compile(pattern.encode("utf-8"), re.MULTILINE)
+        except re.error as e:
+            raise ValueError(f"Invalid pattern: {e}") from None
+        mapped = self._map(handle)
+        offsets = self._lines(handle, mapped)
+        matched_lines, output = set(), []
+        for match in regex.finditer(mapped):
+            line = bisect.bisect_right(offsets, match.start())
+            if line in matched_lines:
+                continue
+            matched_lines.add(line)
+            end = offsets[line] - 1 if line < len(offsets) else len(mapped)
+            output.append(f"{line}: " + mapped[offsets[line - 1]:end].decode("utf-8", errors="replace"))
+            if len(matched_lines) >= max_matches:
+                output.append(f"[Stopped after {max_matches} matching lines]")
+                break
+        if not output:
+            return "[No matches]"
+        return self._bounded("\n".join(output).encode("utf-8"), "grep")
+
+    def read(self, arguments: Dict[str, Any]) -> str:
+        """Entry point of the read_blob tool"""
+        handle = arguments.get("handle", "")
+        if arguments.get("grep"):
+            return self.grep(handle, arguments["grep"])
+        if arguments.get("bytes"):
+            return self.read_bytes(handle, arguments["bytes"])
+        if arguments.get("lines"):
+            return self.read_lines(handle, arguments["lines"])
+        # Without a range, as much of the start as would have been shown inline
+        return self.read_bytes(handle, f"0-{self.threshold_bytes}")
+
+    def close(self):
+        with self._lock:
+            for file, mapped in self._maps.values():
+                mapped.close()
+                file.close()
+            self._maps.clear()
+            self._line_offsets.clear()
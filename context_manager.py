@@ -0,0 +1,127 @@
+"""
+Conversation Context Manager
+Keeps the agent state under a token budget by eliding old tool observations,
+both text "Observation:" messages and native tool_result blocks
+"""
+from typing import Dict, List, Any
+
+from agent_logging import get_logger
+
+logger = get_logger("context")
+
+OBSERVATION_PREFIX = "Observation:"
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate, roughly four characters per token for English text and JSON"""
+    return len(text) // 4 + 1
+
+
+class ConversationCompactor:
+    """Elides old observations once the conversation exceeds budget_tokens.
+
+    The system prompt, the first user message (the original question) and the keep_recent most recent
+    messages are never touched. Token counts are cached per message content, so each turn only counts
+    new or replaced content.
+    Each compaction elides down to low_water of the budget rather than just under it: every compaction
+    rewrites the conversation after the first elided message and so invalidates the provider's prompt
+    cache from there, and one larger step leaves several turns before the next one.
+    """
+
+    def __init__(self, budget_tokens: int, keep_recent: int = 4, preview_chars: int = 200, low_water: float = 0.75):
+        self.budget_tokens = budget_tokens
+        self.target_tokens = int(budget_tokens * low_water)
+        self.keep_recent = keep_recent
+        self.preview_chars = preview_chars
+        self._counts: List[int] = []
+        # The content object each count was taken from, so a rebuilt or rewritten history is recounted
+        self._counted: List[Any] = []
+        self.total_tokens = 0
+        self.saved_last_turn = 0
+        self.saved_total = 0
+
+    def _count(self, message: Dict[str, Any]) -> int:
+        content = message.get("content", "")
+        return estimate_tokens(content if isinstance(content, str) else repr(content))
+
+    def _sync_counts(self, messages: List[Dict[str, Any]]):
+        del self._counts[len(messages):], self._counted[len(messages):]
+        for i, message in enumerate(messages):
+            content = message.get("content", "")
+            if i < len(self._counted) and self._counted[i] is content:
+                continue
+            if i < len(self._counted):
+                self._counts[i], self._counted[i] = self._count(message), content
+            else:
+                self._counts.append(self._count(message))
+                self._counted.append(content)
+        self.total_tokens = sum(self._counts)
+
+    def _protected(self, messages: List[Dict[str, Any]]) -> set:
+        protected = set(range(max(0, len(messages) - self.keep_recent), len(messages)))
+        for i, message in enumerate(messages):
+            if message.get("role") == "system":
+                protected.add(i)
+            elif message.get("role") == "user":
+                protected.add(i)
+                break
+        return protected
+
+    def _elide(self, body: str) -> str:
+        return f"[elided ~{estimate_tokens(body)} tokens] {body[:self.preview_chars]}..."
+
+    def _elided_content(self, content):
+        """Elided copy of an observation message's content, or None if it is not an elidable observation"""
+        if isinstance(content, str):
+            if not content.startswith(OBSERVATION_PREFIX) or content.startswith(f"{OBSERVATION_PREFIX} [elided"):
+                return None
+            return f"{OBSERVATION_PREFIX} {self._elide(content[len(OBSERVATION_PREFIX):].strip())}"
+        if isinstance(content, list) and content and all(b.get("type") == "tool_result" for b in content):
+            if all(isinstance(b.get("content"), str) and b["content"].startswith("[elided") for b in content):
+                return None
+            return [
+                dict(b, content=self._elide(b["content"]))
+                if isinstance(b.get("content"), str) and not b["content"].startswith("[elided") else b
+                for b in content
+            ]
+        return None
+
+    def stable_prefix(self, messages: List[Dict[str, Any]]) -> int:
+        """Number of leading messages no compaction will rewrite: up to the first observation not yet elided"""
+        seen_user = False
+        for i, message in enumerate(messages):
+            role = message.get("role")
+            if role == "system" or (role == "user" and not seen_user):
+                seen_user = seen_user or role == "user"
+                continue
+            if self._elided_content(message.get("content")) is not None:
+                return i
+        return len(messages)
+
+    def compact(self, messages: List[Dict[str, Any]]) -> int:
+        """Once over budget, elide the oldest observations in place down to low_water; returns tokens saved"""
+        self._sync_counts(messages)
+        saved = 0
+        if self.total_tokens > self.budget_tokens:
+            protected = self._protected(messages)
+            for i, message in enumerate(messages):
+                if self.total_tokens - saved <= self.target_tokens:
+                    break
+                if i in protected:
+                    continue
+                elided = self._elided_content(message.get("content"))
+                if elided is None:
+                    continue
+                new_count = self._count({"content": elided})
+                if new_count >= self._counts[i]:
+                    continue
+                message["content"] = elided
+                self._counted[i] = elided
+                saved += self._counts[i] - new_count
+                self._counts[i] = new_count
+        self.total_tokens -= saved
+        self.saved_last_turn = saved
+        self.saved_total += saved
+        if saved:
+            logger.info("[CONTEXT] Elided old observations, saved ~%d tokens (%d in context)", saved, self.total_tokens)
+        return saved
@@ -0,0 +1,149 @@
+"""
+Hedged Agent
+Sends each turn to a primary backend and, if it is slower than usual, also to a secondary backend,
+keeping whichever answer arrives first
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from agent import AIAgent
+from agent_logging import get_logger
+from session_journal import Message, SessionJournal
+
+logger = get_logger("hedged_agent")
+
+
+class AIAgentHedged(AIAgent):
+    """Composite agent over two text-mode backends, e.g. AIAgentAzure and AIAgentAnthropic.
+
+    The conversation is kept as provider-neutral user/assistant text and handed to each backend's
+    complete(), which renders it into that provider's message format. The hedge request goes out once
+    the primary has been running longer than hedge_percentile of its recent latencies (or
+    initial_hedge_delay until min_samples turns have been seen). The loser is cancelled: a streaming
+    Anthropic request is closed, a blocking request finishes in the background and is discarded.
+    A backend runs one request at a time, so one still finishing a lost request sits out the next turn.
+    When the request that went out first fails, the turn falls back to the other backend.
+
+    usage counts every request, losers included, as they finish; last_usage is the winning request's.
+    A lost primary request counts in the latency history with the time it had run when it lost.
+    """
+    MODEL_NAME = "hedged"
+
+    def __init__(self, config, primary: AIAgent, secondary: AIAgent, hedge_percentile: float = 95,
+                 initial_hedge_delay: float = 2.0, min_samples: int = 10, history_size: int = 200,
+                 journal: SessionJournal | None = None):
+        super().__init__(config, journal=journal)
+        if getattr(primary, "_native_tools", False) or getattr(secondary, "_native_tools", False):
+            raise ValueError("Hedging needs text-mode backends, native tool_use state cannot be translated")
+        self._backends = (primary, secondary)
+        self.hedge_percentile = hedge_percentile
+        self.initial_hedge_delay = initial_hedge_delay
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=history_size)
+        self._history: list[Message] = self._restore([])
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hedge")
+        self._in_flight: list[Future | None] = [None, None]
+        self._usage_lock = threading.Lock()
+        self.stats = {"turns": 0, "hedged": 0, "secondary_wins": 0}
+
+    def __call__(self, message: str) -> str:
+        self._history.append(Message("user", message))
+        self._compact(self._history)
+        self._checkpoint(self._history)
+        self.turns += 1
+        result = self._execute()
+        self._history.append(Message("assistant", result))
+        self._checkpoint(self._history)
+        return result
+
+    def resume(self) -> str | None:
+        return self._resume(self._history)
+
+    def hedge_delay(self) -> float:
+        if len(self._latencies) < self.min_samples:
+            return self.initial_hedge_delay
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))
+        return ordered[index]
+
+    def _run_backend(self, index: int, history: list[dict], cancel: threading.Event) -> tuple[int, str, dict]:
+        started = time.monotonic()
+        backend = self._backends[index]
+        # Read before and after, the backend only records usage for the requests that complete
+        before = dict(backend.usage)
+        try:
+            result = backend.complete(history, cancel=cancel)
+        finally:
+            spent = {key: backend.usage[key] - before[key] for key in before}
+            with self._usage_lock:
+                for key, tokens in spent.items():
+                    self.usage[key] += tokens
+        if index == 0 and not cancel.is_set():
+            self._latencies.append(time.monotonic() - started)
+        return index, result, spent
+
+    def _launch(self, index: int, cancels: list, wait_busy: bool = False) -> Future | None:
+        """Start a request on a backend; None if it is still finishing a lost one and wait_busy is False"""
+        previous = self._in_flight[index]
+        if previous is not None and not previous.done():
+            if not wait_busy:
+                return None
+            wait([previous])
+        future = self._executor.submit(self._run_backend, index, list(self._history), cancels[index])
+        self._in_flight[index] = future
+        return future
+
+    def _execute(self) -> str:
+        self.stats["turns"] += 1
+        cancels = [threading.Event(), threading.Event()]
+        started = time.monotonic()
+        primary = self._launch(0, cancels)
+        if primary is None:
+            logger.info("[HEDGE] primary still finishing a lost request, sending to the secondary")
+            secondary = self._launch(1, cancels)
+            if secondary is not None:
+                futures, launched = {secondary}, {1}
+            else:
+                futures, launched = {self._launch(0, cancels, wait_busy=True)}, {0}
+        else:
+            futures = {primary}
+            launched = {0}
+            done, _ = wait(futures, timeout=self.hedge_delay())
+            if not done:
+                secondary = self._launch(1, cancels)
+                if secondary is not None:
+                    logger.info("[HEDGE] primary slower than %.2fs, sending hedge request", self.hedge_delay())
+                    self.stats["hedged"] += 1
+                    futures.add(secondary)
+                    launched.add(1)
+
+        pending = futures
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    index, result, usage = future.result()
+                except Exception as e:
+                    error = e
+                    if not pending and len(launched) == 1:
+                        # Nothing else is answering this turn, fall back to the other backend
+                        fallback = 1 - launched.pop()
+                        logger.info("[HEDGE] %s failed (%s), falling back to %s",
+                                    "primary" if fallback else "secondary", e, "secondary" if fallback else "primary")
+                        pending = {self._launch(fallback, cancels, wait_busy=True)}
+                        launched = {0, 1}
+                    continue
+                for other in pending:
+                    cancels[1 - index].set()
+                    other.cancel()
+                    if index == 1:
+                        # The primary lost, its latency was at least this long
+                        self._latencies.append(time.monotonic() - started)
+                if index == 1:
+                    self.stats["secondary_wins"] += 1
+                self.last_usage = usage
+                return result
+        raise error
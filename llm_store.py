@@ -0,0 +1,106 @@
+"""
+LLM Response Store
+Records model responses keyed by a hash of the full request and replays them on later runs
+"""
+import hashlib
+import json
+import os
+import threading
+from typing import Awaitable, Callable, Dict, Optional, Any
+
+MODES = ("off", "record", "replay", "replay_or_live")
+
+
+class ReplayMissError(LookupError):
+    """Raised in replay mode when a request has no recorded response"""
+
+
+class ResponseStore:
+    """Append-only JSONL store of responses.
+
+    record: always call the live API and store the result
+    replay: only serve stored responses, a miss raises ReplayMissError
+    replay_or_live: serve stored responses, fall through to the live API and record on a miss
+    """
+
+    def __init__(self, path: str, mode: str = "replay_or_live"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown response store mode '{mode}', expected one of {MODES}")
+        self.path = path
+        self.mode = mode
+        self._responses: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    @classmethod
+    def from_config(cls, config) -> Optional["ResponseStore"]:
+        if not config.llm_store_path or config.llm_store_mode == "off":
+            return None
+        return cls(config.llm_store_path, mode=config.llm_store_mode)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as file:
+            offset = 0
+            for line in file:
+                try:
+                    record = json.loads(line) if line.strip() else None
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    record = None
+                    if not line.endswith(b"\n"):
+                        # A torn last line from an interrupted run; cut it so the next record doesn't get
+                        # glued onto it, everything before it is still valid
+                        file.truncate(offset)
+                        break
+                offset += len(line)
+                if record is None:
+                    continue
+                self._responses[record["key"]] = record["response"]
+                if not line.endswith(b"\n"):
+                    # Complete but cut before its newline, terminate it before appending after it
+                    file.write(b"\n")
+
+    @staticmethod
+    def request_key(request: Dict[str, Any]) -> str:
+        canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def __len__(self):
+        return len(self._responses)
+
+    def lookup(self, key: str) -> Optional[Any]:
+        if self.mode == "record":
+            return None
+        return self._responses.get(key)
+
+    def record(self, key: str, response: Any):
+        line = json.dumps({"key": key, "response": response}, separators=(",", ":"), ensure_ascii=False)
+        with self._lock:
+            self._responses[key] = response
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(line + "\n")
+
+    def fetch(self, request: Dict[str, Any], live_call: Callable[[], Any]) -> Any:
+        """Return the stored response for request, or make the live call as the mode allows"""
+        key = self.request_key(request)
+        response = self.lookup(key)
+        if response is not None:
+            return response
+        if self.mode == "replay":
+            raise ReplayMissError(f"No recorded response for request {key[:12]}")
+        response = live_call()
+        self.record(key, response)
+        return response
+
+    async def fetch_async(self, request: Dict[str, Any], live_call: Callable[[], Awaitable[Any]]) -> Any:
+        """fetch() for coroutine live calls"""
+        key = self.request_key(request)
+        response = self.lookup(key)
+        if response is not None:
+            return response
+        if self.mode == "replay":
+            raise ReplayMissError(f"No recorded response for request {key[:12]}")
+        response = await live_call()
+        self.record(key, response)
+        return response
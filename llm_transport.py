@@ -0,0 +1,310 @@
+"""
+LLM Transport
+Process-wide pooled HTTP client for the provider SDKs, with a rate-limit-aware
+request scheduler and jittered retries built into the transport
+"""
+import asyncio
+import contextlib
+import heapq
+import itertools
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+import httpx
+
+from agent_logging import get_logger
+
+logger = get_logger("transport")
+
+RETRY_STATUSES = frozenset({408, 409, 429, 500, 502, 503, 504, 529})
+DEFAULT_PRIORITY = 10
+
+_priority: ContextVar[int] = ContextVar("llm_request_priority", default=DEFAULT_PRIORITY)
+
+
+@contextlib.contextmanager
+def llm_priority(priority: int):
+    """Requests made inside this block are scheduled with the given priority, lower goes first"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class TokenBucket:
+    """Continuously refilling bucket sized to a per-minute limit"""
+
+    def __init__(self, per_minute: Optional[float] = None):
+        self.capacity = per_minute
+        self.tokens = per_minute or 0.0
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if self.capacity is None:
+            return
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.capacity / 60.0)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        if self.capacity is None:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60.0 / self.capacity
+
+    def consume(self, amount: float, now: float):
+        if self.capacity is None:
+            return
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+    def sync(self, limit: Optional[float], remaining: Optional[float], now: float):
+        """Adopt the limit and remaining budget the provider reported"""
+        if limit:
+            if self.capacity is None:
+                self.tokens = limit
+            self.capacity = limit
+        if remaining is not None and self.capacity is not None:
+            self._refill(now)
+            self.tokens = min(self.tokens, remaining)
+
+
+def _header_float(headers: httpx.Headers, *names: str) -> Optional[float]:
+    for name in names:
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return float(value)
+        except ValueError:
+            continue
+    return None
+
+
+class RateLimitScheduler:
+    """Admits requests in priority order while respecting request and token per-minute limits.
+
+    Limits start unknown (unlimited) unless given, and are learned from the provider's rate-limit
+    response headers (Anthropic anthropic-ratelimit-*, OpenAI/Azure x-ratelimit-*).
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._blocked_until = 0.0
+        self._waiters: list = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        # Event-loop waiters in the same queue, woken through a future on their own loop
+        self._async_wakeups: Dict[tuple, tuple] = {}
+
+    def _wait_time(self, tokens: float, now: float) -> float:
+        return max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now), self._blocked_until - now)
+
+    def _notify_all(self):
+        """Wake every waiter, threads and event-loop callers alike; called with the condition held"""
+        self._cond.notify_all()
+        for loop, wakeup in self._async_wakeups.values():
+            loop.call_soon_threadsafe(_wake, wakeup)
+
+    def acquire(self, tokens: float, priority: int = DEFAULT_PRIORITY):
+        with self._cond:
+            entry = (priority, next(self._sequence))
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    if self._waiters[0] != entry:
+                        self._cond.wait()
+                        continue
+                    now = time.monotonic()
+                    wait = self._wait_time(tokens, now)
+                    if wait <= 0:
+                        self.requests.consume(1, now)
+                        self.tokens.consume(tokens, now)
+                        return
+                    self._cond.wait(timeout=wait)
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._notify_all()
+
+    async def acquire_async(self, tokens: float, priority: int = DEFAULT_PRIORITY):
+        """acquire() for event-loop callers: waits on a future instead of blocking the thread, queued in
+        priority order together with the threads in acquire()"""
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            entry = (priority, next(self._sequence))
+            heapq.heappush(self._waiters, entry)
+        try:
+            while True:
+                with self._cond:
+                    wakeup = loop.create_future()
+                    self._async_wakeups[entry] = (loop, wakeup)
+                    wait = None
+                    if self._waiters[0] == entry:
+                        now = time.monotonic()
+                        wait = self._wait_time(tokens, now)
+                        if wait <= 0:
+                            self.requests.consume(1, now)
+                            self.tokens.consume(tokens, now)
+                            return
+                await asyncio.wait({wakeup}, timeout=wait)
+        finally:
+            with self._cond:
+                self._async_wakeups.pop(entry, None)
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._notify_all()
+
+    def observe(self, headers: httpx.Headers, status_code: int) -> Optional[float]:
+        """Update limits from a response; returns the server's retry-after in seconds, if any"""
+        now = time.monotonic()
+        retry_after = _header_float(headers, "retry-after")
+        with self._cond:
+            self.requests.sync(
+                _header_float(headers, "anthropic-ratelimit-requests-limit", "x-ratelimit-limit-requests"),
+                _header_float(headers, "anthropic-ratelimit-requests-remaining", "x-ratelimit-remaining-requests"),
+                now)
+            self.tokens.sync(
+                _header_float(headers, "anthropic-ratelimit-input-tokens-limit", "anthropic-ratelimit-tokens-limit",
+                              "x-ratelimit-limit-tokens"),
+                _header_float(headers, "anthropic-ratelimit-input-tokens-remaining",
+                              "anthropic-ratelimit-tokens-remaining", "x-ratelimit-remaining-tokens"),
+                now)
+            if status_code == 429:
+                self._blocked_until = max(self._blocked_until, now + (retry_after or 1.0))
+            self._notify_all()
+        return retry_after
+
+
+class ScheduledTransport(httpx.BaseTransport):
+    """Wraps a pooled transport with per-host rate-limit scheduling and jittered retries"""
+
+    def __init__(self, inner: httpx.BaseTransport, max_retries: int = 4, base_delay: float = 0.5,
+                 max_delay: float = 30.0):
+        self._inner = inner
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._schedulers: Dict[str, RateLimitScheduler] = {}
+        self._lock = threading.Lock()
+
+    def scheduler_for(self, host: str) -> RateLimitScheduler:
+        with self._lock:
+            if host not in self._schedulers:
+                self._schedulers[host] = RateLimitScheduler()
+            return self._schedulers[host]
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        scheduler = self.scheduler_for(request.url.host)
+        estimated_tokens = int(request.headers.get("content-length", 0)) // 4 + 1
+        for attempt in range(self.max_retries + 1):
+            scheduler.acquire(estimated_tokens, priority=_priority.get())
+            try:
+                response = self._inner.handle_request(request)
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+                logger.info("[TRANSPORT] %s %s failed (%s), retrying in %.2fs", request.method, request.url, e, delay)
+                time.sleep(delay)
+                continue
+            retry_after = scheduler.observe(response.headers, response.status_code)
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return response
+            response.close()
+            delay = max(retry_after or 0.0, self.backoff(attempt))
+            logger.info("[TRANSPORT] %s %s returned %d, retrying in %.2fs", request.method, request.url,
+                        response.status_code, delay)
+            time.sleep(delay)
+        raise RuntimeError("unreachable")
+
+    def close(self):
+        self._inner.close()
+
+
+class AsyncScheduledTransport(ScheduledTransport, httpx.AsyncBaseTransport):
+    """ScheduledTransport for httpx.AsyncClient, waiting on the event loop instead of sleeping"""
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        scheduler = self.scheduler_for(request.url.host)
+        estimated_tokens = int(request.headers.get("content-length", 0)) // 4 + 1
+        for attempt in range(self.max_retries + 1):
+            await scheduler.acquire_async(estimated_tokens, priority=_priority.get())
+            try:
+                response = await self._inner.handle_async_request(request)
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+                logger.info("[TRANSPORT] %s %s failed (%s), retrying in %.2fs", request.method, request.url, e, delay)
+                await asyncio.sleep(delay)
+                continue
+            retry_after = scheduler.observe(response.headers, response.status_code)
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return response
+            await response.aclose()
+            delay = max(retry_after or 0.0, self.backoff(attempt))
+            logger.info("[TRANSPORT] %s %s returned %d, retrying in %.2fs", request.method, request.url,
+                        response.status_code, delay)
+            await asyncio.sleep(delay)
+        raise RuntimeError("unreachable")
+
+    async def aclose(self):
+        await self._inner.aclose()
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+_shared_clients: Dict[bool, httpx.Client] = {}
+_shared_async_clients: Dict[bool, httpx.AsyncClient] = {}
+_shared_clients_lock = threading.Lock()
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60)
+
+
+def get_shared_http_client(verify: bool = True) -> httpx.Client:
+    """Process-wide keep-alive client (HTTP/2 when h2 is installed) shared by all agents"""
+    with _shared_clients_lock:
+        if verify not in _shared_clients:
+            inner = httpx.HTTPTransport(
+                verify=verify,
+                http2=_http2_available(),
+                limits=_pool_limits(),
+            )
+            _shared_clients[verify] = httpx.Client(transport=ScheduledTransport(inner),
+                                                   timeout=httpx.Timeout(600, connect=10))
+        return _shared_clients[verify]
+
+
+def get_shared_async_http_client(verify: bool = True) -> httpx.AsyncClient:
+    """get_shared_http_client() for async agents; the client belongs to the event loop that first uses it"""
+    with _shared_clients_lock:
+        if verify not in _shared_async_clients:
+            inner = httpx.AsyncHTTPTransport(verify=verify, http2=_http2_available(), limits=_pool_limits())
+            _shared_async_clients[verify] = httpx.AsyncClient(transport=AsyncScheduledTransport(inner),
+                                                              timeout=httpx.Timeout(600, connect=10))
+        return _shared_async_clients[verify]
@@ -1,10 +1,48 @@
 from agent import AIAgent, AIAgentAzure, AIAgentAnthropic
-from agent_tools import AgentTools
+from agent_logging import configure_logging
+from agent_tools import AgentTools, builtin_tools
+from hedged_agent import AIAgentHedged
+from llm_store import ResponseStore
+from metrics import SESSION_TURNS, TURN_SECONDS, start_exporters
+from session_journal import SessionJournal
+from tool_index import select_tools
 from utils import AIAgentConfig, ActionParser
 import json
+import sys
+import time
+import uuid
 
 
-def tools_markdown(mcp_tools_dict):
+def _compact_type(schema: dict) -> str:
+    schema_type = schema.get("type", "any")
+    if schema_type == "array":
+        return f"{_compact_type(schema.get('items', {}))}[]"
+    if "enum" in schema:
+        return "|".join(json.dumps(value) for value in schema["enum"])
+    return schema_type
+
+
+def compact_tools_markdown(mcp_tools_dict):
+    """One signature line per tool plus argument notes, instead of pretty-printed JSON schemas"""
+    lines = ["\n## MCP Server Tools\n"]
+    for name, info in mcp_tools_dict.items():
+        schema = info.get("inputSchema", {})
+        properties = schema.get("properties", {})
+        required = set(schema.get("required", []))
+        args = ", ".join(
+            f"{arg}{'' if arg in required else '?'}: {_compact_type(arg_schema)}"
+            for arg, arg_schema in properties.items()
+        )
+        lines.append(f"- `{name}({args})` {info.get('description', '')}".rstrip())
+        for arg, arg_schema in properties.items():
+            if arg_schema.get("description"):
+                lines.append(f"  - {arg}: {arg_schema['description']}")
+    return '\n'.join(lines)
+
+
+def tools_markdown(mcp_tools_dict, compact=False):
+    if compact:
+        return compact_tools_markdown(mcp_tools_dict)
     lines = ["\n## MCP Server Tools\n"]
     for name, info in mcp_tools_dict.items():
         lines.append(f"### `{name}`")
@@ -20,20 +58,68 @@ def tools_markdown(mcp_tools_dict):
     return '\n'.join(lines)
 
 
+def build_agent(config: AIAgentConfig, llm_tools: dict, response_store: ResponseStore | None,
+                journal: SessionJournal | None) -> AIAgent:
+    """AIAgentAnthropic, or a hedged agent over Azure and Anthropic when config.hedge_primary is set"""
+    if not config.hedge_primary:
+        return AIAgentAnthropic(config=config, available_tools=llm_tools, response_store=response_store,
+                                journal=journal)
+    backends = {"azure": AIAgentAzure(config=config, response_store=response_store),
+                "anthropic": AIAgentAnthropic(config=config, available_tools=llm_tools,
+                                              response_store=response_store)}
+    if config.hedge_primary not in backends:
+        raise ValueError(f"HEDGE_PRIMARY must be one of {sorted(backends)}, not {config.hedge_primary!r}")
+    primary = backends.pop(config.hedge_primary)
+    (secondary,) = backends.values()
+    return AIAgentHedged(config, primary, secondary, hedge_percentile=config.hedge_percentile,
+                         initial_hedge_delay=config.hedge_initial_delay, journal=journal)
+
+
 def run_agent_loop(
         prompt: str,
         ai_agent: AIAgent,
         ai_agent_tools: AgentTools,
         action_parser: ActionParser,
-        max_turns=5
-):
+        max_turns=5,
+        turn_timeout: float | None = None
+) -> str | None:
+    """Run the ReAct loop until the model stops calling tools; returns the last model output.
+
+    turn_timeout bounds the time spent on tool calls in each turn; calls that overrun it are cancelled.
+    When ai_agent was restored from a session journal, the loop continues from its last journaled turn
+    instead of sending prompt; the tool calls of that turn run again.
+    """
+    result = None
+    turns = 0
+    model = getattr(ai_agent, "MODEL_NAME", "unknown")
+    turn_started = None
     try:
+        resumed = ai_agent.resume()
         for _ in range(max_turns):
+            if turn_started is not None:
+                TURN_SECONDS.observe(time.perf_counter() - turn_started, model=model)
+            turn_started = time.perf_counter()
+            turns += 1
             # print(f"\n[SYSTEM] Input: {prompt}")
-            result = ai_agent(prompt)
+            if resumed is not None:
+                result, resumed = resumed, None
+            else:
+                result = ai_agent(prompt)
             for i, line in enumerate(result.split('\n')):
                 if line.strip():
                     print(f"[ASSISTANT(line {i})] {line.strip()}")
+            usage = getattr(ai_agent, "last_usage", None)
+            if usage:
+                print(f"[SYSTEM] Tokens: {usage['input_tokens']} input, {usage['output_tokens']} output, "
+                      f"{usage['cache_read_input_tokens']} cache read, "
+                      f"{usage['cache_creation_input_tokens']} cache write")
+            tool_uses = getattr(ai_agent, "last_tool_uses", None)
+            if tool_uses:
+                print(f"[SYSTEM] Tool uses: {[(t['name'], t['input']) for t in tool_uses]}")
+                prompt = ai_agent_tools.run_tool_uses(tool_uses, timeout=turn_timeout)
+                for tool_result in prompt:
+                    print(f"[SYSTEM] Tool result ({tool_result['tool_use_id']}): {tool_result['content']}")
+                continue
             action, action_input = action_parser(result)
             if not action:
                 break
@@ -41,7 +127,7 @@ def run_agent_loop(
             print(f"[SYSTEM] Action: {action}, Input: {action_input}")
             ai_tool = ai_agent_tools.get_tool(action.lower().strip())
             if ai_tool:
-                action_result = ai_tool(action_input.strip())
+                action_result = ai_tool(action_input.strip(), timeout=turn_timeout)
                 print(f"[SYSTEM] Tool result: {action_result}")
             else:
                 available_tools = ai_agent_tools.get_available_tools().keys()
@@ -50,22 +136,50 @@ def run_agent_loop(
 
             prompt = f"Observation: {action_result}"
     finally:
+        if turn_started is not None:
+            TURN_SECONDS.observe(time.perf_counter() - turn_started, model=model)
+        SESSION_TURNS.observe(turns)
         ai_agent_tools.cleanup()
+    return result
 
 
 if __name__ == '__main__':
+    configure_logging()
     config = AIAgentConfig.load_from_local(prompt_name_file="system_mcp.md")
+    exporters = start_exporters(config)
     tools = AgentTools(config=config)
-    tools.init()
+    # With a cached tool catalog the first LLM request is built while the MCP server is still starting
+    tools.init(background=True)
+    # python main.py <session id> resumes a journaled session
+    session_id = sys.argv[1] if len(sys.argv) > 1 else uuid.uuid4().hex[:12]
+    journal = SessionJournal.from_config(config, session_id)
+    prompt = journal.first_prompt() if journal else None
+    if prompt:
+        print(f"[SYSTEM] Resuming session {session_id}: {prompt}")
+    else:
+        prompt = input("[USER]: ")
+        if journal:
+            print(f"[SYSTEM] Session {session_id}, resume it with: python main.py {session_id}")
+    available_tools = tools.get_available_tools()
+    selected_tools = select_tools(available_tools, prompt, config.tool_top_k, keep=builtin_tools(config))
     llm_tools = {}
     if config.use_llm_tools:
-        llm_tools = tools.get_available_tools()
+        llm_tools = selected_tools
+    elif selected_tools is available_tools:
+        variant = "compact" if config.compact_tool_schemas else "full"
+        config.system_prompt = config.system_prompt.replace("{{mcp_tools}}", tools.get_tools_markdown(
+            lambda t: tools_markdown(t, compact=config.compact_tool_schemas), variant=variant))
     else:
-        config.system_prompt = config.system_prompt.replace("{{mcp_tools}}", tools_markdown(tools.get_available_tools()))
-
-    run_agent_loop(
-        prompt=input("[USER]: "),
-        ai_agent=AIAgentAnthropic(config=config, available_tools=llm_tools),
-        ai_agent_tools=tools,
-        action_parser=ActionParser()
-    )
+        config.system_prompt = config.system_prompt.replace(
+            "{{mcp_tools}}", tools_markdown(selected_tools, compact=config.compact_tool_schemas))
+
+    try:
+        run_agent_loop(
+            prompt=prompt,
+            ai_agent=build_agent(config, llm_tools, ResponseStore.from_config(config), journal),
+            ai_agent_tools=tools,
+            action_parser=ActionParser(),
+            turn_timeout=config.turn_timeout
+        )
+    finally:
+        exporters.stop()
@@ -0,0 +1,55 @@
+"""
+Async MCP Client
+Awaitable tool calls over the server processes of an MCPServerPool, or the process bound to a lease
+of one. Requests are written by the pool's clients and resolved by their reader threads; the event loop
+only awaits the futures, so an in-flight call holds no thread however many sessions are waiting on tools.
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Union
+
+from mcp_client import TIMEOUT_PREFIX, record_tool_call
+from mcp_pool import MCPPoolLease, MCPServerPool
+
+
+class AsyncMCPToolClient:
+    def __init__(self, pool: Union[MCPServerPool, MCPPoolLease]):
+        self._pool = pool
+        self._tools_dict = pool.get_available_tools_dict()
+
+    def get_available_tools_dict(self) -> Dict[str, Any]:
+        return self._tools_dict.copy()
+
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any], timeout: Optional[float] = None) -> str:
+        """Call a tool; on timeout or when the awaiting task is cancelled the server is told to cancel it"""
+        if tool_name not in self._tools_dict:
+            return f"Error: Unknown tool '{tool_name}'. Available tools: {list(self._tools_dict.keys())}"
+
+        started = time.perf_counter()
+        result = await self._call_tool(tool_name, arguments, timeout)
+        record_tool_call(tool_name, time.perf_counter() - started, result)
+        return result
+
+    async def _call_tool(self, tool_name: str, arguments: Dict[str, Any], timeout: Optional[float]) -> str:
+        client = self._pool.pick_client()
+        try:
+            request_id, future = client.submit_tool_call(tool_name, arguments)
+        except RuntimeError as e:
+            return f"Tool execution failed: {e}"
+        try:
+            response = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            client.abandon_request(request_id, "timeout")
+            return f"{TIMEOUT_PREFIX} after {timeout:.1f}s: '{tool_name}' was cancelled"
+        except asyncio.CancelledError:
+            # The session went away (e.g. its HTTP caller disconnected), don't leave the work running
+            client.abandon_request(request_id, "cancelled")
+            raise
+        except Exception as e:
+            return f"Tool execution failed: {str(e)}"
+        return client.tool_result_text(response)
+
+    async def read_resource(self, uri: str, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Resource reads are mostly resource cache hits, misses run on the default executor"""
+        return await asyncio.get_running_loop().run_in_executor(
+            None, lambda: self._pool.read_resource(uri, timeout=timeout))
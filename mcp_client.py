@@ -2,22 +2,64 @@
 MCP Client for AI Agents
 Connects to the MCP server and provides tool execution capabilities
 """
-import json
 import os
 import subprocess
 import threading
-from typing import Dict, Optional, Any
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, List, Optional, Any, Tuple
+
+import mcp_wire
+import metrics
+from agent_logging import LazyRepr, get_logger
+from resource_cache import ResourceCache
+
+logger = get_logger("mcp_client")
+
+TIMEOUT_PREFIX = "Tool execution timed out"
+# call_tool reports failures as text starting with one of these instead of raising
+ERROR_PREFIXES = ("Error: Unknown tool", "Tool execution error:", "Tool execution failed:", TIMEOUT_PREFIX)
+
+
+def record_tool_call(tool_name: str, seconds: float, result: str):
+    metrics.TOOL_CALL_SECONDS.observe(seconds, tool=tool_name)
+    metrics.TOOL_CALLS.inc(tool=tool_name)
+    if result.startswith(ERROR_PREFIXES):
+        metrics.TOOL_ERRORS.inc(tool=tool_name)
 
 
 class MCPToolClient:
     """Simplified MCP client for tool execution in AI agents"""
 
-    def __init__(self, server_script_path: str):
+    def __init__(self, server_script_path: str, resource_cache: Optional[ResourceCache] = None,
+                 wire_formats: Optional[List[str]] = None):
         self.server_script_path = server_script_path
+        # Offered to the server during initialize, most preferred first; JSON lines until it agrees
+        self.wire_formats = wire_formats if wire_formats is not None else mcp_wire.supported_formats()
+        self.wire_format = mcp_wire.DEFAULT_FORMAT
+        self._read_codec = mcp_wire.get_codec()
+        self._write_codec = mcp_wire.get_codec()
+        self._init_request_id = None
         self.process: Optional[subprocess.Popen] = None
         self.request_id = 0
         self.request_lock = threading.Lock()
         self._tools_dict: Dict[str, Any] = {}
+        self._write_lock = threading.Lock()
+        self._pending: Dict[Any, Future] = {}
+        self._pending_lock = threading.Lock()
+        self._reader_thread: Optional[threading.Thread] = None
+        self._reader_done = threading.Event()
+        self._stderr_thread: Optional[threading.Thread] = None
+        self._notification_handlers: Dict[str, List[Callable[[Dict[str, Any]], None]]] = {}
+        self._notification_executor: Optional[ThreadPoolExecutor] = None
+        self._server_capabilities: Dict[str, Any] = {}
+        self._resource_cache = resource_cache or ResourceCache()
+        self._resource_lists: Dict[str, List[Dict[str, Any]]] = {}
+        self._subscriptions: set = set()
+        self._subscriptions_lock = threading.Lock()
+        self._prefetch_executor: Optional[ThreadPoolExecutor] = None
+        self.on_notification("notifications/resources/updated", self._on_resource_updated)
+        self.on_notification("notifications/resources/list_changed", lambda params: self._resource_lists.clear())
 
     def connect(self):
         """Connect to MCP server and discover tools"""
@@ -28,24 +70,36 @@ class MCPToolClient:
             ["python3", self.server_script_path],
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=0
+            stderr=subprocess.PIPE
         )
+        self.wire_format = mcp_wire.DEFAULT_FORMAT
+        self._read_codec = mcp_wire.get_codec()
+        self._write_codec = mcp_wire.get_codec()
+        self._init_request_id = self._get_next_id()
+        self._reader_done.clear()
+        self._notification_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mcp-notify")
+        self._reader_thread = threading.Thread(target=self._read_loop, name="mcp-reader", daemon=True)
+        self._reader_thread.start()
+        self._stderr_thread = threading.Thread(target=self._drain_stderr, name="mcp-stderr", daemon=True)
+        self._stderr_thread.start()
 
         init_response = self._send_request({
             "jsonrpc": "2.0",
-            "id": self._get_next_id(),
+            "id": self._init_request_id,
             "method": "initialize",
             "params": {
                 "protocolVersion": "2024-11-05",
-                "capabilities": {},
+                "capabilities": {"experimental": {"wireFormats": self.wire_formats}},
                 "clientInfo": {"name": "ai-agents-mcp-client", "version": "1.0.0"}
             }
         })
 
         if "error" in init_response:
             raise RuntimeError(f"Server initialization failed: {init_response['error']}")
+        self._server_capabilities = init_response.get("result", {}).get("capabilities", {})
+        # The reader already switched to the agreed format; requests switch from here on
+        with self._write_lock:
+            self._write_codec = mcp_wire.get_codec(self.wire_format)
 
         self._send_request({"jsonrpc": "2.0", "method": "notifications/initialized"}, read_stdout=False)
 
@@ -64,44 +118,198 @@ class MCPToolClient:
             for tool in tools_response["result"]["tools"]:
                 self._tools_dict[tool["name"]] = {
                     "description": tool.get("description", ""),
-                    "inputSchema": tool.get("inputSchema", {})
+                    "inputSchema": tool.get("inputSchema", {}),
+                    "cachePolicy": tool.get("_meta", {}).get("cache", {"policy": "never"})
                 }
 
     def get_available_tools_dict(self) -> Dict[str, Any]:
         """Get dictionary of available tools and their schemas"""
         return self._tools_dict.copy()
 
-    def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> str:
+    def call_tool(self, tool_name: str, arguments: Dict[str, Any], timeout: Optional[float] = None) -> str:
+        """Call a tool; if no response arrives within timeout seconds the server is told to cancel it"""
         if tool_name not in self._tools_dict:
             return f"Error: Unknown tool '{tool_name}'. Available tools: {list(self._tools_dict.keys())}"
 
+        started = time.perf_counter()
+        result = self._call_tool(tool_name, arguments, timeout)
+        record_tool_call(tool_name, time.perf_counter() - started, result)
+        return result
+
+    def _call_tool(self, tool_name: str, arguments: Dict[str, Any], timeout: Optional[float]) -> str:
+        request_id = self._get_next_id()
+        try:
+            response = self._send_request(self._tool_request(request_id, tool_name, arguments), timeout=timeout)
+            return self.tool_result_text(response)
+        except TimeoutError:
+            self._cancel_request(request_id, "timeout")
+            return f"{TIMEOUT_PREFIX} after {timeout:.1f}s: '{tool_name}' was cancelled"
+        except Exception as e:
+            return f"Tool execution failed: {str(e)}"
+
+    @staticmethod
+    def _tool_request(request_id: int, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "method": "tools/call",
+            "params": {
+                "name": tool_name,
+                "arguments": arguments
+            }
+        }
+
+    @staticmethod
+    def tool_result_text(response: Dict[str, Any]) -> str:
+        """Text of a tools/call response, or the error string call_tool returns for it"""
+        if "result" in response:
+            # Extract text content from the response
+            if "content" in response["result"]:
+                text_parts = []
+                for content_item in response["result"]["content"]:
+                    if content_item.get("type") == "text":
+                        text_parts.append(content_item.get("text", ""))
+                return "\\n".join(text_parts) if text_parts else "No text content returned"
+            else:
+                return str(response["result"])
+        else:
+            error_msg = response.get("error", {}).get("message", "Unknown error")
+            return f"Tool execution error: {error_msg}"
+
+    def submit_tool_call(self, tool_name: str, arguments: Dict[str, Any]) -> Tuple[int, Future]:
+        """Send a tools/call without waiting; the future resolves to the raw response on the reader thread"""
+        request_id = self._get_next_id()
+        return request_id, self._send_request_async(self._tool_request(request_id, tool_name, arguments))
+
+    def abandon_request(self, request_id: int, reason: str):
+        """Stop waiting for a submitted request and tell the server to cancel it"""
+        with self._pending_lock:
+            self._pending.pop(request_id, None)
+        self._cancel_request(request_id, reason)
+
+    def _cancel_request(self, request_id: int, reason: str):
+        """Tell the server to stop working on a request we no longer wait for"""
         try:
+            self._send_request({
+                "jsonrpc": "2.0",
+                "method": "notifications/cancelled",
+                "params": {"requestId": request_id, "reason": reason}
+            }, read_stdout=False)
+        except RuntimeError as e:
+            logger.warning("[MCP_ERROR] Could not cancel request %s: %s", request_id, e)
+
+    def list_resources(self) -> List[Dict[str, Any]]:
+        """Concrete resources the server exposes, cached until the server reports the list changed"""
+        return self._list_paginated("resources/list", "resources")
+
+    def list_resource_templates(self) -> List[Dict[str, Any]]:
+        """URI templates (e.g. calendar://events/{date}) the server can read resources from"""
+        return self._list_paginated("resources/templates/list", "resourceTemplates")
+
+    def _list_paginated(self, method: str, key: str) -> List[Dict[str, Any]]:
+        if "resources" not in self._server_capabilities:
+            return []
+        if key in self._resource_lists:
+            return self._resource_lists[key]
+        items, cursor = [], None
+        while True:
             response = self._send_request({
                 "jsonrpc": "2.0",
                 "id": self._get_next_id(),
-                "method": "tools/call",
-                "params": {
-                    "name": tool_name,
-                    "arguments": arguments
-                }
+                "method": method,
+                "params": {"cursor": cursor} if cursor else {}
             })
+            if "error" in response:
+                raise RuntimeError(f"{method} failed: {response['error'].get('message', 'Unknown error')}")
+            result = response.get("result", {})
+            items.extend(result.get(key, []))
+            cursor = result.get("nextCursor")
+            if not cursor:
+                break
+        self._resource_lists[key] = items
+        return items
 
-            if "result" in response:
-                # Extract text content from the response
-                if "content" in response["result"]:
-                    text_parts = []
-                    for content_item in response["result"]["content"]:
-                        if content_item.get("type") == "text":
-                            text_parts.append(content_item.get("text", ""))
-                    return "\\n".join(text_parts) if text_parts else "No text content returned"
-                else:
-                    return str(response["result"])
-            else:
-                error_msg = response.get("error", {}).get("message", "Unknown error")
-                return f"Tool execution error: {error_msg}"
+    def read_resource(self, uri: str, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Read a resource's contents, served from the resource cache while it is valid.
 
-        except Exception as e:
-            return f"Tool execution failed: {str(e)}"
+        The server's cache policy comes from the result's _meta ("cache" and "etag"). Resources read from a
+        server that supports subscriptions are subscribed to, so updates invalidate the cached copy.
+        """
+        contents = self._resource_cache.get(uri)
+        if contents is not None:
+            return contents
+        version = self._resource_cache.version(uri)
+        params: Dict[str, Any] = {"uri": uri}
+        etag = self._resource_cache.etag(uri)
+        if etag:
+            params["_meta"] = {"ifNoneMatch": etag}
+        response = self._send_request({
+            "jsonrpc": "2.0",
+            "id": self._get_next_id(),
+            "method": "resources/read",
+            "params": params
+        }, timeout=timeout)
+        if "error" in response:
+            raise RuntimeError(response["error"].get("message", "Unknown error"))
+
+        result = response.get("result", {})
+        meta = result.get("_meta", {})
+        if meta.get("notModified"):
+            contents = self._resource_cache.revalidate(uri, version)
+            if contents is not None:
+                return contents
+            # Invalidated while we were asking, read it again without the ETag
+            return self.read_resource(uri, timeout=timeout)
+
+        contents = result.get("contents", [])
+        subscribed = self._subscribe(uri)
+        policy = meta.get("cache") or ({"policy": "pure"} if subscribed else {"policy": "never"})
+        self._resource_cache.put(uri, contents, policy, etag=meta.get("etag"), version=version)
+        return contents
+
+    def prefetch_resources(self, uris: Optional[List[str]] = None, limit: int = 16) -> Future:
+        """Warm the resource cache in the background; defaults to the server's concrete resources"""
+        if self._prefetch_executor is None:
+            self._prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mcp-prefetch")
+
+        def prefetch():
+            try:
+                targets = uris if uris is not None else [r["uri"] for r in self.list_resources()[:limit]]
+                for uri in targets:
+                    self.read_resource(uri)
+            except (RuntimeError, TimeoutError) as e:
+                logger.info("[MCP_ERROR] Resource prefetch failed: %s", e)
+
+        return self._prefetch_executor.submit(prefetch)
+
+    def resource_cache_stats(self) -> Dict[str, int]:
+        return self._resource_cache.stats()
+
+    def _subscribe(self, uri: str) -> bool:
+        """Subscribe to updates of uri once; False when the server does not support subscriptions"""
+        if not self._server_capabilities.get("resources", {}).get("subscribe"):
+            return False
+        with self._subscriptions_lock:
+            if uri in self._subscriptions:
+                return True
+            self._subscriptions.add(uri)
+        response = self._send_request({
+            "jsonrpc": "2.0",
+            "id": self._get_next_id(),
+            "method": "resources/subscribe",
+            "params": {"uri": uri}
+        })
+        if "error" in response:
+            with self._subscriptions_lock:
+                self._subscriptions.discard(uri)
+            return False
+        return True
+
+    def _on_resource_updated(self, params: Dict[str, Any]):
+        uri = params.get("uri")
+        if uri:
+            logger.debug("[MCP_RESOURCE_UPDATED] %s", uri)
+            self._resource_cache.invalidate(uri)
 
     def _get_next_id(self) -> int:
         """Get next request ID in a thread-safe manner"""
@@ -109,33 +317,161 @@ class MCPToolClient:
             self.request_id += 1
             return self.request_id
 
-    def _send_request(self, request: Dict[str, Any], read_stdout=True) -> Dict[str, Any]:
-        """Send JSON-RPC request and get response"""
+    def on_notification(self, method: str, handler: Callable[[Dict[str, Any]], None]):
+        """Register a handler for server notifications with the given method"""
+        self._notification_handlers.setdefault(method, []).append(handler)
+
+    @property
+    def in_flight(self) -> int:
+        """Number of requests awaiting a response"""
+        return len(self._pending)
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def ping(self, timeout: float = 5.0) -> bool:
+        """Check that the server is responsive using the MCP ping request"""
+        try:
+            response = self._send_request({
+                "jsonrpc": "2.0",
+                "id": self._get_next_id(),
+                "method": "ping"
+            }, timeout=timeout)
+        except (RuntimeError, TimeoutError):
+            return False
+        return "result" in response
+
+    def _send_request(self, request: Dict[str, Any], read_stdout=True, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Send JSON-RPC request and wait for its response"""
+        future = self._send_request_async(request, read_stdout=read_stdout)
+        if future is None:
+            return {}
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            with self._pending_lock:
+                self._pending.pop(request["id"], None)
+            raise TimeoutError(f"No response to '{request.get('method')}' within {timeout}s")
+
+    def _send_request_async(self, request: Dict[str, Any], read_stdout=True) -> Optional[Future]:
+        """Send JSON-RPC request and return a future resolved by the reader thread"""
         if not self.process:
             raise RuntimeError("No server process active")
-        json_str = json.dumps(request) + '\n'
-        print("[MCP_CALL]", json_str)
-        self.process.stdin.write(json_str)
-        self.process.stdin.flush()
+        future = None
+        if read_stdout:
+            future = Future()
+            with self._pending_lock:
+                self._pending[request["id"]] = future
+            if self._reader_done.is_set():
+                # The reader already saw EOF, nobody would ever resolve this future
+                self._fail_pending(RuntimeError("MCP server closed the connection"))
+                return future
+        logger.debug("[MCP_CALL] %s", LazyRepr(request))
+        try:
+            with self._write_lock:
+                self.process.stdin.write(self._write_codec.encode(request))
+                self.process.stdin.flush()
+        except (BrokenPipeError, OSError, ValueError) as e:
+            if future is not None:
+                with self._pending_lock:
+                    self._pending.pop(request["id"], None)
+            raise RuntimeError(f"Failed to write to MCP server: {e}")
         if not read_stdout:
-            print("[MCP_NO_STDOUT_RESPONSE]")
-            return {}
+            logger.debug("[MCP_NO_STDOUT_RESPONSE]")
+        return future
+
+    def _read_loop(self):
+        """Route server messages to pending requests by id and dispatch notifications"""
+        stdout = self.process.stdout
+        try:
+            while True:
+                try:
+                    message = self._read_codec.read(stdout)
+                except mcp_wire.FrameError as e:
+                    logger.warning("[MCP_ERROR] %s", e)
+                    continue
+                if message is None:
+                    break
+                logger.debug("[MCP_RESPONSE] %s", LazyRepr(message))
+                if not isinstance(message, dict):
+                    continue
+                if "method" in message:
+                    self._dispatch_notification(message)
+                    continue
+                if message.get("id") == self._init_request_id:
+                    self._switch_read_codec(message)
+                with self._pending_lock:
+                    future = self._pending.pop(message.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(message)
+        except (OSError, ValueError, EOFError):
+            pass
+        finally:
+            self._reader_done.set()
+            self._fail_pending(RuntimeError("MCP server closed the connection"))
 
-        response_line = self.process.stdout.readline()
-        print("[MCP_RESPONSE]", response_line)
+    def _switch_read_codec(self, init_response: Dict[str, Any]):
+        """The server writes everything after its initialize response in the format it picked"""
+        capabilities = init_response.get("result", {}).get("capabilities", {})
+        wire_format = capabilities.get("experimental", {}).get("wireFormat", mcp_wire.DEFAULT_FORMAT)
+        if wire_format not in self.wire_formats and wire_format != mcp_wire.DEFAULT_FORMAT:
+            logger.warning("[MCP_ERROR] Server picked unsupported wire format %s", wire_format)
+            return
+        self.wire_format = wire_format
+        self._read_codec = mcp_wire.get_codec(wire_format)
 
+    def _dispatch_notification(self, message: Dict[str, Any]):
+        """Run notification handlers off the reader thread so they never block responses"""
+        handlers = self._notification_handlers.get(message["method"], [])
+        if not handlers or not self._notification_executor:
+            return
+        for handler in handlers:
+            try:
+                self._notification_executor.submit(handler, message.get("params", {}))
+            except RuntimeError:
+                # Executor already shut down during cleanup
+                return
+
+    def _drain_stderr(self):
+        """Keep reading server stderr so a chatty server never blocks on a full pipe"""
         try:
-            return json.loads(response_line.strip())
-        except json.JSONDecodeError as e:
-            raise RuntimeError(f"Invalid JSON response: {e}")
+            for _ in self.process.stderr:
+                pass
+        except (OSError, ValueError):
+            pass
+
+    def _fail_pending(self, error: Exception):
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
 
     def cleanup(self):
         """Clean up resources"""
         if self.process:
-            self.process.terminate()
+            # Closing stdin lets the server drain its worker pools and exit on its own
             try:
-                self.process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                self.process.kill()
-                self.process.wait()
+                self.process.stdin.close()
+                self.process.wait(timeout=2)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.terminate()
+                try:
+                    self.process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    self.process.kill()
+                    self.process.wait()
+            if self._reader_thread:
+                self._reader_thread.join(timeout=5)
+                self._reader_thread = None
+            self._fail_pending(RuntimeError("MCP client closed"))
             self.process = None
+        if self._notification_executor:
+            self._notification_executor.shutdown(wait=False)
+            self._notification_executor = None
+        if self._prefetch_executor:
+            self._prefetch_executor.shutdown(wait=False)
+            self._prefetch_executor = None
+        with self._subscriptions_lock:
+            self._subscriptions.clear()
+        self._resource_lists.clear()
@@ -0,0 +1,165 @@
+"""
+MCP Federation
+Connects to several MCP servers in parallel and exposes their tools and resources
+through one client, routing every call to the server that owns it
+"""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Any, Tuple
+
+from mcp_client import MCPToolClient
+from resource_cache import ResourceCache
+
+NAMESPACE_SEPARATOR = "__"
+
+
+class FederatedMCPClient:
+    """The MCPToolClient interface over a set of named MCP servers.
+
+    Tool names that more than one server exposes are namespaced as <server>__<tool>; unique names are
+    kept as they are. Servers that are not up within connect_timeout keep starting in the background and
+    their tools are added once they are, so a slow or broken server only costs its own tools.
+    """
+
+    def __init__(self, servers: Dict[str, str], connect_timeout: float = 30.0,
+                 resource_cache: Optional[ResourceCache] = None):
+        self.servers = servers
+        self.connect_timeout = connect_timeout
+        self._resource_cache = resource_cache or ResourceCache()
+        self._clients: Dict[str, MCPToolClient] = {}
+        self._routes: Dict[str, Tuple[str, str]] = {}
+        self._tools_dict: Dict[str, Any] = {}
+        self._server_tool_names: set = set()
+        self._resource_routes: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._tools_changed_handlers: List[Callable[[Dict[str, Any]], None]] = []
+        self._connect_executor: Optional[ThreadPoolExecutor] = None
+
+    def connect(self):
+        """Start all servers concurrently; returns once all are up or connect_timeout has passed"""
+        self._connect_executor = ThreadPoolExecutor(max_workers=len(self.servers), thread_name_prefix="mcp-federate")
+        futures: Dict[Future, str] = {
+            self._connect_executor.submit(self._connect_server, name, path): name
+            for name, path in self.servers.items()
+        }
+        done, pending = wait(futures, timeout=self.connect_timeout)
+        self._connect_executor.shutdown(wait=False)
+        connected = {}
+        for future in done:
+            name = futures[future]
+            try:
+                connected[name] = future.result()
+            except Exception as e:
+                print(f"[SYSTEM] MCP server '{name}' failed to start: {e}")
+        if not connected and not pending:
+            raise RuntimeError(f"None of the MCP servers started: {list(self.servers)}")
+        # Merge in configuration order so the namespacing does not depend on which server answered first
+        self._merge({name: connected[name] for name in self.servers if name in connected})
+        for future in pending:
+            name = futures[future]
+            print(f"[SYSTEM] MCP server '{name}' is slow to start, its tools will be added when it is ready")
+            future.add_done_callback(lambda f, name=name: self._on_late_connect(name, f))
+
+    def _connect_server(self, name: str, path: str) -> MCPToolClient:
+        client = MCPToolClient(path, resource_cache=self._resource_cache)
+        client.connect()
+        return client
+
+    def _on_late_connect(self, name: str, future: Future):
+        try:
+            client = future.result()
+        except Exception as e:
+            print(f"[SYSTEM] MCP server '{name}' failed to start: {e}")
+            return
+        self._merge({name: client})
+        if self._closed:
+            # cleanup() ran while this server was starting
+            client.cleanup()
+            return
+        print(f"[SYSTEM] MCP server '{name}' joined with tools: {list(client.get_available_tools_dict())}")
+        tools = self.get_available_tools_dict()
+        for handler in self._tools_changed_handlers:
+            handler(tools)
+
+    def _merge(self, clients: Dict[str, MCPToolClient]):
+        """Add servers to the routing table; names already routed keep their meaning"""
+        with self._lock:
+            owners: Dict[str, List[str]] = {}
+            for name, client in clients.items():
+                for tool_name in client.get_available_tools_dict():
+                    owners.setdefault(tool_name, []).append(name)
+            for name, client in clients.items():
+                self._clients[name] = client
+                for tool_name, info in client.get_available_tools_dict().items():
+                    exposed = tool_name
+                    if len(owners[tool_name]) > 1 or tool_name in self._server_tool_names or tool_name in self._routes:
+                        exposed = f"{name}{NAMESPACE_SEPARATOR}{tool_name}"
+                    self._routes[exposed] = (name, tool_name)
+                    self._tools_dict[exposed] = info
+            for name, client in clients.items():
+                self._server_tool_names.update(client.get_available_tools_dict())
+            # Re-learn resource ownership on the next read
+            self._resource_routes = {}
+
+    def on_tools_changed(self, handler: Callable[[Dict[str, Any]], None]):
+        """Register a handler called with the merged tools when a late server joins"""
+        self._tools_changed_handlers.append(handler)
+
+    def get_available_tools_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return self._tools_dict.copy()
+
+    def call_tool(self, tool_name: str, arguments: Dict[str, Any], timeout: Optional[float] = None) -> str:
+        route = self._routes.get(tool_name)
+        if route is None:
+            return f"Error: Unknown tool '{tool_name}'. Available tools: {list(self._tools_dict.keys())}"
+        server_name, server_tool_name = route
+        return self._clients[server_name].call_tool(server_tool_name, arguments, timeout=timeout)
+
+    def _each_client(self) -> List[Tuple[str, MCPToolClient]]:
+        with self._lock:
+            return list(self._clients.items())
+
+    def list_resources(self) -> List[Dict[str, Any]]:
+        resources = []
+        for name, client in self._each_client():
+            for resource in client.list_resources():
+                self._resource_routes[resource["uri"]] = name
+                resources.append(resource)
+        return resources
+
+    def list_resource_templates(self) -> List[Dict[str, Any]]:
+        templates = []
+        for name, client in self._each_client():
+            for template in client.list_resource_templates():
+                self._resource_routes.setdefault(template["uriTemplate"].split("://", 1)[0] + "://", name)
+                templates.append(template)
+        return templates
+
+    def _resource_owner(self, uri: str) -> MCPToolClient:
+        if not self._resource_routes:
+            self.list_resources()
+            self.list_resource_templates()
+        name = self._resource_routes.get(uri) or self._resource_routes.get(uri.split("://", 1)[0] + "://")
+        if name is None:
+            raise RuntimeError(f"Unknown resource: {uri}")
+        return self._clients[name]
+
+    def read_resource(self, uri: str, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        return self._resource_owner(uri).read_resource(uri, timeout=timeout)
+
+    def prefetch_resources(self, uris: Optional[List[str]] = None, limit: int = 16) -> List[Future]:
+        if uris is not None:
+            return [self._resource_owner(uri).prefetch_resources([uri]) for uri in uris]
+        return [client.prefetch_resources(limit=limit) for _, client in self._each_client()]
+
+    def resource_cache_stats(self) -> Dict[str, int]:
+        return self._resource_cache.stats()
+
+    def cleanup(self):
+        self._closed = True
+        for _, client in self._each_client():
+            client.cleanup()
+        with self._lock:
+            self._clients.clear()
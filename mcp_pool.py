@@ -0,0 +1,198 @@
+"""
+MCP Server Pool
+Keeps a set of initialized MCP server processes warm and shares them between agent sessions
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any
+
+from mcp_client import MCPToolClient
+from resource_cache import ResourceCache
+
+
+class MCPPoolLease:
+    """A session's handle on the pool, exposing the MCPToolClient interface used by AgentTools.
+
+    The lease is bound to one server process, so a session's calls stay on the same process; it moves
+    to another process only when its own has died.
+    """
+
+    def __init__(self, pool: "MCPServerPool", client: MCPToolClient):
+        self._pool = pool
+        self.client = client
+        self._released = False
+
+    def connect(self):
+        """Pool members are connected already"""
+
+    def pick_client(self) -> MCPToolClient:
+        """The leased client, or a live replacement once it has died"""
+        if not self.client.is_alive():
+            self._pool.rebind(self)
+        return self.client
+
+    def get_available_tools_dict(self) -> Dict[str, Any]:
+        return self._pool.get_available_tools_dict()
+
+    def call_tool(self, tool_name: str, arguments: Dict[str, Any], timeout: Optional[float] = None) -> str:
+        return self.pick_client().call_tool(tool_name, arguments, timeout=timeout)
+
+    def list_resources(self) -> List[Dict[str, Any]]:
+        return self.pick_client().list_resources()
+
+    def list_resource_templates(self) -> List[Dict[str, Any]]:
+        return self.pick_client().list_resource_templates()
+
+    def read_resource(self, uri: str, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        return self.pick_client().read_resource(uri, timeout=timeout)
+
+    def prefetch_resources(self, uris: Optional[List[str]] = None, limit: int = 16):
+        return self.pick_client().prefetch_resources(uris, limit=limit)
+
+    def resource_cache_stats(self) -> Dict[str, int]:
+        return self._pool.resource_cache_stats()
+
+    def cleanup(self):
+        """Return the lease to the pool, the server processes stay alive"""
+        if not self._released:
+            self._released = True
+            self._pool.release(self)
+
+
+class MCPServerPool:
+    """Pool of warm MCP server processes with health checks and automatic respawn"""
+
+    def __init__(self, server_script_path: str, size: int = 2, health_interval: float = 10.0,
+                 ping_timeout: float = 5.0, resource_cache: Optional[ResourceCache] = None):
+        self.server_script_path = server_script_path
+        self.size = size
+        self.health_interval = health_interval
+        self.ping_timeout = ping_timeout
+        self._clients: List[MCPToolClient] = []
+        self._clients_lock = threading.Lock()
+        self._leases = 0
+        self._lease_counts: Dict[MCPToolClient, int] = {}
+        self._tools_dict: Dict[str, Any] = {}
+        # One resource cache for all processes, so a resource read through any of them serves every session
+        self._resource_cache = resource_cache or ResourceCache()
+        self._stop = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_config(cls, config, size: int = 2) -> "MCPServerPool":
+        """Pool of the configured server; a federation of several MCP_SERVERS can't be pooled"""
+        servers = config.mcp_servers or {}
+        if len(servers) > 1:
+            raise ValueError(f"MCP_SERVERS names {len(servers)} servers, but the server pool runs a single one; "
+                             f"federated servers are only supported by main.py")
+        return cls(next(iter(servers.values())) if servers else config.mcp_server_path, size=size)
+
+    def start(self):
+        """Start and initialize all server processes in parallel"""
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            clients = list(executor.map(lambda _: self._spawn(), range(self.size)))
+        with self._clients_lock:
+            self._clients = clients
+        self._tools_dict = clients[0].get_available_tools_dict()
+        self._health_thread = threading.Thread(target=self._health_loop, name="mcp-pool-health", daemon=True)
+        self._health_thread.start()
+        print(f"[SYSTEM] MCP server pool started with {self.size} processes")
+
+    def _spawn(self) -> MCPToolClient:
+        client = MCPToolClient(self.server_script_path, resource_cache=self._resource_cache)
+        client.connect()
+        return client
+
+    def lease(self) -> MCPPoolLease:
+        """Lease the live process with the fewest sessions; call cleanup() on the lease to return it"""
+        with self._clients_lock:
+            if not self._clients:
+                raise RuntimeError("MCP server pool not started. Call start() first.")
+            self._leases += 1
+            return MCPPoolLease(self, self._bind())
+
+    def rebind(self, lease: MCPPoolLease):
+        """Move a lease off its dead process"""
+        with self._clients_lock:
+            if lease.client.is_alive():
+                return
+            self._unbind(lease.client)
+            lease.client = self._bind()
+
+    def release(self, lease: MCPPoolLease):
+        with self._clients_lock:
+            self._leases -= 1
+            self._unbind(lease.client)
+
+    def _bind(self) -> MCPToolClient:
+        live = [c for c in self._clients if c.is_alive()] or self._clients
+        client = min(live, key=lambda c: (self._lease_counts.get(c, 0), c.in_flight))
+        self._lease_counts[client] = self._lease_counts.get(client, 0) + 1
+        return client
+
+    def _unbind(self, client: MCPToolClient):
+        count = self._lease_counts.pop(client, 0) - 1
+        if count > 0:
+            self._lease_counts[client] = count
+
+    @property
+    def active_leases(self) -> int:
+        return self._leases
+
+    def get_available_tools_dict(self) -> Dict[str, Any]:
+        return self._tools_dict.copy()
+
+    def pick_client(self) -> MCPToolClient:
+        """Least-loaded live client"""
+        with self._clients_lock:
+            live = [c for c in self._clients if c.is_alive()] or self._clients
+            return min(live, key=lambda c: c.in_flight)
+
+    def call_tool(self, tool_name: str, arguments: Dict[str, Any], timeout: Optional[float] = None) -> str:
+        return self.pick_client().call_tool(tool_name, arguments, timeout=timeout)
+
+    def list_resources(self) -> List[Dict[str, Any]]:
+        return self.pick_client().list_resources()
+
+    def list_resource_templates(self) -> List[Dict[str, Any]]:
+        return self.pick_client().list_resource_templates()
+
+    def read_resource(self, uri: str, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        return self.pick_client().read_resource(uri, timeout=timeout)
+
+    def prefetch_resources(self, uris: Optional[List[str]] = None, limit: int = 16):
+        return self.pick_client().prefetch_resources(uris, limit=limit)
+
+    def resource_cache_stats(self) -> Dict[str, int]:
+        return self._resource_cache.stats()
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval):
+            self.check_health()
+
+    def check_health(self):
+        """Replace crashed or unresponsive server processes"""
+        with self._clients_lock:
+            clients = list(self._clients)
+        for client in clients:
+            if client.is_alive() and client.ping(timeout=self.ping_timeout):
+                continue
+            print("[SYSTEM] MCP server process unhealthy, respawning")
+            try:
+                replacement = self._spawn()
+            except Exception as e:
+                print(f"[SYSTEM] MCP server respawn failed: {e}")
+                continue
+            with self._clients_lock:
+                self._clients[self._clients.index(client)] = replacement
+            client.cleanup()
+
+    def shutdown(self):
+        self._stop.set()
+        if self._health_thread:
+            self._health_thread.join(timeout=self.health_interval)
+            self._health_thread = None
+        with self._clients_lock:
+            clients, self._clients = self._clients, []
+        for client in clients:
+            client.cleanup()
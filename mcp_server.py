@@ -1,54 +1,108 @@
 #!/usr/bin/env python3
+import hashlib
 import json
 import logging
+import multiprocessing
+import os
+import re
 import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
 from typing import Dict, Any, List, Optional
 
-logging.basicConfig(level=logging.INFO)
+import mcp_wire
+import safe_expr
+from agent_logging import LazyRepr
+from tool_registry import ToolArgumentError, ToolRegistry
+
+logging.basicConfig(level=os.environ.get("MCP_LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
 
+@dataclass(frozen=True)
+class ToolExecution:
+    """How a tool is dispatched: on the thread pool or the process pool, with a concurrency cap.
+
+    Each tool gets its own max_concurrency worker threads, so calls queued behind a saturated tool hold
+    no thread another tool could use.
+    """
+    kind: str = "thread"
+    max_concurrency: int = 8
+
+
+_process_server: Optional["MCPServer"] = None
+
+
+def _init_process_worker():
+    global _process_server
+    _process_server = MCPServer()
+
+
+def _run_tool_in_process(tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    return _process_server.tools[tool_name](**arguments)
+
+
 class MCPServer:
-    def __init__(self):
-        self.tools = {
-            "echo": self.echo_tool,
-            "calculate": self.calculate_tool,
-            "get_system_info": self.get_system_info_tool,
-            "advanced": self.advanced_tool
+    def __init__(self, max_workers: int = 16, max_processes: Optional[int] = None):
+        self.tools: Dict[str, Any] = {}
+        self.tool_execution: Dict[str, ToolExecution] = {}
+        # Advertised to clients under the tool's _meta so they can cache results locally
+        self.tool_cache_policies: Dict[str, Dict[str, Any]] = {}
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._tool_pools: Dict[str, ThreadPoolExecutor] = {}
+        self.registry = ToolRegistry()
+        self.register_tool("echo", self.echo_tool, ToolExecution(kind="thread", max_concurrency=32),
+                           {"policy": "pure"})
+        self.register_tool("calculate", self.calculate_tool,
+                           ToolExecution(kind="process", max_concurrency=os.cpu_count() or 1), {"policy": "pure"})
+        self.register_tool("calculate_batch", self.calculate_batch_tool,
+                           ToolExecution(kind="process", max_concurrency=os.cpu_count() or 1), {"policy": "pure"})
+        self.register_tool("get_system_info", self.get_system_info_tool,
+                           ToolExecution(kind="thread", max_concurrency=4), {"policy": "ttl", "ttl": 60})
+        self.register_tool("advanced", self.advanced_tool, ToolExecution(kind="thread", max_concurrency=8),
+                           {"policy": "never"})
+        self.resources = {
+            "data://config": {"name": "config", "description": "Server configuration",
+                              "mimeType": "application/json", "read": self.config_resource},
         }
-        self.tool_schemas = {
-            "echo": {
-                "type": "object",
-                "properties": {
-                    "text": {"type": "string", "description": "The text message to echo back"}
-                },
-                "required": ["text"]
-            },
-            "calculate": {
-                "type": "object",
-                "properties": {
-                    "expression": {"type": "string",
-                                   "description": "A mathematical expression to evaluate (e.g., '2 + 3 * 4')"}
-                },
-                "required": ["expression"]
-            },
-            "get_system_info": {
-                "type": "object",
-                "properties": {},
-                "required": []
-            },
-            "advanced": {
-                "type": "object",
-                "properties": {
-                    "name": {"type": "string", "description": "Person's name"},
-                    "age": {"type": "integer", "description": "Person's age in years"},
-                    "skills": {"type": "array", "items": {"type": "string"},
-                               "description": "List of skills the person has"},
-                    "metadata": {"type": "object", "description": "Optional additional metadata dictionary"}
-                },
-                "required": ["name", "age", "skills"]
-            }
+        self.resource_templates = {
+            "tools://{name}/schema": {"name": "tool-schema", "description": "Input schema of a tool",
+                                      "mimeType": "application/json", "read": self.tool_schema_resource},
         }
+        self.resource_cache_policies = {
+            "data://config": {"policy": "pure"},
+            "tools://{name}/schema": {"policy": "pure"},
+        }
+        self._resource_subscriptions: set = set()
+        self.max_workers = max_workers
+        self.max_processes = max_processes
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._stdout_lock = threading.Lock()
+        self._read_codec = mcp_wire.get_codec()
+        self._write_codec = mcp_wire.get_codec()
+        # Futures working on each in-flight tools/call, and ids the client has cancelled
+        self._in_flight: Dict[Any, List[Future]] = {}
+        self._cancelled: set = set()
+        self._in_flight_lock = threading.Lock()
+
+    def register_tool(self, name: str, func, execution: ToolExecution = ToolExecution(),
+                      cache_policy: Optional[Dict[str, Any]] = None):
+        """Add a tool; its input schema and argument validator are derived from func's signature and docstring"""
+        self.tools[name] = func
+        self.tool_execution[name] = execution
+        self.tool_cache_policies[name] = cache_policy or {"policy": "never"}
+        self.registry.register(name, func, cache_policy)
+        if self._thread_pool is not None:
+            self._start_tool_pool(name)
+
+    def _start_tool_pool(self, name: str):
+        self._tool_pools[name] = ThreadPoolExecutor(max_workers=self.tool_execution[name].max_concurrency,
+                                                    thread_name_prefix=f"mcp-{name}")
+
+    @property
+    def tool_schemas(self) -> Dict[str, Dict[str, Any]]:
+        return self.registry.schemas
 
     def echo_tool(self, text: str) -> Dict[str, Any]:
         """Simple echo tool that returns the input text.
@@ -62,10 +116,10 @@ class MCPServer:
     def calculate_tool(self, expression: str) -> Dict[str, Any]:
         """Simple calculator tool that evaluates mathematical expressions.
 
-        expression: A mathematical expression to evaluate (e.g., "2 + 3 * 4")
+        expression: A mathematical expression to evaluate (e.g., '2 + 3 * 4')
         """
         try:
-            result = eval(expression)
+            result = safe_expr.evaluate(expression)
             return {
                 "content": [{"type": "text", "text": f"Result: {result}"}]
             }
@@ -74,6 +128,29 @@ class MCPServer:
                 "content": [{"type": "text", "text": f"Error: {str(e)}"}]
             }
 
+    def calculate_batch_tool(self, expressions: Optional[List[str]] = None, expression: Optional[str] = None,
+                             variables: Optional[Dict[str, List[float]]] = None) -> Dict[str, Any]:
+        """Evaluate many expressions, or one expression for every row of variable values, in a single call.
+
+        expressions: Independent expressions to evaluate, e.g. ['2 + 3', 'sqrt(16)']
+        expression: One expression over variables, e.g. 'price * qty * (1 + tax)'
+        variables: Equally long value lists for each variable used in expression
+        """
+        try:
+            if expressions is not None:
+                results = safe_expr.evaluate_many(expressions)
+            elif expression is not None:
+                results = safe_expr.evaluate_over(expression, variables or {})
+            else:
+                raise ValueError("Pass either expressions or expression with variables")
+            return {
+                "content": [{"type": "text", "text": f"Results: {json.dumps(results, default=str)}"}]
+            }
+        except Exception as e:
+            return {
+                "content": [{"type": "text", "text": f"Error: {str(e)}"}]
+            }
+
     def get_system_info_tool(self) -> Dict[str, Any]:
         """Get basic system information including platform and Python version."""
         import platform
@@ -112,16 +189,54 @@ class MCPServer:
             "content": [{"type": "text", "text": f"Person Profile: {json.dumps(result, indent=2)}"}]
         }
 
+    def config_resource(self) -> str:
+        """Server configuration: version, worker limits and tool names"""
+        return json.dumps({"version": 1, "max_workers": self.max_workers, "max_processes": self.max_processes,
+                           "tools": list(self.tools)})
+
+    def tool_schema_resource(self, name: str) -> str:
+        """Input schema of a single tool"""
+        if name not in self.tool_schemas:
+            raise ValueError(f"Unknown tool: {name}")
+        return json.dumps(self.tool_schemas[name])
+
+    def _resolve_resource(self, uri: str):
+        """Reader and cache policy for a concrete URI, matching it against the templates if needed"""
+        if uri in self.resources:
+            return self.resources[uri], {}, self.resource_cache_policies.get(uri, {"policy": "never"})
+        for template, resource in self.resource_templates.items():
+            pattern = "^" + re.sub(r"\\{(\w+)\\}", r"(?P<\1>[^/]+)", re.escape(template)) + "$"
+            match = re.match(pattern, uri)
+            if match:
+                return resource, match.groupdict(), self.resource_cache_policies.get(template, {"policy": "never"})
+        raise ValueError(f"Unknown resource: {uri}")
+
+    def _read_resource(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        uri = params.get("uri", "")
+        resource, arguments, policy = self._resolve_resource(uri)
+        text = resource["read"](**arguments)
+        etag = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+        meta = {"etag": etag, "cache": policy}
+        if params.get("_meta", {}).get("ifNoneMatch") == etag:
+            return {"contents": [], "_meta": dict(meta, notModified=True)}
+        return {"contents": [{"uri": uri, "mimeType": resource["mimeType"], "text": text}], "_meta": meta}
+
+    def notify_resource_updated(self, uri: str):
+        """Tell a subscribed client that a resource changed so it drops its cached copy"""
+        if uri in self._resource_subscriptions:
+            self._write_response({"jsonrpc": "2.0", "method": "notifications/resources/updated",
+                                  "params": {"uri": uri}})
+
     def handle_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
         """Handle incoming MCP requests"""
-        # Log incoming request
-        print(f"[MCP_REQUEST] {json.dumps(request)}", file=sys.stderr, flush=True)
+        logger.debug("[MCP_REQUEST] %s", LazyRepr(request))
 
         method = request.get("method", "")
         params = request.get("params", {})
         request_id = request.get("id")
 
         if method == "initialize":
+            offered = params.get("capabilities", {}).get("experimental", {}).get("wireFormats", [])
             response = {
                 "jsonrpc": "2.0",
                 "id": request_id,
@@ -130,6 +245,13 @@ class MCPServer:
                     "capabilities": {
                         "tools": {
                             "listChanged": False
+                        },
+                        "resources": {
+                            "subscribe": True,
+                            "listChanged": False
+                        },
+                        "experimental": {
+                            "wireFormat": mcp_wire.negotiate(offered)
                         }
                     },
                     "serverInfo": {
@@ -141,38 +263,100 @@ class MCPServer:
 
         elif method == "notifications/initialized":
             response = ""
+        elif method == "notifications/cancelled":
+            self._cancel_request(params.get("requestId"), params.get("reason"))
+            response = ""
+        elif method == "ping":
+            response = {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "result": {}
+            }
         elif method == "tools/list":
-            tools_list = []
-            for tool_name, tool_func in self.tools.items():
-                input_schema = self.tool_schemas[tool_name]
-                description = tool_func.__doc__.split('\n')[0] if tool_func.__doc__ else f"Tool: {tool_name}"
-                tool_info = {
-                    "name": tool_name,
-                    "description": description.strip(),
-                    "inputSchema": input_schema
+            response = {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "result": {
+                    "tools": self.registry.tools_list()
                 }
-                tools_list.append(tool_info)
+            }
 
+        elif method == "resources/list":
             response = {
                 "jsonrpc": "2.0",
                 "id": request_id,
                 "result": {
-                    "tools": tools_list
+                    "resources": [
+                        {"uri": uri, "name": resource["name"], "description": resource["description"],
+                         "mimeType": resource["mimeType"]}
+                        for uri, resource in self.resources.items()
+                    ]
                 }
             }
 
+        elif method == "resources/templates/list":
+            response = {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "result": {
+                    "resourceTemplates": [
+                        {"uriTemplate": template, "name": resource["name"], "description": resource["description"],
+                         "mimeType": resource["mimeType"]}
+                        for template, resource in self.resource_templates.items()
+                    ]
+                }
+            }
+
+        elif method == "resources/read":
+            try:
+                response = {
+                    "jsonrpc": "2.0",
+                    "id": request_id,
+                    "result": self._read_resource(params)
+                }
+            except Exception as e:
+                response = {
+                    "jsonrpc": "2.0",
+                    "id": request_id,
+                    "error": {
+                        "code": -32002,
+                        "message": str(e)
+                    }
+                }
+
+        elif method in ("resources/subscribe", "resources/unsubscribe"):
+            if method == "resources/subscribe":
+                self._resource_subscriptions.add(params.get("uri"))
+            else:
+                self._resource_subscriptions.discard(params.get("uri"))
+            response = {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "result": {}
+            }
+
         elif method == "tools/call":
             tool_name = params.get("name")
             arguments = params.get("arguments", {})
 
-            if tool_name in self.tools:
+            if tool_name in self.registry:
                 try:
-                    result = self.tools[tool_name](**arguments)
+                    arguments = self.registry[tool_name].validate(arguments)
+                    result = self._execute_tool(tool_name, arguments, request_id=request_id)
                     response = {
                         "jsonrpc": "2.0",
                         "id": request_id,
                         "result": result
                     }
+                except ToolArgumentError as e:
+                    response = {
+                        "jsonrpc": "2.0",
+                        "id": request_id,
+                        "error": {
+                            "code": -32602,
+                            "message": str(e)
+                        }
+                    }
                 except Exception as e:
                     response = {
                         "jsonrpc": "2.0",
@@ -202,28 +386,112 @@ class MCPServer:
                 }
             }
 
-        # Log outgoing response
-        print(f"[MCP_RESPONSE] {json.dumps(response)}", file=sys.stderr, flush=True)
+        logger.debug("[MCP_RESPONSE] %s", LazyRepr(response))
         return response
 
+    def _execute_tool(self, tool_name: str, arguments: Dict[str, Any], request_id=None) -> Dict[str, Any]:
+        """Run a tool, on the process pool if it asks for one"""
+        execution = self.tool_execution.get(tool_name, ToolExecution())
+        if execution.kind == "process" and self._process_pool is not None:
+            future = self._process_pool.submit(_run_tool_in_process, tool_name, arguments)
+            self._track(request_id, future)
+            return future.result()
+        return self.tools[tool_name](**arguments)
+
+    def _track(self, request_id, future: Future):
+        if request_id is None:
+            return
+        with self._in_flight_lock:
+            self._in_flight.setdefault(request_id, []).append(future)
+            cancelled = request_id in self._cancelled
+        if cancelled:
+            # The cancel arrived before this piece of work was tracked
+            future.cancel()
+
+    def _cancel_request(self, request_id, reason: Optional[str] = None):
+        """Abort queued work for a cancelled request; running work is abandoned and its response dropped"""
+        with self._in_flight_lock:
+            futures = self._in_flight.get(request_id)
+            if futures is None:
+                return
+            self._cancelled.add(request_id)
+        logger.info(f"Cancelling request {request_id}: {reason}")
+        for future in futures:
+            future.cancel()
+
+    def _write_response(self, response: Dict[str, Any]):
+        if not response:
+            return
+        data = self._write_codec.encode(response)
+        with self._stdout_lock:
+            sys.stdout.buffer.write(data)
+            sys.stdout.buffer.flush()
+
+    def _use_wire_format(self, wire_format: str):
+        """Switch both directions to the negotiated format, right after the initialize response went out"""
+        if wire_format != self._write_codec.name:
+            logger.info(f"Switching wire format to {wire_format}")
+        with self._stdout_lock:
+            self._write_codec = mcp_wire.get_codec(wire_format)
+        self._read_codec = mcp_wire.get_codec(wire_format)
+
+    def _dispatch(self, request: Dict[str, Any]):
+        """Handle tool calls on the worker pool and everything else inline"""
+        if request.get("method") != "tools/call" or self._thread_pool is None:
+            response = self.handle_request(request)
+            self._write_response(response)
+            if request.get("method") == "initialize" and "result" in response:
+                self._use_wire_format(response["result"]["capabilities"]["experimental"]["wireFormat"])
+            return
+
+        request_id = request.get("id")
+        if request_id is not None:
+            # Registered before submitting, so a cancel that arrives right away is not lost
+            with self._in_flight_lock:
+                self._in_flight.setdefault(request_id, [])
+
+        def on_done(future: Future):
+            with self._in_flight_lock:
+                self._in_flight.pop(request_id, None)
+                if request_id in self._cancelled:
+                    self._cancelled.discard(request_id)
+                    return
+            try:
+                self._write_response(future.result())
+            except Exception as e:
+                logger.error(f"Error processing request: {e}")
+
+        # A capped tool's calls queue on its own pool; unknown tools fail fast on the shared one
+        pool = self._tool_pools.get(request.get("params", {}).get("name"), self._thread_pool)
+        future = pool.submit(self.handle_request, request)
+        self._track(request_id, future)
+        future.add_done_callback(on_done)
+
     def run(self):
         """Run the MCP server"""
         logger.info("Starting MCP Server...")
 
+        self._thread_pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="mcp-tool")
+        for name in self.tools:
+            self._start_tool_pool(name)
+        if any(execution.kind == "process" for execution in self.tool_execution.values()):
+            # spawn, not fork: forking a process that already runs worker threads can deadlock the child
+            self._process_pool = ProcessPoolExecutor(max_workers=self.max_processes,
+                                                     mp_context=multiprocessing.get_context("spawn"),
+                                                     initializer=_init_process_worker)
+        stdin = sys.stdin.buffer
         try:
             while True:
-                line = sys.stdin.readline()
-                if not line:
+                try:
+                    request = self._read_codec.read(stdin)
+                except mcp_wire.FrameError as e:
+                    logger.error(str(e))
+                    continue
+                if request is None:
                     break
 
                 try:
-                    request = json.loads(line.strip())
-                    response = self.handle_request(request)
-                    if response:
-                        print(json.dumps(response))
-                        sys.stdout.flush()
-                except json.JSONDecodeError:
-                    logger.error(f"Invalid JSON received: {line}")
+                    self._dispatch(request)
                 except Exception as e:
                     logger.error(f"Error processing request: {e}")
 
@@ -231,6 +499,12 @@ class MCPServer:
             logger.info("Server stopped by user")
         except Exception as e:
             logger.error(f"Server error: {e}")
+        finally:
+            self._thread_pool.shutdown(wait=True)
+            for pool in self._tool_pools.values():
+                pool.shutdown(wait=True)
+            if self._process_pool is not None:
+                self._process_pool.shutdown(wait=True)
 
 
 if __name__ == "__main__":
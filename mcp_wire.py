@@ -0,0 +1,107 @@
+"""
+MCP Wire Formats
+Framing and serialization for the stdio MCP transport. Every connection starts with
+newline-delimited JSON; a faster format is used only when both sides announce it during initialize.
+
+    json     newline-delimited JSON, serialized with orjson when it is installed
+    msgpack  4-byte big-endian length prefix followed by a MessagePack body
+"""
+import json
+import struct
+from typing import BinaryIO, Dict, List, Optional, Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+DEFAULT_FORMAT = "json"
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+
+_length_prefix = struct.Struct(">I")
+
+
+class FrameError(ValueError):
+    """A frame could not be decoded; the stream is still usable for newline-delimited JSON"""
+
+
+class JsonLinesCodec:
+    name = "json"
+
+    def encode(self, message: Dict[str, Any]) -> bytes:
+        if orjson is not None:
+            try:
+                return orjson.dumps(message) + b"\n"
+            except TypeError:
+                pass  # e.g. integers beyond 64 bits, which the stdlib encoder handles
+        return json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n"
+
+    def decode(self, data: bytes) -> Any:
+        try:
+            return orjson.loads(data) if orjson is not None else json.loads(data)
+        except ValueError as e:
+            raise FrameError(f"Invalid JSON received: {data[:200]!r}: {e}") from None
+
+    def read(self, stream: BinaryIO) -> Optional[Any]:
+        """Next message from the stream, None at EOF"""
+        while True:
+            line = stream.readline()
+            if not line:
+                return None
+            if line.strip():
+                return self.decode(line)
+
+
+class MsgpackCodec:
+    name = "msgpack"
+
+    def encode(self, message: Dict[str, Any]) -> bytes:
+        body = msgpack.packb(message, use_bin_type=True)
+        return _length_prefix.pack(len(body)) + body
+
+    def read(self, stream: BinaryIO) -> Optional[Any]:
+        header = stream.read(_length_prefix.size)
+        if len(header) < _length_prefix.size:
+            return None
+        (length,) = _length_prefix.unpack(header)
+        if length > MAX_FRAME_BYTES:
+            raise EOFError(f"Frame of {length} bytes exceeds the {MAX_FRAME_BYTES} byte limit")
+        body = stream.read(length)
+        if len(body) < length:
+            return None
+        try:
+            return msgpack.unpackb(body, raw=False)
+        except ValueError as e:
+            raise FrameError(f"Invalid msgpack frame: {e}") from None
+
+
+_CODECS = {"json": JsonLinesCodec}
+if msgpack is not None:
+    _CODECS["msgpack"] = MsgpackCodec
+
+
+def supported_formats() -> List[str]:
+    """Wire formats this process can speak, most preferred first.
+
+    orjson-encoded JSON lines beat msgpack frames on the small messages that dominate tool traffic, so
+    msgpack is only preferred over the stdlib JSON encoder (see benchmarks/bench_wire.py).
+    """
+    preference = ("json", "msgpack") if orjson is not None else ("msgpack", "json")
+    return [name for name in preference if name in _CODECS]
+
+
+def get_codec(name: str = DEFAULT_FORMAT):
+    return _CODECS[name]()
+
+
+def negotiate(offered: List[str]) -> str:
+    """First format in the peer's preference order that we support, falling back to JSON"""
+    for name in offered or ():
+        if name in _CODECS:
+            return name
+    return DEFAULT_FORMAT
@@ -0,0 +1,258 @@
+"""
+Metrics
+In-process counters and histograms for token usage, latency and tool statistics,
+exported as Prometheus text over HTTP or as periodic JSON snapshots
+"""
+import bisect
+import contextlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TURN_COUNT_BUCKETS = (1, 2, 3, 4, 5, 8, 13, 21)
+
+
+def _label_key(labelnames: Tuple[str, ...], labels: Dict[str, Any]) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(self.labelnames, labels), 0.0)
+
+    def samples(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = list(self._values.items())
+        return [{"labels": dict(zip(self.labelnames, key)), "value": value} for key, value in items]
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value:g}" for key, value in items]
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and three additions under a lock"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (last one is +Inf), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _items(self):
+        with self._lock:
+            return [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+
+    def samples(self) -> List[Dict[str, Any]]:
+        samples = []
+        for key, counts, total, count in self._items():
+            cumulative, buckets = 0, {}
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                buckets["+Inf" if bound == float("inf") else f"{bound:g}"] = cumulative
+            samples.append({"labels": dict(zip(self.labelnames, key)), "count": count, "sum": total,
+                            "buckets": buckets})
+        return samples
+
+    def render(self) -> List[str]:
+        lines = []
+        for sample in self.samples():
+            values = [sample["labels"][name] for name in self.labelnames]
+            for bound, cumulative in sample["buckets"].items():
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, values)} {sample['sum']:g}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, values)} {sample['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format, version 0.0.4"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "timestamp": time.time(),
+            "metrics": {metric.name: {"type": metric.kind, "help": metric.help, "samples": metric.samples()}
+                        for metric in list(self._metrics.values())},
+        }
+
+
+REGISTRY = MetricsRegistry()
+
+LLM_TOKENS = REGISTRY.counter("agent_llm_tokens_total", "LLM tokens by model and kind "
+                              "(input, output, cache_read, cache_creation)", ("model", "kind"))
+LLM_REQUEST_SECONDS = REGISTRY.histogram("agent_llm_request_seconds", "Latency of live LLM requests", ("model",))
+TURN_SECONDS = REGISTRY.histogram("agent_turn_seconds", "Agent loop turn latency, LLM and tools", ("model",))
+SESSION_TURNS = REGISTRY.histogram("agent_session_turns", "Agent loop turns per session", (),
+                                   buckets=TURN_COUNT_BUCKETS)
+TOOL_CALLS = REGISTRY.counter("agent_tool_calls_total", "MCP tool calls", ("tool",))
+TOOL_ERRORS = REGISTRY.counter("agent_tool_errors_total", "MCP tool calls that returned an error or timed out",
+                               ("tool",))
+TOOL_CALL_SECONDS = REGISTRY.histogram("agent_tool_call_seconds", "MCP tool call latency", ("tool",))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = REGISTRY
+
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body, content_type = json.dumps(self.registry.snapshot()).encode(), "application/json"
+        elif self.path.startswith("/metrics"):
+            body, content_type = self.registry.render_prometheus().encode(), "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port: int, host: str = "127.0.0.1", registry: MetricsRegistry = REGISTRY) -> ThreadingHTTPServer:
+    """Serve /metrics (Prometheus text) and /metrics.json from a daemon thread"""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+class SnapshotWriter:
+    """Appends a JSON snapshot of the registry to a JSONL file every interval seconds, and once on stop"""
+
+    def __init__(self, path: str, interval: float = 60.0, registry: MetricsRegistry = REGISTRY):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="metrics-snapshot", daemon=True)
+
+    def start(self) -> "SnapshotWriter":
+        self._thread.start()
+        return self
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+        try:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(self.registry.snapshot()) + "\n")
+        except OSError as e:
+            print(f"[SYSTEM] Could not write metrics snapshot: {e}")
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self.write()
+
+
+class MetricsExporters:
+    """Exporters started from config; stop() shuts the HTTP server down and writes a final snapshot"""
+
+    def __init__(self, http_server: Optional[ThreadingHTTPServer] = None,
+                 snapshot_writer: Optional[SnapshotWriter] = None):
+        self.http_server = http_server
+        self.snapshot_writer = snapshot_writer
+
+    def stop(self):
+        if self.http_server is not None:
+            self.http_server.shutdown()
+            self.http_server.server_close()
+        if self.snapshot_writer is not None:
+            self.snapshot_writer.stop()
+
+
+def start_exporters(config) -> MetricsExporters:
+    """Start the exporters enabled by config.metrics_port and config.metrics_snapshot_path"""
+    http_server = snapshot_writer = None
+    if config.metrics_port:
+        http_server = start_http_server(config.metrics_port)
+        print(f"[SYSTEM] Serving metrics on http://127.0.0.1:{config.metrics_port}/metrics")
+    if config.metrics_snapshot_path:
+        snapshot_writer = SnapshotWriter(config.metrics_snapshot_path, config.metrics_snapshot_interval).start()
+    return MetricsExporters(http_server, snapshot_writer)
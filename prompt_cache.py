@@ -0,0 +1,107 @@
+"""
+Prompt Cache
+Places Anthropic prompt caching breakpoints (cache_control markers) on Messages API requests:
+after the tools, after the system prompt, and on the growing conversation prefix
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+from context_manager import estimate_tokens
+
+EPHEMERAL = {"type": "ephemeral"}
+# The API rejects requests with more breakpoints than this
+MAX_BREAKPOINTS = 4
+
+
+def _with_cache_control(content: Any) -> Optional[List[Dict[str, Any]]]:
+    """Copy of message content with a breakpoint on its last block, None when there is nothing to mark"""
+    if isinstance(content, str):
+        return [{"type": "text", "text": content, "cache_control": EPHEMERAL}] if content else None
+    if not content:
+        return None
+    return list(content[:-1]) + [dict(content[-1], cache_control=EPHEMERAL)]
+
+
+class PromptCacheBreakpoints:
+    """Chooses the breakpoints of each request as the conversation grows.
+
+    Candidates, in order of priority while the limit of four allows:
+    - the system prompt, which caches the tools and the prompt for every turn and session;
+    - the last message, which writes the whole prompt to the cache for the next turn;
+    - the end of the stable prefix, the messages the compactor will never rewrite, so hits on the
+      start of the conversation survive compactions. A compaction moves that end forward; until the new
+      end is in the cache the previously marked end stays marked too, it is what the next request reads;
+    - the message that carried the last breakpoint in the previous request, which reads what that
+      request wrote; the API only looks back about 20 content blocks from a breakpoint for a hit, so this
+      keeps hits when a turn adds many tool_result blocks. invalidate() drops it once a compaction has
+      rewritten the messages before it;
+    - the tools, so a change to the system prompt doesn't invalidate them.
+    Prefixes shorter than min_tokens can't be cached, no breakpoint is spent on them.
+
+    Requests are marked on copies; the messages the agent keeps and journals are never modified.
+    """
+
+    def __init__(self, min_tokens: int = 1024):
+        self.min_tokens = min_tokens
+        self._previous: Optional[int] = None
+        self._stable: Optional[int] = None
+
+    def invalidate(self):
+        """The conversation was rewritten, what the previous request wrote to the cache can't be read back"""
+        self._previous = None
+
+    def apply(self, request: Dict[str, Any], stable_prefix: Optional[int] = None) -> Dict[str, Any]:
+        """Copy of request with breakpoints; stable_prefix is the number of leading messages that won't change"""
+        request = dict(request)
+        tools = request.get("tools") or []
+        system = request.get("system")
+        messages = request.get("messages") or []
+
+        tools_tokens = estimate_tokens(json.dumps(tools)) if tools else 0
+        system_tokens = tools_tokens
+        if system:
+            system_tokens += estimate_tokens(system if isinstance(system, str) else json.dumps(system))
+        cumulative, prefix_tokens = [], system_tokens
+        for message in messages:
+            content = message.get("content", "")
+            prefix_tokens += estimate_tokens(content if isinstance(content, str) else json.dumps(content))
+            cumulative.append(prefix_tokens)
+
+        # Missing or empty sections have nothing to mark, even when min_tokens is 0
+        last = len(messages) - 1
+        candidates = []
+        if system:
+            candidates.append(("system", system_tokens))
+        if messages:
+            candidates.append((last, cumulative[last]))
+        stable = stable_prefix - 1 if stable_prefix and stable_prefix <= len(messages) else None
+        if self._stable is not None and self._stable < (stable if stable is not None else len(messages)):
+            candidates.append((self._stable, cumulative[self._stable]))
+        if stable is not None:
+            candidates.append((stable, cumulative[stable]))
+        if self._previous is not None and self._previous < last:
+            candidates.append((self._previous, cumulative[self._previous]))
+        if tools:
+            candidates.append(("tools", tools_tokens))
+
+        marked = list(messages)
+        chosen = set()
+        for position, tokens in candidates:
+            if len(chosen) == MAX_BREAKPOINTS:
+                break
+            if tokens < self.min_tokens or position in chosen:
+                continue
+            if position == "tools":
+                request["tools"] = list(tools[:-1]) + [dict(tools[-1], cache_control=EPHEMERAL)]
+            elif position == "system":
+                request["system"] = _with_cache_control(system)
+            else:
+                content = _with_cache_control(messages[position].get("content"))
+                if content is None:
+                    continue
+                marked[position] = dict(messages[position], content=content)
+            chosen.add(position)
+        request["messages"] = marked
+        self._previous = last if last in chosen else None
+        self._stable = stable if stable in chosen else (self._stable if self._stable in chosen else None)
+        return request
@@ -0,0 +1,109 @@
+"""
+Resource Cache
+Cache of MCP resources/read contents keyed by URI, with TTL expiry, ETag revalidation
+and invalidation from resources/updated notifications
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Tuple
+
+# contents, etag, cache policy, expiry time, size in bytes
+_Entry = Tuple[List[Dict[str, Any]], Optional[str], Dict[str, Any], Optional[float], int]
+
+
+class ResourceCache:
+    """Memory-bounded LRU cache of resource contents honouring the tool cache policies: pure, ttl or never.
+
+    Expired entries that carry an ETag are kept so the next read can revalidate them instead of
+    transferring the contents again.
+    """
+
+    def __init__(self, max_bytes: int = 4 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_cacheable(policy: Dict[str, Any]) -> bool:
+        return policy.get("policy") in ("pure", "ttl")
+
+    @staticmethod
+    def _expires_at(policy: Dict[str, Any]) -> Optional[float]:
+        return time.monotonic() + float(policy.get("ttl", 0)) if policy.get("policy") == "ttl" else None
+
+    def version(self, uri: str) -> int:
+        """Bumped on every invalidation, so a read that raced an update does not store stale contents"""
+        with self._lock:
+            return self._versions.get(uri, 0)
+
+    def get(self, uri: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(uri)
+            if entry is None or (entry[3] is not None and entry[3] <= time.monotonic()):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(uri)
+            self.hits += 1
+            return entry[0]
+
+    def etag(self, uri: str) -> Optional[str]:
+        """ETag of the cached contents, fresh or expired, to send along with a revalidating read"""
+        with self._lock:
+            entry = self._entries.get(uri)
+            return entry[1] if entry else None
+
+    def revalidate(self, uri: str, version: int) -> Optional[List[Dict[str, Any]]]:
+        """The server confirmed the cached contents are current: renew the entry and return them"""
+        with self._lock:
+            entry = self._entries.get(uri)
+            if entry is None or self._versions.get(uri, 0) != version:
+                return None
+            contents, etag, policy, _, size = entry
+            self._entries[uri] = (contents, etag, policy, self._expires_at(policy), size)
+            self._entries.move_to_end(uri)
+            self.revalidated += 1
+            return contents
+
+    def put(self, uri: str, contents: List[Dict[str, Any]], policy: Dict[str, Any], etag: Optional[str] = None,
+            version: Optional[int] = None):
+        if not self.is_cacheable(policy):
+            return
+        size = len(uri.encode("utf-8")) + len(json.dumps(contents, ensure_ascii=False).encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if version is not None and self._versions.get(uri, 0) != version:
+                return
+            old = self._entries.pop(uri, None)
+            if old is not None:
+                self._size -= old[4]
+            self._entries[uri] = (contents, etag, policy, self._expires_at(policy), size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted[4]
+
+    def invalidate(self, uri: str):
+        with self._lock:
+            self._versions[uri] = self._versions.get(uri, 0) + 1
+            old = self._entries.pop(uri, None)
+            if old is not None:
+                self._size -= old[4]
+
+    def clear(self):
+        with self._lock:
+            for uri in self._entries:
+                self._versions[uri] = self._versions.get(uri, 0) + 1
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "revalidated": self.revalidated,
+                "entries": len(self._entries), "bytes": self._size}
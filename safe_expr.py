@@ -0,0 +1,199 @@
+"""
+Safe Expressions
+Arithmetic expression compiler for the calculate tools: a whitelisted subset of Python
+expressions, compiled once and cached, evaluated without builtins under size and CPU limits.
+The CPU limit of a batch is checked between its items; a single evaluation can't be interrupted and is
+bounded by the size limits instead (MAX_NODES, MAX_EXPONENT, MAX_INT_BITS keep it to tens of milliseconds)
+"""
+import ast
+import math
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence
+
+try:
+    import numpy
+except ImportError:  # Vectorized evaluation falls back to a row-by-row loop
+    numpy = None
+
+MAX_EXPRESSION_LENGTH = 2000
+MAX_NODES = 256
+MAX_EXPONENT = 10000
+MAX_INT_BITS = 8192
+MAX_BATCH_ITEMS = 10000
+DEFAULT_CPU_SECONDS = 2.0
+
+CONSTANTS = {"pi": math.pi, "e": math.e, "tau": math.tau, "inf": math.inf}
+
+FUNCTIONS = {
+    "abs": abs, "min": min, "max": max, "round": round,
+    "sqrt": math.sqrt, "exp": math.exp, "log": math.log, "log10": math.log10, "log2": math.log2,
+    "sin": math.sin, "cos": math.cos, "tan": math.tan, "asin": math.asin, "acos": math.acos, "atan": math.atan,
+    "atan2": math.atan2, "sinh": math.sinh, "cosh": math.cosh, "tanh": math.tanh, "hypot": math.hypot,
+    "floor": math.floor, "ceil": math.ceil,
+}
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Call, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.USub, ast.UAdd,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+)
+
+
+class ExpressionError(ValueError):
+    """The expression is not allowed, too large, or failed to evaluate"""
+
+
+def _pow(base, exponent):
+    """Power with the exponent and the size of integer results bounded"""
+    if numpy is not None and isinstance(exponent, numpy.ndarray):
+        if exponent.size and numpy.max(numpy.abs(exponent)) > MAX_EXPONENT:
+            raise ExpressionError(f"Exponent larger than {MAX_EXPONENT}")
+        return numpy.power(base, exponent)
+    if isinstance(exponent, (int, float)) and abs(exponent) > MAX_EXPONENT:
+        raise ExpressionError(f"Exponent larger than {MAX_EXPONENT}")
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0 \
+            and base.bit_length() * exponent > MAX_INT_BITS:
+        raise ExpressionError(f"Result larger than {MAX_INT_BITS} bits")
+    return base ** exponent
+
+
+class _PowToCall(ast.NodeTransformer):
+    def visit_BinOp(self, node: ast.BinOp):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Pow):
+            return ast.copy_location(ast.Call(func=ast.Name(id="_pow", ctx=ast.Load()),
+                                              args=[node.left, node.right], keywords=[]), node)
+        return node
+
+
+class CompiledExpression:
+    __slots__ = ("source", "code", "variables")
+
+    def __init__(self, source: str, code, variables: frozenset):
+        self.source = source
+        self.code = code
+        self.variables = variables
+
+    def evaluate(self, variables: Optional[Dict[str, Any]] = None, functions: Dict[str, Any] = FUNCTIONS) -> Any:
+        missing = self.variables - set(variables or ())
+        if missing:
+            raise ExpressionError(f"Unknown name(s): {', '.join(sorted(missing))}")
+        scope = {"__builtins__": {}, "_pow": _pow}
+        scope.update(CONSTANTS)
+        scope.update(functions)
+        scope.update({name: variables[name] for name in self.variables})
+        try:
+            return eval(self.code, scope)
+        except ExpressionError:
+            raise
+        except Exception as e:
+            raise ExpressionError(f"{type(e).__name__}: {e}") from None
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(source: str) -> CompiledExpression:
+    """Parse, validate and compile an expression; repeated expressions are served from the cache"""
+    if len(source) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionError(f"Expression longer than {MAX_EXPRESSION_LENGTH} characters")
+    try:
+        tree = ast.parse(source.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ExpressionError(f"Invalid expression: {e.msg}") from None
+
+    variables = set()
+    for count, node in enumerate(ast.walk(tree), start=1):
+        if count > MAX_NODES:
+            raise ExpressionError(f"Expression has more than {MAX_NODES} nodes")
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ExpressionError(f"'{type(node).__name__}' is not allowed in expressions")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise ExpressionError("Only numeric constants are allowed")
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+                raise ExpressionError(f"Unsupported function call: {ast.unparse(node.func)}")
+        elif isinstance(node, ast.Name) and node.id not in FUNCTIONS and node.id not in CONSTANTS:
+            variables.add(node.id)
+    tree = ast.fix_missing_locations(_PowToCall().visit(tree))
+    return CompiledExpression(source, compile(tree, "<expression>", "eval"), frozenset(variables))
+
+
+def evaluate(source: str, variables: Optional[Dict[str, Any]] = None) -> Any:
+    return compile_expression(source).evaluate(variables)
+
+
+def _error(e: Exception) -> str:
+    return f"Error: {e}"
+
+
+def _check_batch_size(count: int):
+    if count > MAX_BATCH_ITEMS:
+        raise ExpressionError(f"Batch larger than {MAX_BATCH_ITEMS} items")
+
+
+def evaluate_many(expressions: Sequence[str], cpu_seconds: float = DEFAULT_CPU_SECONDS) -> List[Any]:
+    """Evaluate independent expressions; failures become "Error: ..." entries instead of failing the batch.
+
+    Items left once cpu_seconds have been used are reported as errors; the item running at the deadline finishes.
+    """
+    _check_batch_size(len(expressions))
+    deadline = time.process_time() + cpu_seconds
+    results = []
+    for source in expressions:
+        if time.process_time() > deadline:
+            results.append(_error(ExpressionError(f"CPU time limit of {cpu_seconds}s exceeded")))
+            continue
+        try:
+            results.append(evaluate(source))
+        except ExpressionError as e:
+            results.append(_error(e))
+    return results
+
+
+_NUMPY_FUNCTIONS = {
+    "abs": "abs", "min": "minimum", "max": "maximum", "round": "round", "sqrt": "sqrt", "exp": "exp",
+    "log": "log", "log10": "log10", "log2": "log2", "sin": "sin", "cos": "cos", "tan": "tan",
+    "asin": "arcsin", "acos": "arccos", "atan": "arctan", "atan2": "arctan2", "sinh": "sinh", "cosh": "cosh",
+    "tanh": "tanh", "hypot": "hypot", "floor": "floor", "ceil": "ceil",
+}
+
+
+def evaluate_over(source: str, bindings: Dict[str, Sequence[Any]],
+                  cpu_seconds: float = DEFAULT_CPU_SECONDS) -> List[Any]:
+    """Evaluate one expression for every row of equally long variable columns.
+
+    With NumPy installed the expression runs once over whole arrays; rows are evaluated one by one
+    when NumPy is missing or the vectorized evaluation fails, so per-row errors are reported per row.
+    cpu_seconds applies to the row-by-row evaluation as in evaluate_many().
+    """
+    compiled = compile_expression(source)
+    missing = compiled.variables - set(bindings)
+    if missing:
+        raise ExpressionError(f"Unknown name(s): {', '.join(sorted(missing))}")
+    lengths = {len(column) for column in bindings.values()}
+    if len(lengths) > 1:
+        raise ExpressionError("All variable columns must have the same length")
+    rows = lengths.pop() if lengths else 1
+    _check_batch_size(rows)
+
+    if numpy is not None and bindings:
+        functions = {name: getattr(numpy, attr) for name, attr in _NUMPY_FUNCTIONS.items()}
+        try:
+            with numpy.errstate(all="raise"):
+                result = compiled.evaluate({name: numpy.asarray(column, dtype=float)
+                                            for name, column in bindings.items()}, functions=functions)
+            return numpy.broadcast_to(result, (rows,)).tolist()
+        except ExpressionError:
+            pass
+
+    deadline = time.process_time() + cpu_seconds
+    results = []
+    for i in range(rows):
+        if time.process_time() > deadline:
+            results.append(_error(ExpressionError(f"CPU time limit of {cpu_seconds}s exceeded")))
+            continue
+        try:
+            results.append(compiled.evaluate({name: column[i] for name, column in bindings.items()}))
+        except ExpressionError as e:
+            results.append(_error(e))
+    return results
@@ -0,0 +1,175 @@
+"""
+Session Journal
+Append-only per-session log of conversation changes with periodic snapshots, so a session that dies
+mid-run can be resumed without paying for its LLM turns again. Messages are held as compact
+__slots__ records with interned roles and tool names.
+
+    <session>.jsonl          {"op": "append", "role": ..., "content": ...} or {"op": "set", "index": ..., "content": ...}
+    <session>.snapshot.json  all messages plus the journal offset they cover; resume replays only the tail after it
+"""
+import json
+import os
+import re
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+
+def _intern_content(content: Any) -> Any:
+    """Share the strings that repeat across thousands of sessions: block types and tool names"""
+    if isinstance(content, list):
+        for block in content:
+            if isinstance(block, dict):
+                for key in ("type", "name"):
+                    if isinstance(block.get(key), str):
+                        block[key] = sys.intern(block[key])
+    return content
+
+
+class Message:
+    """One conversation message; readable like the {"role", "content"} dict the provider APIs take.
+
+    Assigning message["content"] (e.g. the context compactor eliding an observation) marks it changed
+    so the journal records the edit.
+    """
+    __slots__ = ("role", "content", "changed")
+
+    def __init__(self, role: str, content: Any):
+        self.role = sys.intern(role)
+        self.content = _intern_content(content)
+        self.changed = False
+
+    @classmethod
+    def from_dict(cls, message: Dict[str, Any]) -> "Message":
+        return cls(message["role"], message["content"])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"role": self.role, "content": self.content}
+
+    def keys(self):
+        return ("role", "content")
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in ("role", "content"):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value: Any):
+        if key != "content":
+            raise KeyError(key)
+        self.content = _intern_content(value)
+        self.changed = True
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in ("role", "content") else default
+
+    def __repr__(self):
+        return f"Message({self.role!r}, {self.content!r})"
+
+
+def to_dicts(messages: Iterable[Message]) -> List[Dict[str, Any]]:
+    """Plain dicts for a provider request"""
+    return [message.to_dict() for message in messages]
+
+
+class SessionJournal:
+    def __init__(self, root_dir: str, session_id: str, snapshot_every: int = 32):
+        name = re.sub(r"[^\w.-]", "_", session_id)
+        self.session_id = session_id
+        self.path = Path(root_dir) / f"{name}.jsonl"
+        self.snapshot_path = Path(root_dir) / f"{name}.snapshot.json"
+        self.snapshot_every = snapshot_every
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._offset = 0
+        # The Message objects the journal describes, to tell an extended conversation from a replaced one
+        self._synced: List[Message] = []
+        self._since_snapshot = 0
+        self.messages: List[Message] = self._load()
+
+    @classmethod
+    def from_config(cls, config, session_id: str) -> Optional["SessionJournal"]:
+        if not config.session_journal_dir:
+            return None
+        return cls(config.session_journal_dir, session_id, snapshot_every=config.session_snapshot_every)
+
+    def _load(self) -> List[Message]:
+        """Messages from the last snapshot plus the journal records written after it"""
+        messages, offset = [], 0
+        if self.snapshot_path.exists():
+            with open(self.snapshot_path, "r", encoding="utf-8") as file:
+                snapshot = json.load(file)
+            if snapshot["offset"] <= (self.path.stat().st_size if self.path.exists() else 0):
+                messages = [Message(role, content) for role, content in snapshot["messages"]]
+                offset = snapshot["offset"]
+        if self.path.exists():
+            with open(self.path, "r+b") as file:
+                file.seek(offset)
+                for line in file:
+                    try:
+                        record = json.loads(line) if line.endswith(b"\n") else None
+                    except json.JSONDecodeError:
+                        record = None
+                    if record is None:
+                        # A torn last line from a crash; cut it so new records don't get glued onto it
+                        file.truncate(offset)
+                        break
+                    offset += len(line)
+                    self._since_snapshot += 1
+                    if record["op"] == "append":
+                        messages.append(Message(record["role"], record["content"]))
+                    elif record["op"] == "set":
+                        messages[record["index"]].content = _intern_content(record["content"])
+        self._offset = offset
+        self._synced = list(messages)
+        return messages
+
+    def first_prompt(self) -> Optional[str]:
+        """The question that started the session, None for a new session"""
+        for message in self.messages:
+            if message.role == "user" and isinstance(message.content, str):
+                return message.content
+        return None
+
+    def sync(self, messages: List[Message]):
+        """Append what changed in messages since the last sync: edited messages and new ones.
+
+        A conversation that was replaced rather than extended, shorter or with other Message objects in
+        place of journaled ones, is written as a snapshot.
+        """
+        synced = len(self._synced)
+        if len(messages) < synced or any(message is not journaled
+                                         for message, journaled in zip(messages, self._synced)):
+            self.snapshot(messages)
+            return
+        records = []
+        for index in range(synced):
+            if messages[index].changed:
+                records.append({"op": "set", "index": index, "content": messages[index].content})
+                messages[index].changed = False
+        for message in messages[synced:]:
+            records.append({"op": "append", "role": message.role, "content": message.content})
+            message.changed = False
+        if not records:
+            return
+        data = "".join(json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n" for record in records)
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(data)
+            self._offset = file.tell()
+        self._synced = list(messages)
+        self._since_snapshot += len(records)
+        if self._since_snapshot >= self.snapshot_every:
+            self.snapshot(messages)
+
+    def snapshot(self, messages: List[Message]):
+        """Write all messages with the journal offset they include, so resume replays only newer records"""
+        snapshot = {"offset": self._offset, "messages": [[message.role, message.content] for message in messages]}
+        # Write-then-rename so a crash never leaves a half-written snapshot behind
+        fd, tmp_path = tempfile.mkstemp(dir=self.snapshot_path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(snapshot, file, separators=(",", ":"), ensure_ascii=False)
+        os.replace(tmp_path, self.snapshot_path)
+        for message in messages:
+            message.changed = False
+        self._synced = list(messages)
+        self._since_snapshot = 0
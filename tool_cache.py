@@ -0,0 +1,70 @@
+"""
+Tool Result Cache
+LRU cache of MCP tool results keyed by tool name and canonicalized arguments
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Any, Tuple
+
+
+class ToolResultCache:
+    """Memory-bounded LRU cache honouring per-tool policies: pure, ttl or never"""
+
+    def __init__(self, max_bytes: int = 4 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, Optional[float], int]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(tool_name: str, arguments: Dict[str, Any]) -> Tuple[str, str]:
+        return tool_name, json.dumps(arguments, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+    @staticmethod
+    def is_cacheable(policy: Dict[str, Any]) -> bool:
+        return policy.get("policy") in ("pure", "ttl")
+
+    def get(self, key: Tuple[str, str]) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, size = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self._size -= size
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Tuple[str, str], value: str, policy: Dict[str, Any]):
+        if not self.is_cacheable(policy):
+            return
+        size = sum(len(part.encode("utf-8")) for part in (key[0], key[1], value))
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + float(policy.get("ttl", 0)) if policy.get("policy") == "ttl" else None
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[2]
+            self._entries[key] = (value, expires_at, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "bytes": self._size}
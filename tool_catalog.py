@@ -0,0 +1,75 @@
+"""
+Tool Catalog Cache
+Persists the discovered MCP tool catalog and its rendered prompt markdown,
+keyed by a hash of the server script and the local modules it imports, so a changed server invalidates it
+"""
+import ast
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+
+def local_sources(script_path: str) -> List[Path]:
+    """The script and, transitively, the modules it imports from its own directory"""
+    root = Path(script_path).resolve().parent
+    sources, pending = [], [Path(script_path).resolve()]
+    while pending:
+        path = pending.pop()
+        if path in sources:
+            continue
+        sources.append(path)
+        try:
+            tree = ast.parse(path.read_bytes(), filename=str(path))
+        except (OSError, SyntaxError):
+            continue
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and not node.level and node.module:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                module = root / f"{name.split('.')[0]}.py"
+                if module.is_file():
+                    pending.append(module)
+    return sources
+
+
+class ToolCatalogCache:
+    def __init__(self, cache_dir: str):
+        self.cache_dir = Path(cache_dir)
+
+    @staticmethod
+    def server_hash(server_script_path: str) -> str:
+        # The tool schemas are derived by modules like tool_registry, not only by the script itself
+        digest = hashlib.sha256()
+        for path in local_sources(server_script_path):
+            digest.update(path.name.encode("utf-8") + b"\0" + path.read_bytes())
+        return digest.hexdigest()
+
+    def _path(self, server_script_path: str) -> Path:
+        return self.cache_dir / f"tools-{self.server_hash(server_script_path)[:32]}.json"
+
+    def load(self, server_script_path: str) -> Optional[Dict[str, Any]]:
+        """Cached {"tools": ..., "markdown": {variant: ...}} entry for this exact server script, if any"""
+        try:
+            with open(self._path(server_script_path), "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def save(self, server_script_path: str, tools: Dict[str, Any], markdown: Optional[Dict[str, str]] = None):
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self._path(server_script_path)
+            # Write-then-rename so concurrent starters never read a half-written file
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump({"tools": tools, "markdown": markdown}, file)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[SYSTEM] Could not persist tool catalog: {e}")
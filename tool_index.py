@@ -0,0 +1,83 @@
+"""
+Tool Index
+BM25 retrieval over tool names, descriptions and argument docs, used to pick the
+tools relevant to a question when the catalog is too large to send whole
+"""
+import json
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Collection, Dict, List
+
+_token_re = re.compile(r"[A-Za-z]+|\d+")
+_camel_re = re.compile(r"(?<=[a-z])(?=[A-Z])")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens with snake_case and camelCase identifiers split into words"""
+    return [token.lower() for token in _token_re.findall(_camel_re.sub(" ", text.replace("_", " ")))]
+
+
+def tool_document(name: str, info: Dict[str, Any]) -> List[str]:
+    parts = [name, name, info.get("description", "")]
+    for arg_name, arg in info.get("inputSchema", {}).get("properties", {}).items():
+        parts.append(arg_name)
+        parts.append(arg.get("description", ""))
+    return tokenize(" ".join(parts))
+
+
+class ToolIndex:
+    def __init__(self, tools: Dict[str, Any], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._names = list(tools)
+        self._docs = [Counter(tool_document(name, info)) for name, info in tools.items()]
+        self._lengths = [sum(doc.values()) for doc in self._docs]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        document_frequency = Counter(term for doc in self._docs for term in doc)
+        n = len(self._docs)
+        self._idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()}
+
+    def scores(self, query: str) -> Dict[str, float]:
+        terms = [term for term in tokenize(query) if term in self._idf]
+        result = {}
+        for name, doc, length in zip(self._names, self._docs, self._lengths):
+            score = 0.0
+            for term in terms:
+                tf = doc.get(term, 0)
+                if tf:
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / (self._avg_length or 1))
+                    score += self._idf[term] * tf * (self.k1 + 1) / norm
+            result[name] = score
+        return result
+
+    def top_k(self, query: str, k: int) -> List[str]:
+        """Names of the k best-matching tools, ties keep catalog order"""
+        scores = self.scores(query)
+        order = sorted(range(len(self._names)), key=lambda i: (-scores[self._names[i]], i))
+        return [self._names[i] for i in order[:k]]
+
+
+@lru_cache(maxsize=16)
+def _cached_index(catalog_key: str) -> ToolIndex:
+    return ToolIndex(json.loads(catalog_key))
+
+
+def index_for(tools: Dict[str, Any]) -> ToolIndex:
+    """Shared index for a tool catalog, built once per distinct catalog"""
+    return _cached_index(json.dumps(tools))
+
+
+def select_tools(tools: Dict[str, Any], question: str, k: int | None,
+                 keep: Collection[str] = ()) -> Dict[str, Any]:
+    """Subset of tools relevant to question, or all of them when k is unset or covers the catalog.
+
+    Tools named in keep, e.g. the agent's built-in tools, are always included on top of the k selected.
+    """
+    candidates = {name: info for name, info in tools.items() if name not in keep}
+    if not k or k >= len(candidates):
+        return tools
+    selected = {name: candidates[name] for name in index_for(candidates).top_k(question, k)}
+    selected.update((name, tools[name]) for name in keep if name in tools)
+    return selected
@@ -0,0 +1,175 @@
+"""
+Tool Registry
+Derives MCP tool metadata from the tool functions themselves: the input schema from the type hints,
+descriptions from the docstring ("param: description" lines), and a validator that checks and coerces
+call arguments. Everything is compiled once at registration; tools/list is served from a prebuilt payload.
+"""
+import inspect
+import types
+import typing
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Coercer = Callable[[Any, str, List[str]], Any]
+
+
+class ToolArgumentError(ValueError):
+    """Arguments of a tools/call don't match the tool's signature; the message lists every problem"""
+
+
+def _describe(value: Any) -> str:
+    text = repr(value)
+    return f"{type(value).__name__} {text if len(text) <= 40 else text[:37] + '...'}"
+
+
+def _scalar(schema_type: str, python_type: type) -> Tuple[Dict[str, Any], Coercer]:
+    def coerce(value, path, errors):
+        if isinstance(value, python_type) and not (isinstance(value, bool) and python_type is not bool):
+            return value
+        # Models often send numbers and booleans as strings, and whole numbers as floats
+        if python_type is int and isinstance(value, float) and value.is_integer():
+            return int(value)
+        if python_type is float and isinstance(value, int) and not isinstance(value, bool):
+            return float(value)
+        if isinstance(value, str) and python_type in (int, float):
+            try:
+                return python_type(value.strip())
+            except ValueError:
+                pass
+        if isinstance(value, str) and python_type is bool and value.lower() in ("true", "false"):
+            return value.lower() == "true"
+        errors.append(f"{path}: expected {schema_type}, got {_describe(value)}")
+        return value
+    return {"type": schema_type}, coerce
+
+
+def _any(value, path, errors):
+    return value
+
+
+def compile_type(annotation: Any) -> Tuple[Dict[str, Any], Coercer]:
+    """JSON schema for a type hint, and a function that validates and coerces a value of it"""
+    origin, args = typing.get_origin(annotation), typing.get_args(annotation)
+    if annotation is Any or annotation is inspect.Parameter.empty:
+        return {}, _any
+    if origin in (typing.Union, types.UnionType):
+        members = [arg for arg in args if arg is not type(None)]
+        schema, inner = compile_type(members[0]) if len(members) == 1 else ({}, _any)
+
+        def optional(value, path, errors):
+            return None if value is None else inner(value, path, errors)
+        return schema, optional
+    if annotation in (str, int, float, bool):
+        return _scalar({str: "string", int: "integer", float: "number", bool: "boolean"}[annotation], annotation)
+    if annotation in (list, List) or origin is list:
+        item_schema, item = compile_type(args[0] if args else Any)
+
+        def array(value, path, errors):
+            if not isinstance(value, list):
+                errors.append(f"{path}: expected array, got {_describe(value)}")
+                return value
+            return [item(element, f"{path}[{i}]", errors) for i, element in enumerate(value)]
+        return ({"type": "array", "items": item_schema} if item_schema else {"type": "array"}), array
+    if annotation in (dict, Dict) or origin is dict:
+        value_schema, field = compile_type(args[1] if len(args) == 2 else Any)
+
+        def obj(value, path, errors):
+            if not isinstance(value, dict):
+                errors.append(f"{path}: expected object, got {_describe(value)}")
+                return value
+            return {key: field(element, f"{path}.{key}", errors) for key, element in value.items()}
+        schema = {"type": "object"}
+        if value_schema:
+            schema["additionalProperties"] = value_schema
+        return schema, obj
+    raise TypeError(f"Unsupported tool parameter type: {annotation!r}")
+
+
+def _param_descriptions(doc: str) -> Dict[str, str]:
+    """The "name: description" lines of a tool docstring"""
+    descriptions = {}
+    for line in doc.splitlines()[1:]:
+        name, sep, description = line.strip().partition(": ")
+        if sep and name.isidentifier():
+            descriptions[name] = description.strip()
+    return descriptions
+
+
+class RegisteredTool:
+    __slots__ = ("name", "func", "description", "input_schema", "cache_policy", "_params", "_required")
+
+    def __init__(self, name: str, func: Callable, cache_policy: Optional[Dict[str, Any]] = None):
+        doc = inspect.getdoc(func) or ""
+        hints = typing.get_type_hints(func)
+        descriptions = _param_descriptions(doc)
+        self.name = name
+        self.func = func
+        self.description = doc.split("\n")[0].strip() if doc else f"Tool: {name}"
+        self.cache_policy = cache_policy or {"policy": "never"}
+        properties, self._params, self._required = {}, {}, []
+        for param in inspect.signature(func).parameters.values():
+            if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+                continue
+            schema, coerce = compile_type(hints.get(param.name, Any))
+            if param.name in descriptions:
+                schema = dict(schema, description=descriptions[param.name])
+            properties[param.name] = schema
+            self._params[param.name] = coerce
+            if param.default is inspect.Parameter.empty:
+                self._required.append(param.name)
+        self.input_schema = {"type": "object", "properties": properties, "required": list(self._required)}
+
+    def validate(self, arguments: Any) -> Dict[str, Any]:
+        """Coerced copy of arguments, or ToolArgumentError naming every missing, unknown or mistyped one"""
+        if not isinstance(arguments, dict):
+            raise ToolArgumentError(
+                f"Invalid arguments for '{self.name}': expected an object, got {_describe(arguments)}")
+        errors: List[str] = []
+        coerced = {}
+        for name, value in arguments.items():
+            coerce = self._params.get(name)
+            if coerce is None:
+                errors.append(f"unexpected argument '{name}'")
+                continue
+            coerced[name] = coerce(value, name, errors)
+        for name in self._required:
+            if name not in arguments:
+                errors.append(f"missing required argument '{name}'")
+        if errors:
+            raise ToolArgumentError(f"Invalid arguments for '{self.name}': {'; '.join(errors)}")
+        return coerced
+
+    def list_entry(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "description": self.description,
+            "inputSchema": self.input_schema,
+            "_meta": {"cache": self.cache_policy}
+        }
+
+
+class ToolRegistry:
+    def __init__(self):
+        self._tools: Dict[str, RegisteredTool] = {}
+        self._tools_list: Optional[List[Dict[str, Any]]] = None
+
+    def register(self, name: str, func: Callable, cache_policy: Optional[Dict[str, Any]] = None) -> RegisteredTool:
+        tool = RegisteredTool(name, func, cache_policy)
+        self._tools[name] = tool
+        self._tools_list = None
+        return tool
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def __getitem__(self, name: str) -> RegisteredTool:
+        return self._tools[name]
+
+    @property
+    def schemas(self) -> Dict[str, Dict[str, Any]]:
+        return {name: tool.input_schema for name, tool in self._tools.items()}
+
+    def tools_list(self) -> List[Dict[str, Any]]:
+        """The tools/list result payload, built once per registry change"""
+        if self._tools_list is None:
+            self._tools_list = [tool.list_entry() for tool in self._tools.values()]
+        return self._tools_list
@@ -4,10 +4,8 @@ from pathlib import Path
 import re
 from typing import Any
 
-import dotenv
 
-
-prompts_dir = Path("prompts")
+prompts_dir = Path(__file__).parent / "prompts"
 
 
 def load_prompt(file_path):
@@ -15,10 +13,24 @@ def load_prompt(file_path):
         with open(prompts_dir / file_path, "r", encoding="utf-8") as file:
             return file.read()
     except FileNotFoundError:
-        for root, dirs, files in os.walk("/"):
-            for file in files:
-                if file == "main.md":
-                    raise ValueError(f"path wrong {os.path.join(root, file)} found instead of {prompts_dir}")
+        available = sorted(p.name for p in prompts_dir.glob("*.md"))
+        raise FileNotFoundError(f"Prompt '{file_path}' not found in {prompts_dir}. Available: {available}") from None
+
+
+def parse_mcp_servers(spec: str, base_dir: Path) -> dict[str, str] | None:
+    """Parse "name=path,name=path" (the name= part is optional) into server name -> script path.
+
+    Names are lower-cased: they prefix namespaced tool names, which the agent loop matches in lower case.
+    """
+    servers = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, path = entry.rpartition("=")
+        path = str(base_dir / path)
+        name = (name or Path(path).stem).lower()
+        if name in servers:
+            name = f"{name}{len(servers)}"
+        servers[name] = path
+    return servers or None
 
 
 @dataclass
@@ -32,13 +44,40 @@ class AIAgentConfig:
     mcp_server_path: str
     temperature: float = 0
     use_llm_tools: bool = False
+    tool_cache_max_bytes: int = 4 * 1024 * 1024
+    llm_store_path: str | None = None
+    llm_store_mode: str = "off"
+    stream: bool = False
+    context_budget_tokens: int | None = None
+    context_keep_recent: int = 4
+    anthropic_base_url: str | None = None
+    tool_catalog_dir: str | None = None
+    tool_top_k: int | None = None
+    compact_tool_schemas: bool = False
+    tool_timeout: float | None = 30.0
+    turn_timeout: float | None = None
+    prefetch_resources: bool = True
+    mcp_servers: dict[str, str] | None = None
+    mcp_connect_timeout: float = 30.0
+    metrics_port: int | None = None
+    metrics_snapshot_path: str | None = None
+    metrics_snapshot_interval: float = 60.0
+    blob_store_dir: str | None = None
+    blob_threshold_bytes: int = 8192
+    session_journal_dir: str | None = None
+    session_snapshot_every: int = 32
+    prompt_caching: bool = True
+    prompt_cache_min_tokens: int = 1024
+    hedge_primary: str | None = None
+    hedge_percentile: float = 95
+    hedge_initial_delay: float = 2.0
 
     @classmethod
     def load_from_local(cls, prompt_name_file: str):
+        import dotenv
         dotenv.load_dotenv(".env", override=True)
         project_root = Path(__file__).parent
         mcp_server_path = str(project_root / "mcp_server.py")
-        # mcp_server_path = str(project_root / "agent-ai-project" / "src" / "mcp_server_fast.py")
         return cls(
             azure_api_key=os.environ['AZURE_OPENAI_API_KEY'],
             azure_api_version=os.environ['AZURE_OPENAI_API_VERSION'],
@@ -47,6 +86,32 @@ class AIAgentConfig:
             tavily_api_key=os.environ['TAVILY_API_KEY'],
             system_prompt=load_prompt(prompt_name_file),
             mcp_server_path=mcp_server_path,
+            llm_store_path=os.environ.get('LLM_STORE_PATH'),
+            llm_store_mode=os.environ.get('LLM_STORE_MODE', 'off'),
+            stream=os.environ.get('LLM_STREAM', '0') == '1',
+            anthropic_base_url=os.environ.get('ANTHROPIC_BASE_URL') or None,
+            tool_catalog_dir=str(project_root / ".cache" / "tool_catalog"),
+            tool_top_k=int(os.environ['TOOL_TOP_K']) if os.environ.get('TOOL_TOP_K') else None,
+            compact_tool_schemas=os.environ.get('COMPACT_TOOL_SCHEMAS', '0') == '1',
+            tool_timeout=float(os.environ.get('TOOL_TIMEOUT') or 30.0),
+            turn_timeout=float(os.environ['TURN_TIMEOUT']) if os.environ.get('TURN_TIMEOUT') else None,
+            prefetch_resources=os.environ.get('PREFETCH_RESOURCES', '1') == '1',
+            mcp_servers=parse_mcp_servers(os.environ.get('MCP_SERVERS', ''), project_root),
+            mcp_connect_timeout=float(os.environ.get('MCP_CONNECT_TIMEOUT') or 30.0),
+            metrics_port=int(os.environ['METRICS_PORT']) if os.environ.get('METRICS_PORT') else None,
+            metrics_snapshot_path=os.environ.get('METRICS_SNAPSHOT_PATH') or None,
+            metrics_snapshot_interval=float(os.environ.get('METRICS_SNAPSHOT_INTERVAL') or 60.0),
+            blob_store_dir=str(project_root / ".cache" / "blobs"),
+            blob_threshold_bytes=int(os.environ.get('BLOB_THRESHOLD_BYTES') or 8192),
+            session_journal_dir=os.environ.get('SESSION_JOURNAL_DIR') or None,
+            session_snapshot_every=int(os.environ.get('SESSION_SNAPSHOT_EVERY') or 32),
+            prompt_caching=os.environ.get('PROMPT_CACHING', '1') == '1',
+            prompt_cache_min_tokens=int(os.environ.get('PROMPT_CACHE_MIN_TOKENS') or 1024),
+            hedge_primary=os.environ.get('HEDGE_PRIMARY', '').lower() or None,
+            hedge_percentile=float(os.environ.get('HEDGE_PERCENTILE') or 95),
+            hedge_initial_delay=float(os.environ.get('HEDGE_INITIAL_DELAY') or 2.0),
+            context_budget_tokens=int(os.environ['CONTEXT_BUDGET_TOKENS'])
+            if os.environ.get('CONTEXT_BUDGET_TOKENS') else None,
         )
 
 
@@ -63,3 +128,30 @@ class ActionParser:
         if actions:
             return [a.groups() for a in actions if a][0]
         return None, None
+
+
+class StreamingActionParser(ActionParser):
+    """Incremental ActionParser fed with streamed text chunks.
+
+    feed() reports an action as soon as its line is complete, so the caller can stop generation early.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._buffer = ""
+        self._lines = []
+
+    def feed(self, chunk: str) -> tuple[str, str] | tuple[None, None]:
+        self._buffer += chunk
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            self._lines.append(line + "\n")
+            match = self._action_re.match(line)
+            if match:
+                return match.groups()
+        return None, None
+
+    @property
+    def consumed_text(self) -> str:
+        """Text of all complete lines seen so far"""
+        return "".join(self._lines)